@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import environ
 
 env = environ.Env(
@@ -159,3 +160,73 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media files (where your articles/*.txt live)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Search backend used by the search view:
+#   'searching.backends.RegexSearchBackend' scans every article file (reference)
+#   'searching.backends.FTS5SearchBackend' narrows candidates with SQLite FTS5
+#   (run `python manage.py rebuild_search_index` after switching)
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='searching.backends.RegexSearchBackend')
+
+# Scatter-gather search. A shard node sets CORPUS_SHARD='i/n' and then only
+# searches articles whose id % n == i; a coordinator lists the shard base URLs
+# (comma-separated, e.g. http://127.0.0.1:8001) in SEARCH_SHARDS.
+CORPUS_SHARD = env('CORPUS_SHARD', default='')
+SEARCH_SHARDS = env.list('SEARCH_SHARDS', default=[])
+SEARCH_SHARD_TIMEOUT = env.float('SEARCH_SHARD_TIMEOUT', default=5.0)  # seconds
+
+# Article processing after upload runs in the `process_article_jobs` worker.
+# Set ARTICLE_JOBS_EAGER=True to run it inside the saving request instead.
+ARTICLE_JOBS_EAGER = env.bool('ARTICLE_JOBS_EAGER', default=False)
+
+# Block-compressed corpus storage (see searching/storage.py). When enabled,
+# search reads media/blocks/<article file>.ozb instead of the plain .txt;
+# create the copies with `python manage.py compress_corpus`.
+CORPUS_BLOCK_STORAGE = env.bool('CORPUS_BLOCK_STORAGE', default=False)
+CORPUS_BLOCKS_ROOT = MEDIA_ROOT / 'blocks'
+
+# Search limits (see searching/budget.py). A search stops building hits after
+# SEARCH_HIT_BUDGET and stops scanning after SEARCH_TIME_BUDGET seconds (0 = no
+# limit). Searches over more than SEARCH_EXPENSIVE_SIZE bytes of text, or for
+# suffixes of one or two letters, wait up to SEARCH_SLOT_WAIT seconds for one of
+# SEARCH_EXPENSIVE_SLOTS slots shared by all workers (0 = no limit).
+SEARCH_HIT_BUDGET = env.int('SEARCH_HIT_BUDGET', default=5000)
+SEARCH_TIME_BUDGET = env.float('SEARCH_TIME_BUDGET', default=10.0)  # seconds
+SEARCH_EXPENSIVE_SIZE = env.int('SEARCH_EXPENSIVE_SIZE', default=20 * 1024 * 1024)
+SEARCH_EXPENSIVE_SLOTS = env.int('SEARCH_EXPENSIVE_SLOTS', default=1)
+SEARCH_SLOT_WAIT = env.float('SEARCH_SLOT_WAIT', default=3.0)  # seconds
+SEARCH_SLOTS_DIR = env('SEARCH_SLOTS_DIR', default=os.path.join(tempfile.gettempdir(), 'korpus-search-slots'))
+
+# Append-only log of searches (see searching/querylog.py); '' turns it off.
+# `python manage.py top_queries --warm` precomputes the matches of the
+# QUERY_WARM_COUNT most frequent queries into the 'search' cache, which must be
+# shared by every process (the default file cache is, on one machine).
+QUERY_LOG = env('QUERY_LOG', default=str(BASE_DIR / 'logs' / 'queries.tsv'))
+QUERY_WARM_COUNT = env.int('QUERY_WARM_COUNT', default=50)
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'search': env.cache('SEARCH_CACHE_URL', default=f"filecache://{BASE_DIR / 'cache' / 'search'}"),
+    # Whole index/statistics pages, per corpus generation (see searching/pagecache.py)
+    'pages': env.cache('PAGE_CACHE_URL', default=f"filecache://{BASE_DIR / 'cache' / 'pages'}"),
+    # {% cache %} fragments of the results page
+    'template_fragments': env.cache('FRAGMENT_CACHE_URL', default='locmemcache://fragments'),
+}
+
+# Seconds a cached page is kept (0 = render every time; ETag/Last-Modified are still sent)
+PAGE_CACHE_SECONDS = env.int('PAGE_CACHE_SECONDS', default=24 * 3600)
+
+# Corpus word list behind the search-box autocomplete (see searching/vocabulary.py),
+# the document-term counts behind the word statistics (searching/termstats.py) and
+# the articles as token-id streams for collocations (searching/tokens.py), all
+# rebuilt together by `python manage.py build_vocabulary` and by the article worker.
+VOCABULARY_PATH = env('VOCABULARY_PATH', default=str(BASE_DIR / 'cache' / 'vocabulary.bin'))
+TERM_MATRIX_PATH = env('TERM_MATRIX_PATH', default=str(BASE_DIR / 'cache' / 'terms.npz'))
+TOKEN_STREAM_PATH = env('TOKEN_STREAM_PATH', default=str(BASE_DIR / 'cache' / 'tokens.bin'))
+
+# Memory report at /diagnostika/ (see searching/diagnostics.py): staff users, or
+# requests with this value in the X-Diagnostics-Token header ('' = staff only).
+DIAGNOSTICS_TOKEN = env('DIAGNOSTICS_TOKEN', default='')
+
+# Corpus generation counter shared by the processes on this machine (see
+# searching/generation.py); bumped on article changes and by `sweep_corpus`.
+CORPUS_GENERATION_FILE = env('CORPUS_GENERATION_FILE', default=str(BASE_DIR / 'cache' / 'generation'))
@@ -1,8 +1,34 @@
 from django.contrib import admin
-from .models import Article
+from django.utils import timezone
+
+from .jobs import lease_cutoff
+from .models import Article, ArticleJob
 
 @admin.register(Article)
 class ArticleAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'style', 'genre', 'pub_year')
+    list_display = ('title', 'author', 'style', 'genre', 'pub_year', 'word_count', 'processing_status')
     list_filter = ('style', 'genre')
-    search_fields = ('title', 'author')
\ No newline at end of file
+    search_fields = ('title', 'author')
+    readonly_fields = ('word_count', 'script', 'encoding', 'duplicate_of')
+
+    @admin.display(description='Ishlov berish')
+    def processing_status(self, obj):
+        job = obj.jobs.order_by('-pk').first()
+        return job.get_status_display() if job else '—'
+
+
+@admin.register(ArticleJob)
+class ArticleJobAdmin(admin.ModelAdmin):
+    list_display = ('article', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('article__title', 'article__author')
+    readonly_fields = ('article', 'attempts', 'last_error', 'created_at', 'updated_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Qayta ishga tushirish')
+    def retry_jobs(self, request, queryset):
+        # Running jobs are left alone unless their worker has died
+        updated = queryset.exclude(status=ArticleJob.RUNNING, updated_at__gte=lease_cutoff()).update(
+            status=ArticleJob.PENDING, attempts=0, run_after=timezone.now()
+        )
+        self.message_user(request, f'{updated} ta vazifa navbatga qoʻyildi')
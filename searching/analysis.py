@@ -0,0 +1,161 @@
+"""
+Whole-corpus analysis: what each article file is, and which texts repeat.
+
+analyze_file() looks at one stored text file with no database access, so
+`python manage.py analyze_corpus` can run it in a process pool: detected
+encoding, script, word and sentence counts (counted as process_article
+does), the apostrophe characters used, a hash of the normalized words and
+a MinHash signature of its word shingles.
+
+Words are normalized to vocabulary keys (lowercase Latin), so the Latin
+and Cyrillic editions of one text have the same content hash. Shingles
+are runs of SHINGLE_WORDS words, hashed from CRC32s of the words (stable
+across processes, unlike hash()); the signature keeps the minimum of
+MINHASH_PERMUTATIONS fixed universal hashes of them. Texts whose
+signatures agree in all rows of at least one of the bands become
+candidates, and pairs whose agreement (the estimated Jaccard similarity)
+reaches the threshold are near-duplicates.
+"""
+import hashlib
+import itertools
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import chardet
+import numpy as np
+
+from .converters import detect_script_type
+from .segments import build_segments, sentence_count
+from .storage import MAGIC, open_block_text
+from .vocabulary import WORD_RE, word_key
+
+ENCODING_SAMPLE = 256 * 1024  # bytes given to chardet
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 32
+DEFAULT_THRESHOLD = 0.8
+
+_PRIME = (1 << 32) - 5  # a * x + b stays below 2**64 for 32-bit a, b, x
+_rng = np.random.default_rng(20240101)  # fixed: signatures are comparable across runs
+_A = _rng.integers(1, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Apostrophe characters looked for, by their Unicode names
+APOSTROPHE_NAMES = {
+    "'": 'APOSTROPHE',
+    'ʻ': 'MODIFIER LETTER TURNED COMMA',
+    'ʼ': 'MODIFIER LETTER APOSTROPHE',
+    '‘': 'LEFT SINGLE QUOTATION MARK',
+    '’': 'RIGHT SINGLE QUOTATION MARK',
+    '`': 'GRAVE ACCENT',
+    '´': 'ACUTE ACCENT',
+    '′': 'PRIME',
+}
+_APOSTROPHE_RE = re.compile('[' + re.escape(''.join(APOSTROPHE_NAMES)) + ']')
+
+
+def read_stored_text(path):
+    """(text, encoding, confidence) of a plain or block-compressed article file."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if raw[:len(MAGIC)] == MAGIC:
+        return str(open_block_text(path)), 'utf-8 (block)', 1.0
+    if raw.startswith(b'\xef\xbb\xbf'):
+        return raw[3:].decode('utf-8'), 'utf-8-sig', 1.0
+    try:
+        return raw.decode('utf-8'), 'utf-8', 1.0
+    except UnicodeDecodeError:
+        pass
+    detected = chardet.detect(raw[:ENCODING_SAMPLE])
+    encoding = detected['encoding'] or 'cp1251'
+    return raw.decode(encoding, errors='replace'), encoding.lower(), detected['confidence'] or 0.0
+
+
+def normalized_words(text):
+    """The words of text as vocabulary keys."""
+    keys = {}
+    return [keys[w] if w in keys else keys.setdefault(w, word_key(w)) for w in WORD_RE.findall(text.lower())]
+
+
+def shingle_hashes(words, size=SHINGLE_WORDS):
+    """Distinct 32-bit hashes of the runs of `size` words (of all words if there are fewer)."""
+    word_hashes = {w: zlib.crc32(w.encode('utf-8')) for w in set(words)}
+    hashes = np.fromiter((word_hashes[w] for w in words), dtype=np.uint64, count=len(words))
+    size = max(1, min(size, len(hashes)))
+    shingles = np.zeros(len(hashes) - size + 1, dtype=np.uint64)
+    for i in range(size):
+        shingles = (shingles * np.uint64(1000003) + hashes[i:len(hashes) - size + 1 + i]) & np.uint64(0xFFFFFFFF)
+    return np.unique(shingles)
+
+
+def minhash(shingles):
+    """MINHASH_PERMUTATIONS-row signature (uint64 array) of a set of shingle hashes."""
+    if not len(shingles):
+        return np.full(MINHASH_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    return np.array([((a * shingles + b) % _PRIME).min() for a, b in zip(_A, _B)], dtype=np.uint64)
+
+
+def analyze_file(path):
+    """Everything analyze_corpus reports about one text file (JSON-ready, plus 'signature')."""
+    text, encoding, confidence = read_stored_text(path)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    sentences, paragraphs = build_segments(text)
+    words = normalized_words(text)
+    apostrophes = Counter(_APOSTROPHE_RE.findall(text))
+    return {
+        'path': path,
+        'encoding': encoding,
+        'encoding_confidence': round(confidence, 2),
+        'script': detect_script_type(text),
+        'chars': len(text),
+        'word_count': len(re.findall(r'\w+', text, re.UNICODE)),
+        'sentence_count': sentence_count(text, sentences),
+        'apostrophes': {APOSTROPHE_NAMES[c]: n for c, n in apostrophes.most_common()},
+        'content_hash': hashlib.sha1(' '.join(words).encode('utf-8')).hexdigest(),
+        'signature': minhash(shingle_hashes(words)),
+    }
+
+
+def duplicate_groups(hashes):
+    """[[key, ...]] of keys sharing a content hash, from {key: content hash}."""
+    groups = defaultdict(list)
+    for key, content_hash in hashes.items():
+        groups[content_hash].append(key)
+    return [sorted(keys) for keys in groups.values() if len(keys) > 1]
+
+
+def near_duplicate_pairs(signatures, threshold=DEFAULT_THRESHOLD, bands=MINHASH_BANDS):
+    """[(key a, key b, similarity)] of signatures ({key: minhash()}) agreeing in at least threshold of rows."""
+    rows = MINHASH_PERMUTATIONS // bands
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        for band in range(bands):
+            buckets[band, signature[band * rows:(band + 1) * rows].tobytes()].append(key)
+    candidates = {
+        pair for keys in buckets.values() if len(keys) > 1 for pair in itertools.combinations(sorted(keys), 2)
+    }
+    pairs = []
+    for a, b in sorted(candidates):
+        similarity = float(np.mean(signatures[a] == signatures[b]))
+        if similarity >= threshold:
+            pairs.append((a, b, similarity))
+    return pairs
+
+
+def cluster(pairs):
+    """{key: smallest key of its cluster} over the keys linked by pairs (union-find)."""
+    parent = {}
+
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for a, b, *rest in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return {key: find(key) for key in parent}
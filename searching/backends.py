@@ -0,0 +1,222 @@
+"""
+Pluggable search backends.
+
+RegexSearchBackend is the reference implementation: it scans every article
+with the regexes the search view has always used. FTS5SearchBackend mirrors
+article text into SQLite FTS5 tables and uses them only to narrow down the
+candidate articles; the hits themselves still come from the same regex scan,
+so both backends return identical results.
+
+The active backend is chosen with ``settings.SEARCH_BACKEND``.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .corpus import get_article_text, read_article_text
+from .storage import BlockText
+
+Match = namedtuple('Match', 'start end text variant')
+
+
+@lru_cache(maxsize=256)
+def compile_search_pattern(variant, search_type):
+    """Compiled regex for one query variant in 'word' or 'suffix' mode."""
+    if search_type == 'word':
+        # Matches word + up to 6 letter suffix
+        pattern = rf'\b{re.escape(variant)}([^\W\d_]{{0,6}})?\b'
+    else:  # suffix search
+        pattern = rf'{re.escape(variant)}\b'
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _finditer(regex, content, overlap):
+    """
+    (offset, match) pairs for regex over a str or, block by block, over a
+    BlockText; offset + match.start() is the position in the whole text.
+    """
+    if not isinstance(content, BlockText):
+        for match in regex.finditer(content):
+            yield 0, match
+        return
+    last_end = 0
+    for window, window_start, block_start, block_end in content.scan_windows(overlap):
+        # Resume where a match running over the block boundary ended, as finditer would
+        for match in regex.finditer(window, max(block_start, last_end) - window_start):
+            if match.start() + window_start >= block_end:
+                break
+            last_end = match.end() + window_start
+            yield window_start, match
+
+
+def iter_matches(content, variants, search_type):
+    """Yield a Match for every hit of any variant, skipping duplicate spans."""
+    matches_found = set()
+    # Longest possible match (variant + 6 letter suffix) plus one character for \b
+    overlap = max((len(v) for v in variants), default=0) + 7
+
+    for variant in variants:
+        if not variant.strip():
+            continue
+
+        try:
+            regex = compile_search_pattern(variant, search_type)
+        except re.error as e:
+            print(f"Regex error with variant '{variant}': {e}")
+            continue
+
+        for base, match in _finditer(regex, content, overlap):
+            start, end = match.start() + base, match.end() + base
+            matched_word = match.group(0)
+
+            match_id = (start, end, matched_word.lower())
+            if match_id in matches_found:
+                continue
+            matches_found.add(match_id)
+
+            yield Match(start, end, matched_word, variant)
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def candidates(self, articles, variants, search_type):
+        """Narrow the articles (any iterable, order kept) to those that may contain a hit."""
+        return articles
+
+    def search(self, articles, variants, search_type, budget=None):
+        """
+        Yield (article, content, matches) for every article with at least one hit.
+        Stops early, marking the budget truncated, once a SearchBudget expires.
+        """
+        raise NotImplementedError
+
+    def index_article(self, art):
+        """Called after an Article is saved."""
+
+    def remove_article(self, article_id):
+        """Called after an Article is deleted."""
+
+    def rebuild(self, articles):
+        """Re-index the given articles from scratch."""
+
+
+class RegexSearchBackend(BaseSearchBackend):
+    """Reference backend: regex scan over the cached text of every article."""
+
+    def search(self, articles, variants, search_type, budget=None):
+        for art in self.candidates(articles, variants, search_type):
+            if budget is not None and budget.expired():
+                budget.truncated = True
+                return
+            try:
+                content = get_article_text(art)
+                if not content:
+                    continue
+
+                matches = list(iter_matches(content, variants, search_type))
+            except Exception as e:
+                print(f"Error processing article {art.id}: {e}")
+                continue
+
+            if matches:
+                yield art, content, matches
+
+    def remove_article(self, article_id):
+        # An FTS5 mirror left from an earlier SEARCH_BACKEND must not keep the
+        # deleted article as a candidate once that backend is switched back on
+        if FTS5SearchBackend.text_table in connection.introspection.table_names():
+            FTS5SearchBackend().remove_article(article_id)
+
+
+class FTS5SearchBackend(RegexSearchBackend):
+    """
+    Regex scan restricted to the articles an FTS5 index says can match.
+
+    Word queries use a unicode61 table with a prefix phrase query, suffix
+    queries use a trigram table with a substring query. Queries the index
+    can't answer (trigram needs at least 3 characters) scan every article.
+    """
+    text_table = 'searching_articletext'
+    word_table = 'searching_articletext_words'
+    trigram_table = 'searching_articletext_trigram'
+
+    def match_expression(self, variants, search_type):
+        """FTS5 MATCH expression for the variants, or None if it can't filter."""
+        phrases = []
+        for variant in variants:
+            if not variant.strip():
+                continue
+            quoted = '"%s"' % variant.replace('"', '""')
+            if search_type == 'word':
+                if not re.search(r'[^\W_]', variant):
+                    return None
+                phrases.append(quoted + '*')
+            else:
+                if len(variant) < 3:
+                    return None
+                phrases.append(quoted)
+        return ' OR '.join(phrases) or None
+
+    def candidates(self, articles, variants, search_type):
+        expression = self.match_expression(variants, search_type)
+        if expression is None:
+            return articles
+
+        table = self.word_table if search_type == 'word' else self.trigram_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+            ids = {row[0] for row in cursor.fetchall()}
+        return [art for art in articles if art.pk in ids]
+
+    def _delete(self, cursor, article_id):
+        # External content tables must be told the old text to drop its terms
+        cursor.execute(f'SELECT body FROM {self.text_table} WHERE article_id = %s', [article_id])
+        row = cursor.fetchone()
+        if row is None:
+            return
+        for table in (self.word_table, self.trigram_table):
+            cursor.execute(
+                f"INSERT INTO {table}({table}, rowid, body) VALUES ('delete', %s, %s)",
+                [article_id, row[0]],
+            )
+        cursor.execute(f'DELETE FROM {self.text_table} WHERE article_id = %s', [article_id])
+
+    def index_article(self, art):
+        content = read_article_text(art)
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, art.pk)
+            cursor.execute(f'INSERT INTO {self.text_table}(article_id, body) VALUES (%s, %s)', [art.pk, content])
+            for table in (self.word_table, self.trigram_table):
+                cursor.execute(f'INSERT INTO {table}(rowid, body) VALUES (%s, %s)', [art.pk, content])
+
+    def remove_article(self, article_id):
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, article_id)
+
+    def rebuild(self, articles):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.text_table}')
+            for art in articles:
+                cursor.execute(
+                    f'INSERT INTO {self.text_table}(article_id, body) VALUES (%s, %s)',
+                    [art.pk, read_article_text(art)],
+                )
+            for table in (self.word_table, self.trigram_table):
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+_BACKENDS = {}
+
+
+def get_search_backend(path=None):
+    """Return the (per-process) backend instance named by settings.SEARCH_BACKEND."""
+    path = path or settings.SEARCH_BACKEND
+    backend = _BACKENDS.get(path)
+    if backend is None:
+        backend = _BACKENDS[path] = import_string(path)()
+    return backend
@@ -0,0 +1,105 @@
+"""
+Keeping one search from tying up the server.
+
+Before a search runs, estimate_search_cost() sizes it up: the backend's
+candidate articles (with FTS5 only the documents containing the term) and
+how much text they hold. Searches over SEARCH_EXPENSIVE_SIZE, or suffix
+searches for one or two letters, count as expensive and must hold one of
+SEARCH_EXPENSIVE_SLOTS slots shared by all worker processes, so a few of
+them can't take every worker while cheap searches still go straight through.
+
+Every search also gets a SearchBudget: iter_search_hits() stops building
+hits after SEARCH_HIT_BUDGET of them and stops scanning altogether after
+SEARCH_TIME_BUDGET seconds, and the page says "first N of at least M".
+"""
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .backends import get_search_backend
+from .corpus import article_text_size
+from .hitcache import has_cached_matches
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process limit
+    fcntl = None
+
+SHORT_SUFFIX = 2
+
+SearchCost = namedtuple('SearchCost', 'documents text_size expensive')
+
+
+def estimate_search_cost(articles, search_variants, search_ty):
+    """SearchCost of searching these articles, from the backend's candidates and text sizes."""
+    if has_cached_matches(search_variants, search_ty):
+        # Precomputed by top_queries --warm: nothing to scan
+        return SearchCost(0, 0, False)
+    candidates = list(get_search_backend().candidates(articles, search_variants, search_ty))
+    text_size = sum(article_text_size(art) for art in candidates)
+    shortest = min((len(v) for v in search_variants), default=0)
+    expensive = (
+        text_size > settings.SEARCH_EXPENSIVE_SIZE
+        or (search_ty == 'suffix' and shortest <= SHORT_SUFFIX)
+    )
+    return SearchCost(len(candidates), text_size, expensive)
+
+
+class SearchBudget:
+    """Hit and time limits for one search, filled in by iter_search_hits()."""
+
+    def __init__(self, max_hits=None, seconds=None):
+        self.max_hits = max_hits
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.hits = 0
+        # Lower bound on the hits there would have been without the hit limit
+        self.found_at_least = 0
+        self.truncated = False
+
+    @property
+    def full(self):
+        return self.max_hits is not None and self.hits >= self.max_hits
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+
+def default_budget():
+    return SearchBudget(settings.SEARCH_HIT_BUDGET or None, settings.SEARCH_TIME_BUDGET or None)
+
+
+@contextmanager
+def search_slot(expensive):
+    """
+    Hold one of the expensive-search slots (an flock()ed file each) while the
+    block runs. Yields True once a slot is held, or False if none frees up in
+    SEARCH_SLOT_WAIT seconds. Cheap searches don't need a slot.
+    """
+    slots = settings.SEARCH_EXPENSIVE_SLOTS
+    if not expensive or slots <= 0 or fcntl is None:
+        yield True
+        return
+
+    os.makedirs(settings.SEARCH_SLOTS_DIR, exist_ok=True)
+    deadline = time.monotonic() + settings.SEARCH_SLOT_WAIT
+    while True:
+        for index in range(slots):
+            lock_file = open(os.path.join(settings.SEARCH_SLOTS_DIR, f'slot-{index}.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            return
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.05)
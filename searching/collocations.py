@@ -0,0 +1,220 @@
+"""
+Collocates of a word and frequent n-grams, from the token streams.
+
+collocates() finds every occurrence of the node (the query's key and its
+suffixed forms, as in a word search) in TokenStreams, gathers the ids
+within ±window tokens of each without crossing an article boundary, and
+counts them with one bincount. Each candidate is then scored against its
+frequency in the same part of the corpus (all of it, or one style):
+
+    O    co-occurrences within the window
+    E    slots * f(collocate) / N, slots = window positions looked at
+    MI   log2(O / E)
+    t    (O - E) / sqrt(O)
+    LL   Dunning's log-likelihood of the 2x2 table (slots, f, N)
+
+ngrams() counts bigrams or trigrams by packing the ids of each run of n
+tokens into one int64 and running np.unique, either over a whole style
+(cached per corpus generation) or only around the occurrences of a node.
+"""
+import numpy as np
+
+from .converters import detect_script_type
+from .generation import corpus_generation
+from .termstats import document_vectors, word_forms
+from .tokens import get_token_streams
+from .vocabulary import get_vocabulary, word_key
+
+DEFAULT_WINDOW = 4
+MAX_WINDOW = 10
+DEFAULT_MIN_COUNT = 3
+MAX_RESULTS = 200
+NGRAM_SIZES = (2, 3)
+
+# Sort keys of collocates(): ?measure= value -> label
+MEASURES = {
+    'll': 'Log-likelihood',
+    'mi': 'MI',
+    't': 't-score',
+}
+
+
+def _memo(streams, key, build):
+    """build() once per corpus generation for this TokenStreams."""
+    generation = corpus_generation()
+    if streams.memo.get('generation') != generation:
+        streams.memo = {'generation': generation}
+    if key not in streams.memo:
+        streams.memo[key] = build()
+    return streams.memo[key]
+
+
+def _documents(streams, style):
+    """Boolean mask of the documents in style ('' for all) that still exist."""
+    style_index, styles, year, alive = document_vectors(streams)
+    if not style:
+        return alive
+    if style not in styles:
+        return np.zeros(len(streams), dtype=bool)
+    return alive & (style_index == styles.index(style))
+
+
+def _token_mask(streams, style):
+    """Boolean mask of the tokens of the documents in style."""
+    tokens, offsets = streams.arrays()
+    return np.repeat(_documents(streams, style), np.diff(offsets))
+
+
+def _frequencies(streams, style):
+    """(frequency of every term, total tokens) within style."""
+    def build():
+        tokens, offsets = streams.arrays()
+        selected = tokens[_token_mask(streams, style)]
+        return np.bincount(selected, minlength=len(get_vocabulary())), len(selected)
+    return _memo(streams, ('frequencies', style), build)
+
+
+def _node_positions(streams, key, style):
+    """Stream positions of the node's forms in style's documents."""
+    forms = word_forms(get_vocabulary(), key)
+    if not forms:
+        return np.zeros(0, dtype=np.int64)
+    tokens, offsets = streams.arrays()
+    positions = np.flatnonzero(np.isin(tokens, np.asarray(forms, dtype=np.uint32)))
+    return positions[_token_mask(streams, style)[positions]]
+
+
+def _bounds(streams, positions):
+    """Start and end (exclusive) of the document each position is in."""
+    tokens, offsets = streams.arrays()
+    doc = np.searchsorted(offsets, positions, side='right') - 1
+    return offsets[doc].astype(np.int64), offsets[doc + 1].astype(np.int64)
+
+
+def _log_likelihood(o11, o12, o21, o22):
+    """Dunning's G2 of 2x2 tables given as arrays of their four cells."""
+    n = o11 + o12 + o21 + o22
+    rows, cols = (o11 + o12, o21 + o22), (o11 + o21, o12 + o22)
+    total = np.zeros(len(o11))
+    for observed, row, col in ((o11, 0, 0), (o12, 0, 1), (o21, 1, 0), (o22, 1, 1)):
+        expected = rows[row] * cols[col] / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            term = np.where(observed > 0, observed * np.log(observed / expected), 0.0)
+        total += term
+    return 2 * total
+
+
+def collocates(query, window=DEFAULT_WINDOW, style='', measure='ll', min_count=DEFAULT_MIN_COUNT, limit=50):
+    """
+    Strongest collocates of query within ±window tokens, or None without
+    token streams: {'node_count', 'tokens', 'collocates': [{'word', 'count',
+    'expected', 'frequency', 'mi', 't', 'll'}]} sorted by measure, words in
+    the query's script.
+    """
+    streams = get_token_streams()
+    key = word_key(query.strip())
+    if streams is None or not key:
+        return None
+    vocabulary = get_vocabulary()
+    tokens = streams.arrays()[0]
+    positions = _node_positions(streams, key, style)
+    frequencies, total = _frequencies(streams, style)
+
+    starts, ends = _bounds(streams, positions)
+    neighbours = []
+    for shift in range(-window, window + 1):
+        if shift:
+            around = positions + shift
+            neighbours.append(tokens[around[(around >= starts) & (around < ends)]])
+    neighbours = np.concatenate(neighbours) if neighbours else np.zeros(0, dtype=np.uint32)
+    slots = len(neighbours)
+
+    cooccurrences = np.bincount(neighbours, minlength=len(vocabulary))
+    candidates = np.flatnonzero(cooccurrences >= max(min_count, 1))
+    observed = cooccurrences[candidates].astype(float)
+    frequency = frequencies[candidates].astype(float)
+    expected = slots * frequency / total if total else np.zeros(len(candidates))
+    scores = {
+        'mi': np.log2(observed / expected),
+        't': (observed - expected) / np.sqrt(observed),
+        'll': _log_likelihood(observed, slots - observed, frequency - observed, total - slots - frequency + observed),
+    }
+
+    order = np.argsort(-scores[measure if measure in MEASURES else 'll'], kind='stable')
+    best = order[:max(1, min(limit, MAX_RESULTS))]
+    cyrillic = detect_script_type(query) == 'cyrillic'
+    return {
+        'node_count': len(positions),
+        'tokens': int(total),
+        'collocates': [
+            {
+                'word': vocabulary.display(int(candidates[i]), cyrillic),
+                'count': int(observed[i]),
+                'expected': float(expected[i]),
+                'frequency': int(frequency[i]),
+                'mi': float(scores['mi'][i]),
+                't': float(scores['t'][i]),
+                'll': float(scores['ll'][i]),
+            }
+            for i in best
+        ],
+    }
+
+
+def _count_ngrams(tokens, starts, n, n_terms):
+    """(packed n-grams, counts), most frequent first, of the runs of n tokens beginning at starts."""
+    if n_terms ** n >= 2 ** 63:
+        raise ValueError(f'vocabulary too large for {n}-grams')
+    packed = np.zeros(len(starts), dtype=np.int64)
+    for i in range(n):
+        packed = packed * n_terms + tokens[starts + i]
+    packed, counts = np.unique(packed, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return packed[order], counts[order]
+
+
+def _unpack(packed, n, n_terms):
+    ids = []
+    for i in range(n):
+        packed, term = divmod(packed, n_terms)
+        ids.append(term)
+    return ids[::-1]
+
+
+def ngrams(n, style='', query='', limit=50):
+    """
+    Most frequent n-grams [(words, count)] of style ('' for all), only those
+    containing query's forms if given; None without token streams.
+    """
+    streams = get_token_streams()
+    if streams is None or n not in NGRAM_SIZES:
+        return None
+    key = word_key(query.strip())
+    vocabulary = get_vocabulary()
+    n_terms = len(vocabulary)
+    tokens, offsets = streams.arrays()
+
+    if key:
+        positions = _node_positions(streams, key, style)
+        doc_starts, doc_ends = _bounds(streams, positions)
+        # Every run of n tokens that has the node at one of its n places
+        starts = np.concatenate([positions - shift for shift in range(n)])
+        doc_starts, doc_ends = np.tile(doc_starts, n), np.tile(doc_ends, n)
+        starts = np.unique(starts[(starts >= doc_starts) & (starts + n <= doc_ends)])
+        packed, counts = _count_ngrams(tokens, starts, n, n_terms)
+    else:
+        def build():
+            # Runs that would cross into the next document start in its last n-1 tokens
+            mask = _token_mask(streams, style)
+            for end in offsets[1:].astype(np.int64):
+                mask[max(end - n + 1, 0):end] = False
+            return _count_ngrams(tokens, np.flatnonzero(mask), n, n_terms)
+        packed, counts = _memo(streams, ('ngrams', n, style), build)
+
+    limit = max(1, min(limit, MAX_RESULTS))
+    words = _unpack(packed[:limit], n, n_terms)
+    cyrillic = detect_script_type(query) == 'cyrillic'
+    return [
+        (' '.join(vocabulary.display(int(term[i]), cyrillic) for term in words), int(count))
+        for i, count in enumerate(counts[:limit])
+    ]
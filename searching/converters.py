@@ -0,0 +1,252 @@
+import os
+import re
+
+
+# ——————————————————————————————
+# CUSTOM UZBEK SCRIPT CONVERTER
+# ——————————————————————————————
+
+# Uzbek Cyrillic to Latin alphabet mapping
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'А': 'A',
+    'б': 'b', 'Б': 'B',
+    'в': 'v', 'В': 'V',
+    'г': 'g', 'Г': 'G',
+    'д': 'd', 'Д': 'D',
+    'е': 'e', 'Е': 'E',
+    'ё': 'yo', 'Ё': 'Yo',
+    'ж': 'j', 'Ж': 'J',
+    'з': 'z', 'З': 'Z',
+    'и': 'i', 'И': 'I',
+    'й': 'y', 'Й': 'Y',
+    'к': 'k', 'К': 'K',
+    'л': 'l', 'Л': 'L',
+    'м': 'm', 'М': 'M',
+    'н': 'n', 'Н': 'N',
+    'о': 'o', 'О': 'O',
+    'п': 'p', 'П': 'P',
+    'р': 'r', 'Р': 'R',
+    'с': 's', 'С': 'S',
+    'т': 't', 'Т': 'T',
+    'у': 'u', 'У': 'U',
+    'ф': 'f', 'Ф': 'F',
+    'х': 'x', 'Х': 'X',
+    'ц': 's', 'Ц': 'S',
+    'ч': 'ch', 'Ч': 'Ch',
+    'ш': 'sh', 'Ш': 'Sh',
+    'щ': 'sh', 'Щ': 'Sh',
+    'ъ': "'", 'Ъ': "'",
+    'ы': 'i', 'Ы': 'I',
+    'ь': "'", 'Ь': "'",
+    'э': 'e', 'Э': 'E',
+    'ю': 'yu', 'Ю': 'Yu',
+    'я': 'ya', 'Я': 'Ya',
+    'ў': "o'", 'Ў': "O'",
+    'ғ': "g'", 'Ғ': "G'",
+    'қ': 'q', 'Қ': 'Q',
+    'ҳ': 'h', 'Ҳ': 'H'
+}
+
+# Create reverse mapping (Latin to Cyrillic)
+LATIN_TO_CYRILLIC = {}
+for cyr, lat in CYRILLIC_TO_LATIN.items():
+    if lat not in LATIN_TO_CYRILLIC:
+        LATIN_TO_CYRILLIC[lat] = []
+    LATIN_TO_CYRILLIC[lat].append(cyr)
+
+
+def cyrillic_to_latin_converter(text):
+    """Convert Uzbek Cyrillic text to Latin using custom mapping"""
+    if not text:
+        return text
+
+    result = ''
+    for char in text:
+        result += CYRILLIC_TO_LATIN.get(char, char)
+    return result
+
+
+def latin_to_cyrillic_converter(text):
+    """Convert Uzbek Latin text to Cyrillic using custom mapping"""
+    if not text:
+        return text
+
+    result = text
+    # Sort by length (longest first) to handle multi-character mappings correctly
+    sorted_latin_keys = sorted(LATIN_TO_CYRILLIC.keys(), key=len, reverse=True)
+
+    for latin_char in sorted_latin_keys:
+        cyrillic_options = LATIN_TO_CYRILLIC[latin_char]
+        if cyrillic_options:
+            # Use lowercase version by default, but preserve case
+            cyrillic_char = next((c for c in cyrillic_options if c.islower()), cyrillic_options[0])
+
+            # Create regex pattern, escaping special characters
+            pattern = re.escape(latin_char)
+            regex = re.compile(pattern, re.IGNORECASE)
+
+            def replace_func(match):
+                matched = match.group(0)
+                if matched.isupper():
+                    return cyrillic_char.upper() if cyrillic_char.islower() else cyrillic_char
+                elif matched.istitle():
+                    return cyrillic_char.capitalize() if cyrillic_char.islower() else cyrillic_char
+                else:
+                    return cyrillic_char.lower() if cyrillic_char.isupper() else cyrillic_char
+
+            result = regex.sub(replace_func, result)
+
+    return result
+
+
+def detect_script_type(text):
+    """Detect if text is primarily Cyrillic, Latin, or mixed"""
+    if not text:
+        return 'unknown'
+
+    cyrillic_count = len(re.findall(r'[а-яёўғқҳ]', text, re.IGNORECASE))
+    latin_count = len(re.findall(r'[a-z\']', text, re.IGNORECASE))
+
+    total = cyrillic_count + latin_count
+    if total == 0:
+        return 'unknown'
+
+    cyrillic_ratio = cyrillic_count / total
+
+    if cyrillic_ratio > 0.7:
+        return 'cyrillic'
+    elif cyrillic_ratio < 0.3:
+        return 'latin'
+    else:
+        return 'mixed'
+
+
+def generate_search_variants(search_term):
+    """Generate both Cyrillic and Latin variants of search term"""
+    if not search_term:
+        return [search_term]
+
+    variants = [search_term]
+    script_type = detect_script_type(search_term)
+
+    if script_type in ['cyrillic', 'mixed']:
+        latin_variant = cyrillic_to_latin_converter(search_term)
+        if latin_variant != search_term:
+            variants.append(latin_variant)
+
+    if script_type in ['latin', 'mixed']:
+        cyrillic_variant = latin_to_cyrillic_converter(search_term)
+        if cyrillic_variant != search_term:
+            variants.append(cyrillic_variant)
+
+    return list(set(variants))  # Remove duplicates
+
+
+# ——————————————————————————————
+# STREAMING TRANSLITERATION
+# ——————————————————————————————
+
+# Apostrophe forms accepted in Latin o', g' and the hard sign
+LATIN_APOSTROPHES = "'ʻʼ‘’`"
+TRANSLITERATE_CHUNK_CHARS = 1 << 20
+
+_TO_LATIN_TABLE = str.maketrans(CYRILLIC_TO_LATIN)
+
+
+def _latin_tokens():
+    """{lowercase Latin letter or digraph: lowercase Cyrillic}, as latin_to_cyrillic_converter picks them."""
+    tokens = {}
+    for latin, cyrillic_options in LATIN_TO_CYRILLIC.items():
+        cyrillic_char = next((c for c in cyrillic_options if c.islower()), cyrillic_options[0]).lower()
+        for apostrophe in LATIN_APOSTROPHES if "'" in latin else "'":
+            tokens.setdefault(latin.lower().replace("'", apostrophe), cyrillic_char)
+    # "yo'l" is йўл, not ёъл
+    for apostrophe in LATIN_APOSTROPHES:
+        tokens[f'yo{apostrophe}'] = 'йў'
+    return tokens
+
+
+_LATIN_TOKENS = _latin_tokens()
+_LATIN_TOKEN_RE = re.compile(
+    '|'.join(re.escape(t) for t in sorted(_LATIN_TOKENS, key=len, reverse=True)), re.IGNORECASE
+)
+_MAX_TOKEN = max(len(t) for t in _LATIN_TOKENS)
+
+
+def _cyrillic_token(match):
+    matched = match.group(0)
+    cyrillic_char = _LATIN_TOKENS[matched.lower()]
+    if matched.isupper():
+        return cyrillic_char.upper()
+    if matched.istitle():
+        return cyrillic_char.capitalize()
+    return cyrillic_char
+
+
+class Transliterator:
+    """
+    Incremental Uzbek transliteration: feed() text in pieces of any size and
+    the concatenated output equals converting the whole text at once.
+
+    Cyrillic to Latin is per character. Latin to Cyrillic matches the
+    longest token first ('sh' before 's', "o'" before 'o'), so the last
+    _MAX_TOKEN - 1 characters of a piece, which might begin a digraph whose
+    rest is in the next piece, are held back and matched with it.
+    """
+
+    def __init__(self, to):
+        if to not in ('latin', 'cyrillic'):
+            raise ValueError(f'Unknown script {to!r}')
+        self.to = to
+        self._pending = ''
+
+    def feed(self, text):
+        if self.to == 'latin':
+            return text.translate(_TO_LATIN_TABLE)
+        text = self._pending + text
+        # The last characters could still start a digraph with the next piece
+        hold = len(text) - (_MAX_TOKEN - 1)
+        out = []
+        pos = 0
+        for match in _LATIN_TOKEN_RE.finditer(text):
+            if match.start() >= hold:
+                break
+            out.append(text[pos:match.start()])
+            out.append(_cyrillic_token(match))
+            pos = match.end()
+        hold = max(pos, hold)
+        out.append(text[pos:hold])
+        self._pending = text[hold:]
+        return ''.join(out)
+
+    def finish(self):
+        if self.to == 'latin' or not self._pending:
+            return ''
+        text, self._pending = self._pending, ''
+        return _LATIN_TOKEN_RE.sub(_cyrillic_token, text)
+
+
+def transliterate_file(source, target, to, chunk_chars=TRANSLITERATE_CHUNK_CHARS, encoding='utf-8'):
+    """
+    Transliterate the text file `source` into `target` (may be the same path)
+    reading chunk_chars characters at a time, so memory stays bounded however
+    large the file. Line endings are kept as they are. Returns characters read.
+    """
+    transliterator = Transliterator(to)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    total = 0
+    try:
+        with open(source, encoding=encoding, errors='replace', newline='') as src, \
+                open(tmp, 'w', encoding='utf-8', newline='') as dst:
+            while True:
+                chunk = src.read(chunk_chars)
+                if not chunk:
+                    break
+                total += len(chunk)
+                dst.write(transliterator.feed(chunk))
+            dst.write(transliterator.finish())
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return total
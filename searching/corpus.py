@@ -0,0 +1,130 @@
+import os
+
+from django.conf import settings
+
+from .generation import GenerationCache, corpus_generation
+from .storage import open_block_text
+
+
+# ——————————————————————————————
+# IN-MEMORY CORPUS CACHE
+# ——————————————————————————————
+# Texts stay cached across generations; a new generation only makes the next
+# read stat the file once to see whether it is still the same.
+_CONTENT_CACHE = {}   # {article_id: (mtime, content, generation last checked)}
+
+# Where each article's text is, resolved once per corpus generation:
+# {article_id: (BlockText or None, plain path, text size)}
+_TEXT_SOURCES = GenerationCache(dict)
+
+
+def article_path(art):
+    """Absolute path of the article's text file under MEDIA_ROOT."""
+    return os.path.join(settings.MEDIA_ROOT, art.file.name)
+
+
+def block_path(art):
+    """Path of the article's block-compressed copy under CORPUS_BLOCKS_ROOT."""
+    return os.path.join(settings.CORPUS_BLOCKS_ROOT, art.file.name + '.ozb')
+
+
+def text_source(art):
+    """
+    (BlockText or None, plain path, size) for an article: its block copy when
+    block storage is on and the copy exists, and the size of whichever copy
+    is read (characters of the block copy, else bytes; 0 if missing).
+    """
+    sources = _TEXT_SOURCES.get()
+    source = sources.get(art.pk)
+    if source is None:
+        block = None
+        if settings.CORPUS_BLOCK_STORAGE:
+            path = block_path(art)
+            if os.path.exists(path):
+                block = open_block_text(path)
+        plain = article_path(art)
+        if block is not None:
+            size = len(block)
+        else:
+            try:
+                size = os.path.getsize(plain)
+            except OSError:
+                size = 0
+        source = sources[art.pk] = (block, plain, size)
+    return source
+
+
+def get_article_text(art):
+    """
+    Text to search for an article: a BlockText over its compressed copy when
+    block storage is on and the copy exists, otherwise the cached plain text.
+    Both support len() and slicing.
+    """
+    block, plain, size = text_source(art)
+    if block is not None:
+        return block
+    return get_cached_content(art, plain)
+
+
+def article_text_size(art):
+    """Size of the article's searchable text without reading it (see text_source)."""
+    return text_source(art)[2]
+
+
+def read_article_text(art):
+    """Whole article text as a str, from whichever copy get_article_text() would use."""
+    text = get_article_text(art)
+    return text[:] if text is not None else ''
+
+
+def get_cached_content(art, path=None):
+    """
+    Return file content from memory. The file is only stat()ed again after
+    the corpus generation changed, and re-read if its mtime did.
+    """
+    generation = corpus_generation()
+    cached = _CONTENT_CACHE.get(art.id)
+    if cached and cached[2] == generation:
+        return cached[1]
+
+    if path is None:
+        path = article_path(art)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if cached and cached[0] == mtime:
+        _CONTENT_CACHE[art.id] = (mtime, cached[1], generation)
+        return cached[1]
+
+    content = read_file_content(path)
+    _CONTENT_CACHE[art.id] = (mtime, content, generation)
+    return content
+
+
+def read_file_content(file_path):
+    """Read file content with proper encoding detection"""
+    try:
+        # Try UTF-8 first
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return content
+    except UnicodeDecodeError:
+        try:
+            # Try cp1251 (common for Cyrillic)
+            with open(file_path, 'r', encoding='cp1251') as f:
+                content = f.read()
+            return content
+        except UnicodeDecodeError:
+            try:
+                # Try latin-1 as last resort
+                with open(file_path, 'r', encoding='latin-1') as f:
+                    content = f.read()
+                return content
+            except Exception as e:
+                print(f"Could not read file {file_path}: {e}")
+                return ""
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        return ""
@@ -0,0 +1,311 @@
+"""
+Memory diagnostics for a running site.
+
+diagnostics_report() describes the process it runs in: resident memory
+(from /proc), every in-process cache with its entry count and approximate
+size, and, if tracemalloc is tracing, the lines that allocated the most.
+Nothing is walked deeper than one level, so a report costs a few
+milliseconds and is safe to ask for in production.
+
+/diagnostika/ (staff, or the DIAGNOSTICS_TOKEN header) returns the report
+of whichever worker served the request, plus the RSS of every server
+process on the machine. `python manage.py diagnostics --url ...` asks
+repeatedly to reach each worker. Tracing is off unless started with
+?trace=start (or PYTHONTRACEMALLOC=1 at startup) and costs memory while on.
+"""
+import hmac
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from .generation import corpus_generation
+
+TRACE_FRAMES = 1
+DEFAULT_TOP = 20
+
+
+# ——————————————————————————————
+# PROCESS MEMORY
+# ——————————————————————————————
+def _proc_status(pid):
+    """{field: kB} of the Vm* lines of /proc/<pid>/status, {} if unavailable."""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Vm'):
+                    name, value = line.split(':', 1)
+                    fields[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return {}
+    return fields
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size (VmHWM) of a process in KB, from /proc; None if unavailable."""
+    return _proc_status(pid).get('VmHWM')
+
+
+def process_memory(pid='self'):
+    """{'rss_kb', 'peak_rss_kb'} of a process (this one by default)."""
+    status = _proc_status(pid)
+    if not status and pid == 'self':
+        # No /proc: only the peak is known
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak // 1024 if sys.platform == 'darwin' else peak
+        return {'rss_kb': None, 'peak_rss_kb': peak}
+    return {'rss_kb': status.get('VmRSS'), 'peak_rss_kb': status.get('VmHWM')}
+
+
+def gunicorn_worker_pids():
+    """Pids of running gunicorn processes on this machine (Linux /proc)."""
+    pids = []
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        # 'gunicorn ...', 'python .../gunicorn ...' or 'python -m gunicorn ...'
+        program = [os.path.basename(arg) for arg in cmdline.split(b'\0')[:3]]
+        if any(arg.startswith(b'gunicorn') for arg in program) and int(entry) != os.getpid():
+            pids.append(int(entry))
+    return pids
+
+
+def server_memory(pids=None):
+    """[{'pid', 'rss_kb', 'peak_rss_kb'}] of the server processes (default: every gunicorn process)."""
+    pids = pids if pids is not None else gunicorn_worker_pids()
+    return [{'pid': pid, **process_memory(pid)} for pid in sorted(pids)]
+
+
+# ——————————————————————————————
+# IN-PROCESS CACHES
+# ——————————————————————————————
+def _content_cache():
+    from .corpus import _CONTENT_CACHE
+    return len(_CONTENT_CACHE), sum(sys.getsizeof(entry[1]) for entry in list(_CONTENT_CACHE.values()))
+
+
+def _block_cache():
+    from .storage import _BLOCK_CACHE
+    return len(_BLOCK_CACHE), sum(sys.getsizeof(text) for text in list(_BLOCK_CACHE.values()))
+
+
+def _block_headers():
+    from .storage import _OPEN_FILES
+    texts = list(_OPEN_FILES.values())
+    return len(texts), sum(sys.getsizeof(t.char_starts) + sys.getsizeof(t.data_starts) for t in texts)
+
+
+def _search_articles():
+    from .views import _SEARCH_ARTICLES
+    return len(_SEARCH_ARTICLES.value or ()), None
+
+
+def _text_sources():
+    from .corpus import _TEXT_SOURCES
+    return len(_TEXT_SOURCES.value or ()), None
+
+
+def _facet_bitmaps():
+    from .facets import _FACET_BITMAPS
+    bitmaps = [bits for values in (_FACET_BITMAPS.value or {}).values() for bits in values.values()]
+    return len(bitmaps), sum(sys.getsizeof(bits) for bits in bitmaps)
+
+
+def _script_maps():
+    from .scriptmap import _SCRIPT_MAPS
+    maps = list((_SCRIPT_MAPS.value or {}).values())
+    return len(maps), sum(sys.getsizeof(m.starts) + sys.getsizeof(m.codes) for m in maps)
+
+
+def _segments():
+    from .segments import _SEGMENTS
+    segments = list((_SEGMENTS.value or {}).values())
+    return len(segments), sum(sys.getsizeof(s.sentences) + sys.getsizeof(s.paragraphs) for s in segments)
+
+
+def _vocabulary():
+    from .vocabulary import _VOCABULARY
+    if _VOCABULARY is None:
+        return 0, 0
+    vocabulary = _VOCABULARY[1]
+    size = sum(sys.getsizeof(part) for part in (vocabulary.counts, vocabulary.offsets, vocabulary.words))
+    return len(vocabulary), size
+
+
+def _term_matrix():
+    from .termstats import _MATRIX
+    if _MATRIX is None:
+        return 0, 0
+    matrix = _MATRIX[1]
+    parts = (matrix.indptr, matrix.docs, matrix.counts, matrix.doc_ids, matrix.doc_tokens)
+    return len(matrix.docs), sum(part.nbytes for part in parts)
+
+
+def _token_streams():
+    from .tokens import _STREAMS
+    if _STREAMS is None:
+        return 0, 0
+    streams = _STREAMS[1]
+    return len(streams.tokens), sum(sys.getsizeof(part) for part in (streams.doc_ids, streams.offsets, streams.tokens))
+
+
+def _repeated_passages():
+    from .passages import _REPEATED_PASSAGES
+    repeated = (_REPEATED_PASSAGES.value or {}).values()
+    return sum(len(sentences) for sentences in repeated), None
+
+
+def _search_patterns():
+    from .backends import compile_search_pattern
+    return compile_search_pattern.cache_info().currsize, None
+
+
+def _highlight_patterns():
+    from .highlight import highlighter
+    return highlighter.pattern.cache_info().currsize, None
+
+
+def _query_log_queue():
+    from .querylog import _QUEUE
+    return _QUEUE.qsize(), None
+
+
+# {name: () -> (entries, approximate bytes or None)}
+IN_PROCESS_CACHES = {
+    'article_texts': _content_cache,
+    'search_articles': _search_articles,
+    'text_sources': _text_sources,
+    'decompressed_blocks': _block_cache,
+    'block_headers': _block_headers,
+    'facet_bitmaps': _facet_bitmaps,
+    'script_maps': _script_maps,
+    'segments': _segments,
+    'vocabulary': _vocabulary,
+    'term_matrix': _term_matrix,
+    'token_streams': _token_streams,
+    'repeated_passages': _repeated_passages,
+    'search_patterns': _search_patterns,
+    'highlight_patterns': _highlight_patterns,
+    'query_log_queue': _query_log_queue,
+}
+
+
+def _django_cache(alias):
+    """(backend, entries, bytes) of a configured Django cache; file caches are sized on disk."""
+    cache = caches[alias]
+    backend = type(cache).__name__
+    if hasattr(cache, '_cache') and isinstance(cache._cache, dict):  # LocMemCache: pickled values
+        values = list(cache._cache.values())
+        return backend, len(values), sum(sys.getsizeof(v) for v in values)
+    if hasattr(cache, '_dir'):  # FileBasedCache
+        entries = size = 0
+        try:
+            with os.scandir(cache._dir) as it:
+                for entry in it:
+                    if entry.name.endswith(cache.cache_suffix):
+                        entries += 1
+                        size += entry.stat().st_size
+        except OSError:
+            pass
+        return backend, entries, size
+    return backend, None, None
+
+
+def cache_stats():
+    """[{'name', 'entries', 'bytes'}] for the in-process caches and the Django caches."""
+    stats = []
+    for name, measure in IN_PROCESS_CACHES.items():
+        entries, size = measure()
+        stats.append({'name': name, 'entries': entries, 'bytes': size})
+    for alias in settings.CACHES:
+        backend, entries, size = _django_cache(alias)
+        stats.append({'name': f'django:{alias} ({backend})', 'entries': entries, 'bytes': size})
+    return stats
+
+
+# ——————————————————————————————
+# TRACEMALLOC
+# ——————————————————————————————
+def tracemalloc_top(limit=DEFAULT_TOP):
+    """
+    {'traced_kb', 'peak_kb', 'sites': [{'site', 'size_kb', 'count'}]} of the
+    `limit` source lines holding the most memory; None if not tracing.
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'traced_kb': current // 1024,
+        'peak_kb': peak // 1024,
+        'sites': [
+            {
+                'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:limit]
+        ],
+    }
+
+
+def set_tracing(action):
+    if action == 'start' and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+    elif action == 'stop' and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def diagnostics_report(top=0):
+    """Memory report of this process; top > 0 adds that many tracemalloc sites."""
+    started = time.perf_counter()
+    report = {
+        'pid': os.getpid(),
+        'memory': process_memory(),
+        'corpus_generation': corpus_generation(),
+        'caches': cache_stats(),
+        'tracing': tracemalloc.is_tracing(),
+    }
+    if top > 0:
+        report['tracemalloc'] = tracemalloc_top(top)
+    report['report_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+# ——————————————————————————————
+# DIAGNOSTICS VIEW
+# ——————————————————————————————
+def diagnostics_allowed(request):
+    if request.user.is_active and request.user.is_staff:
+        return True
+    token = settings.DIAGNOSTICS_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Diagnostics-Token', ''), token)
+
+
+def diagnostics_view(request):
+    """This worker's memory report as JSON (?top=N for tracemalloc sites, ?trace=start|stop)."""
+    if not diagnostics_allowed(request):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    set_tracing(request.GET.get('trace'))
+    try:
+        top = int(request.GET.get('top', 0))
+    except ValueError:
+        top = 0
+    report = diagnostics_report(top)
+    report['server'] = server_memory(set(gunicorn_worker_pids()) | {os.getpid()})
+    return JsonResponse(report)
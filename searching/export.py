@@ -0,0 +1,154 @@
+"""
+Concordance export: every hit of a query as CSV, TSV or XLSX.
+
+Rows are generated one hit at a time from iter_search_hits(), which
+hands over the plain excerpt parts it cut at the match offsets, so memory
+use doesn't grow with the number of hits and nothing is transliterated
+twice. XLSX needs the optional openpyxl package and is written in
+write-only mode.
+
+An export has no hit or time budget, but an expensive one holds a search
+slot (budget.py) like an expensive search. It is written to a temporary
+file with the slot held and sent from there once the slot is free again,
+so a slow download never keeps a slot; cheap CSV/TSV exports go straight
+into a StreamingHttpResponse.
+"""
+import csv
+import io
+import re
+import tempfile
+
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is not offered
+    openpyxl = None
+
+from .budget import estimate_search_cost, search_slot
+from .views import (
+    CONTEXT, DEFAULT_CONTEXT_MODE, STYLES, iter_search_hits,
+    parse_context_mode, parse_filters, parse_search_query, search_articles,
+)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'tsv': 'text/tab-separated-values; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+DELIMITERS = {'csv': ',', 'tsv': '\t'}
+
+EXPORT_COLUMNS = [
+    'author', 'title', 'style', 'genre', 'year', 'doc_id', 'position',
+    'left_lat', 'match_lat', 'right_lat',
+    'left_cyr', 'match_cyr', 'right_cyr',
+]
+
+
+def export_formats():
+    """The EXPORT_FORMATS this server can write: XLSX only with openpyxl installed."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'xlsx' or openpyxl is not None]
+
+
+def _one_line(parts):
+    """Collapse newlines/tabs inside the context so each hit stays on one line."""
+    return [re.sub(r'\s+', ' ', part) for part in parts]
+
+
+class Echo:
+    """File-like object whose write() hands the line back (for streaming csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def concordance_rows(search_variants, search_ty, style_filt, context=CONTEXT,
+                     context_mode=DEFAULT_CONTEXT_MODE, filters=None):
+    """Yield the header, then one row per hit in results-page order."""
+    yield EXPORT_COLUMNS
+
+    # Every hit gets its row, repeated passages included
+    hits = iter_search_hits(search_variants, search_ty, style_filt, context, context_mode, filters,
+                            collapse=False, parts=True)
+    for art, content, hit in hits:
+        yield [
+            hit['author'],
+            hit['title'],
+            STYLES.get(art.style, art.style),
+            art.get_genre_display() if art.genre else '',
+            art.pub_year or '',
+            art.id,
+            hit['match_position'],
+            *_one_line(hit['parts_lat']),
+            *_one_line(hit['parts_cyr']),
+        ]
+
+
+def write_xlsx(rows, output):
+    """Write rows to an .xlsx file (path or binary file object) with openpyxl."""
+    if openpyxl is None:
+        raise ValueError("XLSX export needs the 'openpyxl' package")
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Konkordans')
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+
+
+def write_export(rows, output, fmt):
+    """Write rows to a binary file object as fmt."""
+    if fmt == 'xlsx':
+        write_xlsx(rows, output)
+        return
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    csv.writer(text, delimiter=DELIMITERS[fmt]).writerows(rows)
+    text.detach()
+
+
+def export_filename(query, fmt):
+    return f"korpus_{query}.{fmt}"
+
+
+def export_results(request):
+    """Stream every hit of a search (same parameters as the results page) as a file."""
+    raw_q, search_ty, style_filt, search_variants = parse_search_query(request.GET)
+    fmt = request.GET.get('format', 'csv')
+
+    if not raw_q:
+        return HttpResponseBadRequest("Missing query parameter 'q'")
+    if fmt not in export_formats():
+        return HttpResponseBadRequest(f"Unknown export format '{fmt}'")
+
+    filters = parse_filters(request.GET)
+    rows = concordance_rows(search_variants, search_ty, style_filt,
+                            context_mode=parse_context_mode(request.GET), filters=filters)
+    disposition = content_disposition_header(True, export_filename(raw_q, fmt))
+
+    # Every hit is exported (no hit or time budget), but expensive exports
+    # share the search slots with expensive searches
+    cost = estimate_search_cost(search_articles(style_filt, filters), search_variants, search_ty)
+    if fmt != 'xlsx' and not cost.expensive:
+        writer = csv.writer(Echo(), delimiter=DELIMITERS[fmt])
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type=EXPORT_FORMATS[fmt])
+        response['Content-Disposition'] = disposition
+        return response
+
+    output = tempfile.TemporaryFile()
+    with search_slot(cost.expensive) as has_slot:
+        if not has_slot:
+            output.close()
+            return HttpResponse("Server hozir og'ir so'rovlar bilan band. Birozdan so'ng qayta urinib ko'ring.",
+                                status=503, content_type='text/plain; charset=utf-8')
+        try:
+            write_export(rows, output, fmt)
+        except ValueError as e:
+            output.close()
+            return HttpResponseBadRequest(str(e))
+    # The slot is free again before the download starts
+    output.seek(0)
+    response = FileResponse(output, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = disposition
+    return response
@@ -0,0 +1,136 @@
+"""
+Facet counts (style, genre, publication decade, author) for a search.
+
+For every facet value we keep an int bitmap of the ids of the articles
+that have it, built from one values_list() query and reused until the
+corpus generation changes (see generation.py). The documents with hits become one more
+bitmap, and each count is the popcount of an AND, so the facet panel costs
+a few big-int operations however many hits there are.
+"""
+from collections import defaultdict
+
+from .generation import GenerationCache
+from .models import Article
+from .shards import shard_articles
+
+FACETS = ('style', 'genre', 'decade', 'author')
+FACET_LABELS = {
+    'style': 'Uslub',
+    'genre': 'Janr',
+    'decade': 'Yil',
+    'author': 'Muallif',
+}
+# Search parameters (views.parse_filters) each facet narrows by
+FACET_PARAMS = {
+    'style': ('style',),
+    'genre': ('genre',),
+    'decade': ('year_from', 'year_to'),
+    'author': ('author',),
+}
+AUTHOR_FACET_LIMIT = 10
+UNKNOWN = 'Nomaʼlum'
+
+
+def id_bitmap(ids):
+    """int with bit `pk` set for every pk in ids."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def decade(year):
+    return f'{year // 10 * 10}–{year // 10 * 10 + 9}' if year else ''
+
+
+def _load_facet_bitmaps():
+    ids = {facet: defaultdict(list) for facet in FACETS}
+    rows = shard_articles(Article.objects.all()).values_list('pk', 'style', 'genre', 'pub_year', 'author')
+    for pk, style, genre, pub_year, author in rows:
+        ids['style'][style or ''].append(pk)
+        ids['genre'][genre or ''].append(pk)
+        ids['decade'][decade(pub_year)].append(pk)
+        ids['author'][author.lstrip('—– -').strip()].append(pk)
+    return {
+        facet: {value: id_bitmap(pks) for value, pks in values.items()}
+        for facet, values in ids.items()
+    }
+
+
+# {facet: {value: int bitmap of article ids}} for the articles this node searches
+_FACET_BITMAPS = GenerationCache(_load_facet_bitmaps)
+
+
+def facet_bitmaps():
+    """Per-facet value bitmaps, built once per corpus generation."""
+    return _FACET_BITMAPS.get()
+
+
+def facet_counts(doc_ids):
+    """{facet: {value: number of documents in doc_ids}}, zero counts left out."""
+    docs = id_bitmap(doc_ids)
+    counts = {}
+    for facet, bitmaps in facet_bitmaps().items():
+        counts[facet] = {}
+        for value, bits in bitmaps.items():
+            count = (bits & docs).bit_count()
+            if count:
+                counts[facet][value] = count
+    return counts
+
+
+def merge_facet_counts(partials):
+    """Sum facet_counts() results from several shards."""
+    merged = {facet: defaultdict(int) for facet in FACETS}
+    for partial in partials:
+        for facet, values in partial.items():
+            for value, count in values.items():
+                merged[facet][value] += count
+    return {facet: dict(values) for facet, values in merged.items()}
+
+
+def facet_filter_query(params, facet, value):
+    """params (request.GET) with the search narrowed to one facet value, urlencoded."""
+    params = params.copy()
+    for key in ('page', 'format', *FACET_PARAMS[facet]):
+        params.pop(key, None)
+    if facet == 'decade':
+        start = int(value.split('–')[0])  # decade() label, e.g. '980–989'
+        params['year_from'], params['year_to'] = start, start + 9
+    else:
+        params[facet] = value
+    return params.urlencode()
+
+
+def facet_panel(counts, params=None):
+    """
+    Template-ready facets, largest count first:
+    [{'key', 'label', 'values': [(filter query string or None, label, count)]}].
+    """
+    labels = {
+        'style': dict(Article.STYLE_CHOICES),
+        'genre': dict(Article.GENRE_CHOICES),
+    }
+    panel = []
+    for facet in FACETS:
+        values = sorted(counts.get(facet, {}).items(), key=lambda item: (-item[1], item[0]))
+        if facet == 'decade':
+            values.sort(key=lambda item: item[0] or '~')
+        if facet == 'author':
+            values = values[:AUTHOR_FACET_LIMIT]
+        panel.append({
+            'key': facet,
+            'label': FACET_LABELS[facet],
+            'values': [
+                (
+                    facet_filter_query(params, facet, value) if params is not None and value else None,
+                    labels.get(facet, {}).get(value, value) or UNKNOWN,
+                    count,
+                )
+                for value, count in values
+            ],
+        })
+    return panel
@@ -0,0 +1,113 @@
+"""
+Corpus generation: one number that changes whenever the corpus does.
+
+The number lives in the 8-byte file CORPUS_GENERATION_FILE, which every
+process on the machine maps into memory, so reading it is a memory load
+rather than a syscall or a query. It is bumped (under an flock) when an
+Article is saved or deleted (signals.py), when the article worker has
+reprocessed a file (jobs.process_article) and when `sweep_corpus` finds a
+file changed on disk. A new file starts from the current time in
+microseconds, so a recreated file never repeats an old generation, and
+the file's mtime is when the current generation began (pagecache.py
+sends it as Last-Modified).
+
+Per-process caches of corpus data (the article list, text sources, facet
+bitmaps, corpus statistics) are GenerationCaches: they compare one integer
+per use and rebuild when it moved, instead of stat()ing every article.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are not serialized across processes
+    fcntl = None
+
+_COUNTER = struct.Struct('<Q')
+_map = None
+_map_lock = threading.Lock()
+
+
+def _generation_map():
+    global _map
+    if _map is None:
+        with _map_lock:
+            if _map is None:
+                path = settings.CORPUS_GENERATION_FILE
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    if os.fstat(fd).st_size < _COUNTER.size:
+                        os.ftruncate(fd, _COUNTER.size)
+                        os.write(fd, _COUNTER.pack(time.time_ns() // 1000))
+                    _map = mmap.mmap(fd, _COUNTER.size)
+                finally:
+                    # Unlock explicitly: the mmap keeps a dup of fd open
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+    return _map
+
+
+@receiver(setting_changed)
+def _forget_generation_map(setting, **kwargs):
+    # Tests point CORPUS_GENERATION_FILE at a temporary file
+    global _map
+    if setting == 'CORPUS_GENERATION_FILE':
+        with _map_lock:
+            _map = None
+
+
+def corpus_generation():
+    """Current corpus generation (an int)."""
+    return _COUNTER.unpack_from(_generation_map())[0]
+
+
+def bump_generation():
+    """Start a new corpus generation; returns it."""
+    counter = _generation_map()
+    fd = os.open(settings.CORPUS_GENERATION_FILE, os.O_RDWR)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        generation = _COUNTER.unpack_from(counter)[0] + 1
+        _COUNTER.pack_into(counter, 0, generation)
+        # Writes through the mapping need not touch the mtime, which dates the generation
+        os.utime(settings.CORPUS_GENERATION_FILE)
+    finally:
+        os.close(fd)  # drops the flock
+    return generation
+
+
+def generation_time():
+    """When the current corpus generation started (a timestamp)."""
+    _generation_map()
+    return os.path.getmtime(settings.CORPUS_GENERATION_FILE)
+
+
+class GenerationCache:
+    """A value built by build() once per corpus generation."""
+
+    def __init__(self, build):
+        self.build = build
+        self.generation = None
+        self.value = None
+
+    def get(self):
+        generation = corpus_generation()
+        if generation != self.generation:
+            self.value = self.build()
+            self.generation = generation
+        return self.value
+
+    def clear(self):
+        self.generation = self.value = None
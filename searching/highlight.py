@@ -0,0 +1,100 @@
+"""
+One place for wrapping matches in <span class="highlight">.
+
+The search view already knows where every hit is, so it hands the offsets
+to Highlighter.excerpt() and nothing is searched twice. The template
+filters only have a query string; they go through Highlighter.highlight(),
+which compiles the query's pattern once and keeps it in an LRU cache.
+
+Both return HTML: the text around and inside the highlight is escaped
+(after any transliteration, which works on the plain text), so a corpus
+file can't inject markup into the results page.
+"""
+import html
+import re
+from functools import lru_cache
+
+from .converters import generate_search_variants
+
+# Private-use characters that mark the match while an excerpt is
+# transliterated; neither converter touches them.
+_MATCH_START = '\ue000'
+_MATCH_END = '\ue001'
+
+
+def _escape(text):
+    # Excerpts only go into element content: quotes (and Uzbek apostrophes) stay as they are
+    return html.escape(text, quote=False)
+
+
+class Highlighter:
+    open_tag = '<span class="highlight">'
+    close_tag = '</span>'
+
+    def __init__(self, cache_size=512):
+        self.pattern = lru_cache(maxsize=cache_size)(self._compile)
+
+    def _compile(self, query, search_type):
+        """Regex matching every script variant of query ('word' or 'suffix' mode)."""
+        variants = sorted(
+            {v.lower() for v in generate_search_variants(query.strip()) if v},
+            key=len, reverse=True,
+        )
+        if not variants:
+            return None
+        alternation = '|'.join(re.escape(v) for v in variants)
+        if search_type == 'word':
+            return re.compile(rf'\b(?:{alternation})\b', re.IGNORECASE)
+        return re.compile(rf'\w*(?:{alternation})\b', re.IGNORECASE)
+
+    def mark(self, text, spans):
+        """HTML of text with each (start, end) span wrapped; spans must be sorted and non-overlapping."""
+        parts = []
+        pos = 0
+        for start, end in spans:
+            parts.append(_escape(text[pos:start]))
+            parts.append(self.open_tag + _escape(text[start:end]) + self.close_tag)
+            pos = end
+        parts.append(_escape(text[pos:]))
+        return ''.join(parts)
+
+    def highlight(self, text, query, search_type='word'):
+        """HTML of text with every occurrence of query highlighted (used when no offsets are known)."""
+        if not text:
+            return ''
+        regex = self.pattern(query, search_type) if query else None
+        if regex is None:
+            return _escape(text)
+        return self.mark(text, [m.span() for m in regex.finditer(text) if m.end() > m.start()])
+
+    def _context(self, content, start, end, context, window):
+        window_start, window_end = window or (max(0, start - context), end + context)
+        return content[window_start:start].lstrip(), content[end:window_end].rstrip()
+
+    def split(self, content, start, end, context=50, convert=None, window=None):
+        """
+        (left context, match, right context) around the match at [start, end),
+        optionally passed through a script converter in a single call.
+        `window` = (start, end) of the context replaces the ±context characters.
+        """
+        left, right = self._context(content, start, end, context, window)
+        if convert is None:
+            return left, content[start:end], right
+        text = convert(left + _MATCH_START + content[start:end] + _MATCH_END + right)
+        left, rest = text.split(_MATCH_START, 1)
+        match, right = rest.split(_MATCH_END, 1)
+        return left, match, right
+
+    def html(self, left, match, right):
+        """HTML of split() parts, the match highlighted."""
+        return _escape(left) + self.open_tag + _escape(match) + self.close_tag + _escape(right)
+
+    def excerpt(self, content, start, end, context=50, convert=None, window=None):
+        """
+        HTML excerpt of content around the match at [start, end) with the
+        match highlighted, optionally passed through a script converter.
+        """
+        return self.html(*self.split(content, start, end, context, convert, window))
+
+
+highlighter = Highlighter()
@@ -0,0 +1,62 @@
+"""
+Precomputed match lists for popular queries.
+
+`top_queries --warm` (and the article worker after a corpus change) runs
+the most frequent searches from the query log over this node's whole
+corpus and stores every article's matches in the 'search' cache, keyed on
+the query variants, search type, shard and corpus generation. iter_search_hits()
+then takes the stored matches instead of scanning the texts, whatever the
+style, filters, context or sort of the search; only excerpts are built.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .backends import get_search_backend
+from .converters import generate_search_variants
+from .generation import corpus_generation
+from .models import Article
+from .querylog import read_query_log, top_queries
+from .shards import shard_articles
+
+
+def matches_key(search_variants, search_ty, version=None):
+    variants = '|'.join(sorted({v.lower() for v in search_variants}))
+    version = version if version is not None else corpus_generation()
+    raw = f'{version}\0{settings.CORPUS_SHARD}\0{search_ty}\0{variants}'
+    return 'matches:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cached_matches(search_variants, search_ty):
+    """{article_id: matches} stored for this search, or None."""
+    return caches['search'].get(matches_key(search_variants, search_ty))
+
+
+def has_cached_matches(search_variants, search_ty):
+    return caches['search'].has_key(matches_key(search_variants, search_ty))
+
+
+def warm_matches(search_variants, search_ty):
+    """Scan the corpus once for this search and store the matches; returns the match count."""
+    articles = shard_articles(Article.objects.all())
+    matches = {
+        art.pk: found
+        for art, content, found in get_search_backend().search(articles, search_variants, search_ty)
+    }
+    caches['search'].set(matches_key(search_variants, search_ty), matches, timeout=None)
+    return sum(len(found) for found in matches.values())
+
+
+def warm_popular_queries(limit=None, since=None, log=None):
+    """Warm the `limit` most frequent searches in log (default QUERY_LOG); returns [(query, type, matches)]."""
+    limit = limit if limit is not None else settings.QUERY_WARM_COUNT
+    warmed = []
+    for (_, search_ty), stats in top_queries(read_query_log(log, since), limit):
+        query = stats['query']
+        variants = generate_search_variants(query)
+        if not variants:
+            continue
+        if not has_cached_matches(variants, search_ty):
+            warmed.append((query, search_ty, warm_matches(variants, search_ty)))
+    return warmed
@@ -0,0 +1,183 @@
+"""
+Local article processing queue.
+
+Saving an Article only enqueues an ArticleJob; the `process_article_jobs`
+worker command picks jobs up and runs process_article() on them, so admin
+uploads return without reading the file. Failed jobs are retried with
+exponential backoff until max_attempts, then marked failed with the
+traceback kept in last_error. A job left running for LEASE_TIMEOUT (its
+worker crashed or was killed) is taken up again by the next worker and
+the lost run counts as a failed attempt.
+"""
+import hashlib
+import os
+import re
+import traceback
+from datetime import timedelta
+
+import chardet
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .backends import get_search_backend
+from .converters import detect_script_type
+from .generation import bump_generation
+from .corpus import article_path, block_path, read_article_text
+from .storage import write_block_file
+from .models import Article, ArticleIndex, ArticleJob
+from .passages import build_sentence_hashes
+from .scriptmap import build_script_map
+from .segments import build_segments, sentence_count
+
+RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+LEASE_TIMEOUT = 3600  # seconds a running job may go without finishing before it is reclaimed
+
+
+def _universal_newlines(text):
+    """Newlines as text-mode open() reads them, so stored offsets match search."""
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def normalize_encoding(path):
+    """Return the file's text, rewriting it as UTF-8 first if it was in another encoding."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return _universal_newlines(raw.decode('utf-8'))
+    except UnicodeDecodeError:
+        pass
+
+    encoding = chardet.detect(raw)['encoding'] or 'cp1251'
+    text = raw.decode(encoding, errors='replace')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f"Re-encoded {path} from {encoding} to UTF-8")
+    return _universal_newlines(text)
+
+
+def stored_text_path(art):
+    """The file an article's text is read from: the plain file, else its block copy; None if neither exists."""
+    path = article_path(art)
+    if os.path.exists(path):
+        return path
+    if settings.CORPUS_BLOCK_STORAGE and os.path.exists(block_path(art)):
+        return block_path(art)
+    return None
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """{'file_size', 'file_mtime', 'file_hash'} of a file, as stored on ArticleIndex."""
+    stat = os.stat(path)
+    return {'file_size': stat.st_size, 'file_mtime': stat.st_mtime, 'file_hash': file_hash(path)}
+
+
+def process_article(art):
+    """Everything that used to happen inside Article.save, plus indexing."""
+    path = article_path(art)
+    if os.path.exists(path):
+        text = normalize_encoding(path)
+        if settings.CORPUS_BLOCK_STORAGE:
+            write_block_file(text, block_path(art))
+    elif settings.CORPUS_BLOCK_STORAGE and os.path.exists(block_path(art)):
+        # Plain file already replaced by its block-compressed copy
+        text = read_article_text(art)
+    else:
+        raise FileNotFoundError(path)
+
+    fields = {
+        'word_count': len(re.findall(r'\w+', text, re.UNICODE)),
+        'script': detect_script_type(text),
+    }
+    # update without triggering save signals again
+    Article.objects.filter(pk=art.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(art, name, value)
+
+    sentences, paragraphs = build_segments(text)
+    ArticleIndex.objects.update_or_create(article=art, defaults={
+        'script_map': build_script_map(text),
+        'sentences': sentences,
+        'paragraphs': paragraphs,
+        'sentence_hashes': build_sentence_hashes(text, sentences),
+        'sentence_count': sentence_count(text, sentences),
+        **file_fingerprint(stored_text_path(art)),
+    })
+
+    get_search_backend().index_article(art)
+    # The text may have been rewritten: workers must look at it again
+    bump_generation()
+
+
+def enqueue_article(art):
+    """Queue processing for an article unless a job is already waiting for it."""
+    job = ArticleJob.objects.filter(article=art, status=ArticleJob.PENDING).first()
+    if job is None:
+        job = ArticleJob.objects.create(article=art)
+    if settings.ARTICLE_JOBS_EAGER:
+        run_job(job)
+    return job
+
+
+def lease_cutoff():
+    """Running jobs last updated before this have been abandoned by their worker."""
+    return timezone.now() - timedelta(seconds=LEASE_TIMEOUT)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest due job to running; None if there is none.
+    Due are pending jobs past their run_after and abandoned running jobs.
+    """
+    while True:
+        due = (
+            Q(status=ArticleJob.PENDING, run_after__lte=timezone.now())
+            | Q(status=ArticleJob.RUNNING, updated_at__lt=lease_cutoff())
+        )
+        job = ArticleJob.objects.filter(due).select_related('article').first()
+        if job is None:
+            return None
+        # Another worker may have claimed it between the SELECT and here
+        claimed = ArticleJob.objects.filter(due, pk=job.pk).update(
+            status=ArticleJob.RUNNING, updated_at=timezone.now()
+        )
+        if not claimed:
+            continue
+        if job.status == ArticleJob.RUNNING:
+            # The worker running it died: that run was an attempt too
+            job.attempts += 1
+            job.last_error = f'Worker stopped without finishing the job (no result in {LEASE_TIMEOUT}s)'
+            if job.attempts >= job.max_attempts:
+                job.status = ArticleJob.FAILED
+                job.save(update_fields=['status', 'attempts', 'last_error', 'updated_at'])
+                continue
+            job.save(update_fields=['attempts', 'last_error', 'updated_at'])
+        job.status = ArticleJob.RUNNING
+        return job
+
+
+def run_job(job):
+    """Run one job, recording success, a scheduled retry or the final failure."""
+    job.attempts += 1
+    try:
+        process_article(job.article)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = ArticleJob.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = ArticleJob.FAILED
+    else:
+        job.status = ArticleJob.DONE
+        job.last_error = ''
+    job.save(update_fields=['status', 'attempts', 'run_after', 'last_error', 'updated_at'])
+    return job
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from searching.analysis import DEFAULT_THRESHOLD, analyze_file, cluster, duplicate_groups, near_duplicate_pairs
+from searching.generation import bump_generation
+from searching.jobs import stored_text_path
+from searching.models import Article, ArticleIndex
+
+
+class Command(BaseCommand):
+    help = ('Analyze every article file in parallel: encoding, script, word/sentence counts, '
+            'apostrophe variants and duplicate or near-duplicate texts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', help='Write the full report as JSON to this file (- for stdout)')
+        parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Files analyzed at once')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Estimated Jaccard similarity of word shingles for near-duplicates')
+        parser.add_argument('--write', action='store_true',
+                            help='Store script, encoding, counts and duplicate_of on the articles')
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('--threshold must be in (0, 1]')
+        started = time.perf_counter()
+        articles = {}
+        for art in Article.objects.order_by('pk'):
+            path = stored_text_path(art)
+            if path is None:
+                self.stderr.write(f'Missing: {art} ({art.file.name})')
+            else:
+                articles[art.pk] = (art, path)
+        if not articles:
+            raise CommandError('No article files to analyze')
+
+        results, signatures = {}, {}
+        with ProcessPoolExecutor(max_workers=max(1, min(options['jobs'], len(articles)))) as executor:
+            futures = {executor.submit(analyze_file, path): pk for pk, (art, path) in articles.items()}
+            for future in as_completed(futures):
+                pk = futures[future]
+                try:
+                    result = future.result()
+                except (OSError, ValueError) as e:
+                    self.stderr.write(f'Failed: {articles[pk][1]}: {e}')
+                    continue
+                signature = result.pop('signature')
+                if result['word_count']:
+                    signatures[pk] = signature
+                art = articles[pk][0]
+                results[pk] = {'id': pk, 'author': art.author, 'title': art.title, 'style': art.style, **result}
+
+        exact = duplicate_groups({pk: results[pk]['content_hash'] for pk in signatures})
+        near = near_duplicate_pairs(signatures, options['threshold'])
+        links = near + [(group[0], pk) for group in exact for pk in group[1:]]
+        duplicate_of = {pk: first for pk, first in cluster(links).items() if pk != first}
+
+        report = {
+            'generated': timezone.now().isoformat(),
+            'articles': [{**results[pk], 'duplicate_of': duplicate_of.get(pk)} for pk in sorted(results)],
+            'duplicates': exact,
+            'near_duplicates': [{'a': a, 'b': b, 'similarity': round(similarity, 3)} for a, b, similarity in near],
+            'summary': {
+                'articles': len(results),
+                'words': sum(r['word_count'] for r in results.values()),
+                'sentences': sum(r['sentence_count'] for r in results.values()),
+                'scripts': dict(Counter(r['script'] for r in results.values())),
+                'encodings': dict(Counter(r['encoding'] for r in results.values())),
+                'apostrophes': dict(sum((Counter(r['apostrophes']) for r in results.values()), Counter())),
+                'duplicates': len(duplicate_of),
+            },
+        }
+
+        if options['output'] == '-':
+            json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+            sys.stdout.write('\n')
+        elif options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+
+        if options['write']:
+            with transaction.atomic():
+                for pk, result in results.items():
+                    # update(): no save signals, so nothing is queued for reprocessing
+                    Article.objects.filter(pk=pk).update(
+                        script=result['script'], encoding=result['encoding'],
+                        word_count=result['word_count'], duplicate_of=duplicate_of.get(pk),
+                    )
+                    ArticleIndex.objects.filter(pk=pk).update(sentence_count=result['sentence_count'])
+            bump_generation()
+
+        if options['output'] != '-':
+            self.write_summary(report, results, duplicate_of, near, options)
+        self.stderr.write(f'Analyzed {len(results)} files in {time.perf_counter() - started:.1f}s')
+
+    def write_summary(self, report, results, duplicate_of, near, options):
+        summary = report['summary']
+        self.stdout.write(f"{summary['articles']} files, {summary['words']} words, {summary['sentences']} sentences")
+        for title, counts in (('Scripts', summary['scripts']), ('Encodings', summary['encodings']),
+                              ('Apostrophes', summary['apostrophes'])):
+            self.stdout.write(f'{title}:')
+            for name, count in sorted(counts.items(), key=lambda item: -item[1]):
+                self.stdout.write(f'  {name}: {count}')
+        similarity = {(a, b): s for a, b, s in near}
+        for pk, first in sorted(duplicate_of.items()):
+            score = similarity.get((first, pk))
+            kind = f'{score:.0%} similar to' if score is not None else 'duplicate of'
+            self.stdout.write(f"  #{pk} {results[pk]['title']} is {kind} #{first} {results[first]['title']}")
+        if options['write']:
+            self.stdout.write(self.style.SUCCESS(f'Updated {len(results)} articles'))
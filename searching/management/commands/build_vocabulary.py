@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from searching.termstats import build_term_matrix
+from searching.vocabulary import build_vocabulary
+
+
+class Command(BaseCommand):
+    help = ('Count the words of the corpus for autocomplete (VOCABULARY_PATH), word statistics '
+            '(TERM_MATRIX_PATH) and collocations (TOKEN_STREAM_PATH)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='File to write (default: VOCABULARY_PATH)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['path']:
+            # Only the word list: the term matrix belongs to VOCABULARY_PATH's vocabulary
+            vocabulary = build_vocabulary(path=options['path'])
+            written = options['path']
+        else:
+            vocabulary, matrix = build_term_matrix()
+            written = f'{settings.VOCABULARY_PATH}, {settings.TERM_MATRIX_PATH} and {settings.TOKEN_STREAM_PATH}'
+        if options['verbosity'] > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(vocabulary)} words written to {written} in {time.perf_counter() - started:.1f}s'
+            ))
@@ -0,0 +1,52 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from searching.corpus import article_path, block_path, read_file_content
+from searching.generation import bump_generation
+from searching.models import Article
+from searching.storage import BLOCK_CHARS, CODECS, open_block_text, write_block_file
+
+
+class Command(BaseCommand):
+    help = 'Write block-compressed (.ozb) copies of every article for CORPUS_BLOCK_STORAGE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codec', choices=sorted(CODECS), default='zlib')
+        parser.add_argument('--block-chars', type=int, default=BLOCK_CHARS)
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help='Remove each plain .txt once its compressed copy reads back identical',
+        )
+
+    def handle(self, *args, **options):
+        if options['delete_originals'] and not settings.CORPUS_BLOCK_STORAGE:
+            # Without block storage the plain files are the only text search reads
+            raise CommandError('--delete-originals needs CORPUS_BLOCK_STORAGE enabled')
+        plain_total = packed_total = 0
+
+        for art in Article.objects.all():
+            path = article_path(art)
+            if not os.path.exists(path):
+                self.stderr.write(f'Missing: {path}')
+                continue
+
+            text = read_file_content(path)
+            target = block_path(art)
+            write_block_file(text, target, options['codec'], options['block_chars'])
+
+            plain_total += os.path.getsize(path)
+            packed_total += os.path.getsize(target)
+
+            if options['delete_originals']:
+                if open_block_text(target)[:] != text:
+                    self.stderr.write(f'Read-back mismatch, keeping {path}')
+                    continue
+                os.remove(path)
+
+        # Workers drop their cached text sources with the generation
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'{plain_total / 1e6:.1f} MB of text -> {packed_total / 1e6:.1f} MB in {settings.CORPUS_BLOCKS_ROOT}'
+        ))
@@ -0,0 +1,87 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from searching.diagnostics import DEFAULT_TOP, diagnostics_report, server_memory
+
+
+def _mb(kb):
+    return f'{kb / 1024:.1f} MB' if kb is not None else '?'
+
+
+def _size(size):
+    return f'{size / 1e6:.1f} MB' if size is not None else '-'
+
+
+class Command(BaseCommand):
+    help = 'Report server worker memory, cache sizes and (optionally) top allocation sites'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of the running site; asks its workers via /diagnostika/')
+        parser.add_argument('--samples', type=int, default=8,
+                            help='Requests to send with --url (each lands on some worker)')
+        parser.add_argument('--token', help='X-Diagnostics-Token (default: DIAGNOSTICS_TOKEN)')
+        parser.add_argument('--top', type=int, default=0, help=f'tracemalloc sites to list (e.g. {DEFAULT_TOP})')
+        parser.add_argument('--trace', choices=['start', 'stop'], help='Start or stop tracemalloc in the workers reached')
+        parser.add_argument('--pids', help='Comma-separated server pids (default: find gunicorn)')
+        parser.add_argument('--json', action='store_true', help='Print the raw reports as JSON')
+
+    def fetch(self, options):
+        params = {'top': options['top']}
+        if options['trace']:
+            params['trace'] = options['trace']
+        url = options['url'].rstrip('/') + '/diagnostika/?' + urllib.parse.urlencode(params)
+        headers = {'X-Diagnostics-Token': options['token'] or settings.DIAGNOSTICS_TOKEN}
+        reports = {}
+        for _ in range(max(options['samples'], 1)):
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+                    report = json.load(response)
+            except urllib.error.HTTPError as e:
+                raise CommandError(f'{url}: HTTP {e.code} (is DIAGNOSTICS_TOKEN set on the server?)')
+            except OSError as e:
+                raise CommandError(f'{url}: {e}')
+            reports[report['pid']] = report
+        return list(reports.values())
+
+    def handle(self, *args, **options):
+        if options['url']:
+            reports = self.fetch(options)
+            servers = reports[0]['server']
+        else:
+            # Only this process's caches are reachable without a server to ask
+            reports = [diagnostics_report(options['top'])]
+            pids = [int(p) for p in options['pids'].split(',')] if options['pids'] else None
+            servers = server_memory(pids)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'server': servers, 'reports': reports}, indent=2, ensure_ascii=False))
+            return
+
+        if servers:
+            self.stdout.write('Server processes:')
+            for proc in servers:
+                self.stdout.write(f"  pid {proc['pid']:>7}  RSS {_mb(proc['rss_kb']):>10}  peak {_mb(proc['peak_rss_kb']):>10}")
+        else:
+            self.stdout.write('Server processes: none found (use --pids or --url)')
+
+        for report in reports:
+            memory = report['memory']
+            self.stdout.write(
+                f"\nProcess pid {report['pid']}: RSS {_mb(memory['rss_kb'])}, peak {_mb(memory['peak_rss_kb'])} "
+                f"(report took {report['report_ms']} ms)"
+            )
+            for cache in report['caches']:
+                entries = cache['entries'] if cache['entries'] is not None else '-'
+                self.stdout.write(f"  {cache['name']:<36} {entries:>8} entries  {_size(cache['bytes']):>10}")
+            traced = report.get('tracemalloc')
+            if options['top'] and traced is None:
+                self.stdout.write('  tracemalloc is not tracing (use --trace start, then ask again)')
+            elif traced:
+                self.stdout.write(f"  tracemalloc: {_mb(traced['traced_kb'])} traced, peak {_mb(traced['peak_kb'])}")
+                for site in traced['sites']:
+                    self.stdout.write(f"    {site['size_kb']:>10} KB {site['count']:>8}  {site['site']}")
@@ -0,0 +1,55 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from searching.export import EXPORT_FORMATS, concordance_rows, write_xlsx
+from searching.views import CONTEXT, CONTEXT_MODES, DEFAULT_CONTEXT_MODE, parse_filters, parse_search_query
+
+
+class Command(BaseCommand):
+    help = 'Export every hit of a query as a CSV/TSV/XLSX concordance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('query')
+        parser.add_argument('--type', choices=['word', 'suffix'], default='word')
+        parser.add_argument('--style', default='', help='Only search one style (badiiy, ilmiy, ...)')
+        parser.add_argument('--genre', default='', help='Only search one genre (nasriy, sheriy, ...)')
+        parser.add_argument('--year-from', default='', help='Earliest publication year')
+        parser.add_argument('--year-to', default='', help='Latest publication year')
+        parser.add_argument('--author', default='', help='Only search one author (exact name)')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--context', type=int, default=CONTEXT, help='Characters of context on each side')
+        parser.add_argument('--context-mode', choices=list(CONTEXT_MODES), default=DEFAULT_CONTEXT_MODE,
+                            help='Excerpt window: characters (belgi), sentence(s) or paragraph')
+        parser.add_argument('-o', '--output', help='Output file (defaults to stdout for CSV/TSV)')
+
+    def handle(self, *args, **options):
+        raw_q, search_ty, style_filt, search_variants = parse_search_query({
+            'q': options['query'], 'type': options['type'], 'style': options['style'],
+        })
+        if not raw_q:
+            raise CommandError('Empty query')
+        filters = parse_filters({
+            'genre': options['genre'], 'year_from': options['year_from'],
+            'year_to': options['year_to'], 'author': options['author'],
+        })
+
+        rows = concordance_rows(search_variants, search_ty, style_filt, options['context'],
+                                options['context_mode'], filters)
+        fmt = options['format']
+
+        if fmt == 'xlsx':
+            if not options['output']:
+                raise CommandError('XLSX export needs --output')
+            try:
+                write_xlsx(rows, options['output'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            return
+
+        delimiter = '\t' if fmt == 'tsv' else ','
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f, delimiter=delimiter).writerows(rows)
+        else:
+            csv.writer(self.stdout, delimiter=delimiter).writerows(rows)
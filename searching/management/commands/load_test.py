@@ -0,0 +1,221 @@
+import io
+import random
+import re
+import resource
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+from searching.corpus import read_article_text
+from searching.diagnostics import gunicorn_worker_pids, peak_rss_kb
+from searching.models import Article
+from searching.querylog import parse_record
+from searching.views import STYLES, common_suffixes
+
+SEARCH_PATH = '/qidiruv/'
+
+
+def generated_mix(count, seed=None, sample_articles=5):
+    """
+    Search paths mixing word and suffix queries, styles and page numbers.
+    Words are the most frequent ones in a few random articles.
+    """
+    rng = random.Random(seed)
+    articles = list(Article.objects.all())
+    words = Counter()
+    for art in rng.sample(articles, min(sample_articles, len(articles))):
+        words.update(w.lower() for w in re.findall(r'[^\W\d_]{4,}', read_article_text(art)))
+    word_pool = [w for w, n in words.most_common(200)] or ['kitob']
+    suffix_pool = sorted(common_suffixes)
+    styles = [''] * 3 + list(STYLES)
+
+    paths = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            params = {'q': rng.choice(word_pool), 'type': 'word'}
+        else:
+            params = {'q': rng.choice(suffix_pool), 'type': 'suffix'}
+        params['style'] = rng.choice(styles)
+        if rng.random() < 0.3:
+            params['page'] = rng.randint(2, 5)
+        paths.append(SEARCH_PATH + '?' + urllib.parse.urlencode(params))
+    return paths
+
+
+def read_paths(path):
+    """
+    Request paths from a file: either a query log (see searching.querylog) or
+    one path per line ('/qidiruv/?q=...'); blank lines and # comments skipped.
+    """
+    paths = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = parse_record(line)
+            if record is not None:
+                params = {'q': record.query, 'type': record.search_type, 'style': record.style}
+                paths.append(SEARCH_PATH + '?' + urllib.parse.urlencode(params))
+            elif line.strip() and not line.startswith('#'):
+                paths.append(line.strip())
+    return paths
+
+
+class WSGIClient:
+    """Calls the WSGI application in this process, as a server would."""
+
+    def __init__(self):
+        from root.wsgi import application
+        self.application = application
+
+    def get(self, path):
+        url = urllib.parse.urlsplit(path)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': urllib.parse.unquote(url.path),
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': 'localhost',
+            'HTTP_HOST': 'localhost',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+        }
+        setup_testing_defaults(environ)
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        body = self.application(environ, start_response)
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return status[0]
+
+
+class HTTPClient:
+    """GETs paths from a running server (e.g. a local gunicorn)."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def timed_get(client, path):
+    """(status, seconds) for one request; status is the exception name if it raised."""
+    started = time.perf_counter()
+    try:
+        status = client.get(path)
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - started
+
+
+_worker_client = None
+
+
+def _start_worker():
+    """
+    Give each worker process its own WSGI application. The in-process caches
+    (article text, storage blocks, compiled patterns) are per process and not
+    thread-safe, so requests run side by side in processes, as gunicorn's sync
+    workers run them, rather than in threads of one process.
+    """
+    global _worker_client
+    # Replayed searches must not end up in the log `top_queries --warm` ranks
+    override_settings(QUERY_LOG='').enable()
+    _worker_client = WSGIClient()
+
+
+def _worker_get(path):
+    return timed_get(_worker_client, path)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Replay a query log or a generated query mix against the site and report latency/throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (default: call the WSGI app in-process)')
+        parser.add_argument('--log', help='Query log or file of request paths to replay (default: generated mix)')
+        parser.add_argument('-n', '--requests', type=int, default=200, help='Number of requests')
+        parser.add_argument('-c', '--concurrency', type=int, default=4, help='Requests in flight at once')
+        parser.add_argument('--seed', type=int, help='Random seed for the generated mix')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout with --url')
+        parser.add_argument('--pids', help='Comma-separated server worker pids for RSS (default: find gunicorn)')
+
+    def handle(self, *args, **options):
+        if options['log']:
+            paths = read_paths(options['log'])
+            if not paths:
+                raise CommandError(f"No requests in {options['log']}")
+            paths = [paths[i % len(paths)] for i in range(options['requests'])]
+        else:
+            paths = generated_mix(options['requests'], options['seed'])
+
+        workers = max(options['concurrency'], 1)
+        if options['url']:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            get = partial(timed_get, HTTPClient(options['url'], options['timeout']))
+        else:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_start_worker)
+            get = _worker_get
+        latencies = []
+        statuses = Counter()
+
+        started = time.perf_counter()
+        with executor:
+            for status, elapsed in executor.map(get, paths):
+                latencies.append(elapsed)
+                statuses[status] += 1
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        errors = sum(n for status, n in statuses.items() if not (isinstance(status, int) and status < 400))
+        self.stdout.write(f"Requests:    {len(latencies)} ({options['concurrency']} concurrent) in {duration:.2f}s")
+        self.stdout.write(f"Throughput:  {len(latencies) / duration:.1f} req/s")
+        self.stdout.write(
+            'Latency ms:  p50 %.1f  p90 %.1f  p99 %.1f  max %.1f' % tuple(
+                1000 * percentile(latencies, f) for f in (0.5, 0.9, 0.99, 1.0)
+            )
+        )
+        self.stdout.write(f"Errors:      {errors} ({100 * errors / max(len(latencies), 1):.1f}%)")
+        self.stdout.write('Status:      ' + ', '.join(f'{status}: {n}' for status, n in sorted(statuses.items(), key=str)))
+
+        if options['url']:
+            pids = [int(p) for p in options['pids'].split(',')] if options['pids'] else gunicorn_worker_pids()
+            for pid in pids:
+                rss = peak_rss_kb(pid)
+                if rss is not None:
+                    self.stdout.write(f'Peak RSS:    pid {pid}: {rss / 1024:.1f} MB')
+            if not pids:
+                self.stdout.write('Peak RSS:    no server processes found (use --pids)')
+        else:
+            rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            self.stdout.write(f'Peak RSS:    {rss / 1024:.1f} MB (largest worker process)')
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from searching.hitcache import warm_popular_queries
+from searching.jobs import claim_next_job, enqueue_article, run_job
+from searching.models import Article, ArticleJob
+from searching.termstats import build_term_matrix
+
+
+class Command(BaseCommand):
+    help = 'Worker that processes queued articles (encoding, word count, script, search index)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--all', action='store_true', help='Queue every article before starting')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            for art in Article.objects.all():
+                enqueue_article(art)
+
+        processed = 0
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if processed:
+                    # The corpus changed: recount words for autocomplete and word statistics
+                    try:
+                        build_term_matrix()
+                    except Exception as e:
+                        self.stderr.write(f'Building the vocabulary failed: {e!r}')
+                if processed and settings.QUERY_LOG:
+                    # ... and precompute popular queries again
+                    try:
+                        for query, search_ty, matches in warm_popular_queries():
+                            self.stdout.write(f'Warmed {search_ty} "{query}": {matches} matches')
+                    except Exception as e:
+                        self.stderr.write(f'Warming popular queries failed: {e!r}')
+                processed = 0
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            job = run_job(job)
+            processed += 1
+            if job.status == ArticleJob.DONE:
+                self.stdout.write(self.style.SUCCESS(f'Processed {job.article}'))
+            else:
+                self.stderr.write(f'{job.get_status_display()}: {job.article} (attempt {job.attempts})')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from searching.backends import get_search_backend
+from searching.models import Article
+
+
+class Command(BaseCommand):
+    help = "Rebuild the active search backend's index from every Article"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            help='Dotted path of the backend to rebuild (defaults to settings.SEARCH_BACKEND)',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['backend'])
+        articles = Article.objects.all()
+        backend.rebuild(articles)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {articles.count()} articles with {type(backend).__name__}'
+        ))
@@ -0,0 +1,62 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from searching.generation import bump_generation, corpus_generation
+from searching.jobs import enqueue_article, file_hash, stored_text_path
+from searching.models import Article, ArticleIndex
+
+
+class Command(BaseCommand):
+    help = 'Find article files changed on disk, queue them for processing and start a new corpus generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hash', action='store_true',
+                            help='Also compare SHA-1 of files whose size and mtime are unchanged')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what changed')
+
+    def handle(self, *args, **options):
+        indexes = {
+            index.pk: index
+            for index in ArticleIndex.objects.defer('script_map', 'sentences', 'paragraphs', 'sentence_hashes')
+        }
+        changed = 0
+
+        for art in Article.objects.all():
+            path = stored_text_path(art)
+            index = indexes.get(art.pk)
+            if path is None:
+                if index is None or not index.file_hash:
+                    continue  # never processed, or already counted as missing
+                reason = 'missing'
+                if not options['dry_run']:
+                    # Counted once: without a fingerprint it is reprocessed when it comes back
+                    ArticleIndex.objects.filter(pk=art.pk).update(file_hash='')
+            elif index is None:
+                reason = 'not processed'
+            elif not index.file_hash:
+                reason = 'no fingerprint yet'
+            else:
+                stat = os.stat(path)
+                if stat.st_size != index.file_size or stat.st_mtime != index.file_mtime:
+                    # A touched but identical file only needs its fingerprint updated
+                    if file_hash(path) == index.file_hash:
+                        if not options['dry_run']:
+                            ArticleIndex.objects.filter(pk=art.pk).update(
+                                file_size=stat.st_size, file_mtime=stat.st_mtime)
+                        continue
+                    reason = 'modified'
+                elif options['hash'] and file_hash(path) != index.file_hash:
+                    reason = 'content changed'
+                else:
+                    continue
+
+            changed += 1
+            self.stdout.write(f'{reason}: {art} ({path or art.file.name})')
+            if not options['dry_run'] and path is not None:
+                enqueue_article(art)
+
+        if changed and not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{changed} changed, corpus generation {bump_generation()}'))
+        else:
+            self.stdout.write(f'{changed} changed, corpus generation {corpus_generation()}')
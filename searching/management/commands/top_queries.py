@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from searching.hitcache import warm_popular_queries
+from searching.querylog import read_query_log, top_queries
+
+
+class Command(BaseCommand):
+    help = 'Report the most frequent logged searches and optionally precompute their matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of queries to report')
+        parser.add_argument('--days', type=float, help='Only count searches from the last N days')
+        parser.add_argument('--log', help='Query log to read (default: QUERY_LOG)')
+        parser.add_argument('--warm', action='store_true',
+                            help='Precompute matches for the QUERY_WARM_COUNT most frequent queries')
+
+    def handle(self, *args, **options):
+        since = time.time() - options['days'] * 86400 if options['days'] else None
+
+        if options['verbosity'] > 0:
+            ranked = top_queries(read_query_log(options['log'], since), options['top'])
+            if not ranked:
+                self.stdout.write(f"No searches logged in {options['log'] or settings.QUERY_LOG}")
+            else:
+                self.stdout.write(f"{'count':>7}  {'type':<7} {'hits':>7} {'p50 ms':>7} {'max ms':>7}  query")
+                for (_, search_ty), stats in ranked:
+                    latencies = stats['latency_ms']
+                    self.stdout.write(
+                        f"{stats['count']:>7}  {search_ty:<7} {stats['hits']:>7} "
+                        f"{latencies[len(latencies) // 2]:>7} {latencies[-1]:>7}  {stats['query']}"
+                    )
+
+        if options['warm']:
+            warmed = warm_popular_queries(since=since, log=options['log'])
+            for query, search_ty, matches in warmed:
+                self.stdout.write(self.style.SUCCESS(f'Warmed {search_ty} "{query}": {matches} matches'))
+            if not warmed and options['verbosity'] > 0:
+                self.stdout.write('Nothing to warm')
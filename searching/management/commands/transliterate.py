@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from searching.converters import TRANSLITERATE_CHUNK_CHARS, transliterate_file
+from searching.corpus import article_path
+from searching.jobs import enqueue_article
+from searching.models import Article
+
+# Cyrillic editions are named like 'Kodeks_kirill.txt'
+SCRIPT_SUFFIXES = {'cyrillic': '_kirill', 'latin': '_lotin'}
+
+
+def edition_path(path, to):
+    """Default name of the other-script edition of path: adds (or drops) the _kirill/_lotin suffix."""
+    stem, ext = os.path.splitext(path)
+    for script, suffix in SCRIPT_SUFFIXES.items():
+        if script != to and stem.endswith(suffix):
+            return stem[:-len(suffix)] + ext
+    return stem + SCRIPT_SUFFIXES[to] + ext
+
+
+def text_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.txt'):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(path):
+            yield path
+        else:
+            raise CommandError(f'No such file or directory: {path}')
+
+
+class Command(BaseCommand):
+    help = 'Transliterate text files or the whole corpus between Uzbek Latin and Cyrillic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Text files or directories of .txt files')
+        parser.add_argument('--to', choices=['latin', 'cyrillic'], required=True)
+        parser.add_argument('--all', action='store_true',
+                            help='Every article of the corpus (skipping those already in the target script)')
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--in-place', action='store_true',
+                            help='Replace each file (articles are queued for reprocessing)')
+        target.add_argument('--output-dir', help='Write the editions here instead of next to the originals')
+        parser.add_argument('--overwrite', action='store_true', help='Replace editions that already exist')
+        parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Files converted at once')
+        parser.add_argument('--chunk-chars', type=int, default=TRANSLITERATE_CHUNK_CHARS,
+                            help='Characters read at a time per file')
+        parser.add_argument('--encoding', default='utf-8', help='Encoding of the input files')
+
+    def handle(self, *args, **options):
+        to = options['to']
+        sources = list(text_files(options['paths']))
+        articles = {}
+        if options['all']:
+            for art in Article.objects.all():
+                if art.script == to:
+                    continue
+                path = article_path(art)
+                if os.path.exists(path):
+                    articles[path] = art
+                    sources.append(path)
+                else:
+                    self.stderr.write(f'Missing: {path}')
+        if not sources:
+            raise CommandError('Nothing to transliterate: give paths or --all')
+
+        tasks = []
+        for source in dict.fromkeys(sources):
+            if options['in_place']:
+                target = source
+            elif options['output_dir']:
+                target = os.path.join(options['output_dir'], os.path.basename(edition_path(source, to)))
+            else:
+                target = edition_path(source, to)
+            if target != source and os.path.exists(target) and not options['overwrite']:
+                self.stderr.write(f'Exists, skipping (use --overwrite): {target}')
+                continue
+            tasks.append((source, target))
+        if options['output_dir']:
+            os.makedirs(options['output_dir'], exist_ok=True)
+
+        total = converted = 0
+        with ProcessPoolExecutor(max_workers=max(1, min(options['jobs'], len(tasks) or 1))) as executor:
+            futures = {
+                executor.submit(transliterate_file, source, target, to,
+                                options['chunk_chars'], options['encoding']): (source, target)
+                for source, target in tasks
+            }
+            for future in as_completed(futures):
+                source, target = futures[future]
+                try:
+                    chars = future.result()
+                except (OSError, UnicodeError) as e:
+                    self.stderr.write(f'Failed: {source}: {e}')
+                    continue
+                total += chars
+                converted += 1
+                self.stdout.write(f'{source} -> {target} ({chars} chars)')
+                if options['in_place'] and source in articles:
+                    enqueue_article(articles[source])
+
+        self.stdout.write(self.style.SUCCESS(f'Transliterated {total} characters in {converted} files to {to}'))
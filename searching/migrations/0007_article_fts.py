@@ -0,0 +1,40 @@
+# FTS5 mirror of article text used by searching.backends.FTS5SearchBackend
+
+from django.db import migrations
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE TABLE searching_articletext ('
+        'article_id INTEGER PRIMARY KEY, body TEXT NOT NULL)'
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE searching_articletext_words USING fts5("
+        "body, content='searching_articletext', content_rowid='article_id', "
+        "tokenize='unicode61 remove_diacritics 0')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE searching_articletext_trigram USING fts5("
+        "body, content='searching_articletext', content_rowid='article_id', "
+        "tokenize='trigram')"
+    )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in ('searching_articletext_trigram', 'searching_articletext_words', 'searching_articletext'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0006_alter_article_genre'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0007_article_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='script',
+            field=models.CharField(blank=True, choices=[('cyrillic', 'Kirill'), ('latin', 'Lotin'), ('mixed', 'Aralash'), ('unknown', 'Nomaʼlum')], editable=False, max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ArticleJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Navbatda'), ('running', 'Bajarilmoqda'), ('done', 'Tayyor'), ('failed', 'Xato')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='searching.article')),
+            ],
+            options={
+                'ordering': ['run_after', 'pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0008_article_script_articlejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleIndex',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_index', serialize=False, to='searching.article')),
+                ('script_map', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0009_articleindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleindex',
+            name='paragraphs',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='articleindex',
+            name='sentence_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='articleindex',
+            name='sentences',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
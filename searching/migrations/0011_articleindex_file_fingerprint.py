@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0010_articleindex_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleindex',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='articleindex',
+            name='file_mtime',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='articleindex',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
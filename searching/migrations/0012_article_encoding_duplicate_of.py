@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0011_articleindex_file_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='searching.article'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='encoding',
+            field=models.CharField(blank=True, editable=False, max_length=30),
+        ),
+    ]
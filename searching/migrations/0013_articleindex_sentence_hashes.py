@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searching', '0012_article_encoding_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleindex',
+            name='sentence_hashes',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
@@ -1,7 +1,7 @@
 # searching/models.py
-import os, re
 from django.db import models
-from django.conf import settings
+from django.utils import timezone
+
 
 class Article(models.Model):
     STYLE_CHOICES = [
@@ -17,25 +17,85 @@ class Article(models.Model):
         ('publitsistik', 'Publitsistik'),
         ('rasmiy', 'Rasmiy'),
     ]
+    SCRIPT_CHOICES = [
+        ('cyrillic', 'Kirill'),
+        ('latin',    'Lotin'),
+        ('mixed',    'Aralash'),
+        ('unknown',  'Nomaʼlum'),
+    ]
 
-    author     = models.CharField(max_length=200, default='',  blank=True )
+    # author/style/genre/pub_year are the search filters: they are checked in
+    # Python over the cached article list (see views.article_passes), not in SQL
+    author     = models.CharField(max_length=200, default='',  blank=True)
     title      = models.CharField(max_length=200)
     style      = models.CharField(max_length=20, choices=STYLE_CHOICES, default='badiiy', blank=True)
     genre      = models.CharField(max_length=20, choices=GENRE_CHOICES, null=True, blank=True)
     pub_year   = models.PositiveSmallIntegerField(null=True, blank=True)
     file       = models.FileField(upload_to='articles/')
+    # Filled in by the article processing job (searching.jobs) after upload
     word_count = models.PositiveIntegerField(null=True, blank=True)
-
-    def save(self, *args, **kwargs):
-        """On every save, recalculate word_count from the file."""
-        super().save(*args, **kwargs)
-        path = os.path.join(settings.MEDIA_ROOT, self.file.name)
-        if os.path.exists(path):
-            text = open(path, 'r', encoding='utf-8').read()
-            wc = len(re.findall(r'\w+', text, re.UNICODE))
-            # update without recursion
-            Article.objects.filter(pk=self.pk).update(word_count=wc)
-            self.word_count = wc
+    script     = models.CharField(max_length=10, choices=SCRIPT_CHOICES, blank=True, editable=False)
+    # Filled in by `analyze_corpus --write` (searching.analysis)
+    encoding   = models.CharField(max_length=30, blank=True, editable=False)
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, editable=False,
+                                     on_delete=models.SET_NULL, related_name='duplicates')
 
     def __str__(self):
         return f"{self.author} – {self.title}"
+
+
+class ArticleIndex(models.Model):
+    """
+    Per-article data derived from the text at ingest (searching.jobs.process_article),
+    kept out of Article so list queries don't load it.
+    """
+    article    = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='text_index')
+    # Run-length script map, see searching.scriptmap
+    script_map = models.BinaryField(default=b'')
+    # Sentence/paragraph start offsets, see searching.segments
+    sentences  = models.BinaryField(default=b'')
+    paragraphs = models.BinaryField(default=b'')
+    sentence_count = models.PositiveIntegerField(default=0)
+    # Hash of each sentence's words, for passages repeated across articles (searching.passages)
+    sentence_hashes = models.BinaryField(default=b'')
+    # The file as processed, for `sweep_corpus` to notice changes on disk
+    file_size  = models.BigIntegerField(default=0)
+    file_mtime = models.FloatField(default=0)
+    file_hash  = models.CharField(max_length=40, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Index of {self.article}"
+
+
+class ArticleJob(models.Model):
+    """
+    Queued processing of an uploaded article (encoding normalization, word
+    count, script detection, search index update), run by the
+    `process_article_jobs` worker command.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Navbatda'),
+        (RUNNING, 'Bajarilmoqda'),
+        (DONE,    'Tayyor'),
+        (FAILED,  'Xato'),
+    ]
+
+    article      = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='jobs')
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after    = models.DateTimeField(default=timezone.now)
+    last_error   = models.TextField(blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'pk']
+
+    def __str__(self):
+        return f"{self.article} [{self.get_status_display()}]"
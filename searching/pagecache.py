@@ -0,0 +1,100 @@
+"""
+Whole-page caching and conditional GET for pages that change only with the corpus.
+
+@corpus_page views (index, statistics) are rendered once per corpus
+generation and URL: the response body is kept in the PAGE_CACHE cache
+under a key holding the generation, so any change to an Article (which
+starts a new generation, see generation.py) makes every stored page
+unreachable, and signals.py also clears them. The same generation gives
+each response an ETag and a Last-Modified (when the generation began),
+so a browser or Caddy revalidating with If-None-Match/If-Modified-Since
+gets a 304 without the view running at all.
+
+A deploy changes the templates but not the generation, so the templates'
+newest mtime at startup is part of the key, ETag and Last-Modified too.
+Of the query string only the parameters the view declares count, sorted,
+so ?x=1, ?x=2, ... don't each store another copy of the page.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from .generation import corpus_generation, generation_time
+
+PAGE_CACHE = 'pages'
+
+
+def _templates_time():
+    """Newest mtime of the project's templates."""
+    newest = 0.0
+    for directory in settings.TEMPLATES[0].get('DIRS', []):
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return newest
+
+
+_TEMPLATES_TIME = _templates_time()
+
+
+def page_version(request, params=()):
+    """
+    Digest of everything a cached page depends on: generation, templates,
+    path and the values of the GET params the view reads.
+    """
+    query = urlencode(sorted((key, request.GET.getlist(key)) for key in params if key in request.GET), doseq=True)
+    raw = f'{corpus_generation()}\0{_TEMPLATES_TIME}\0{request.path}\0{query}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def page_etag(request, params=()):
+    # Weak: Caddy or whitenoise may compress the body on the way out
+    return f'W/"{page_version(request, params)[:20]}"'
+
+
+def page_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(max(generation_time(), _TEMPLATES_TIME), tz=timezone.utc)
+
+
+def clear_page_cache():
+    caches[PAGE_CACHE].clear()
+
+
+def corpus_page(view=None, params=()):
+    """
+    Serve view from the page cache while the corpus is unchanged, and answer
+    conditional GETs. params are the GET parameters the view reads (none
+    by default); use as @corpus_page or @corpus_page(params=(...)).
+    """
+    if view is None:
+        return lambda view: corpus_page(view, params)
+
+    @condition(etag_func=lambda request, *args, **kwargs: page_etag(request, params),
+               last_modified_func=page_last_modified)
+    @wraps(view)
+    def cached_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not settings.PAGE_CACHE_SECONDS:
+            response = view(request, *args, **kwargs)
+        else:
+            cache = caches[PAGE_CACHE]
+            key = 'page:' + page_version(request, params)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_SECONDS)
+        # Stored, but checked with the ETag every time
+        patch_cache_control(response, no_cache=True)
+        return response
+    return cached_view
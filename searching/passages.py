@@ -0,0 +1,102 @@
+"""
+Passages repeated across articles, found by shingling sentences at ingest.
+
+The same text often appears in several articles: a clause shared by two
+codes, a decree quoted in full by a newspaper, the Latin and Cyrillic
+editions of one book. process_article() hashes each sentence (the
+segments of segments.py) of at least MIN_PASSAGE_WORDS words: 64 bits of
+BLAKE2b over its words as vocabulary keys, so script and apostrophe
+differences don't matter. The hashes are stored in
+ArticleIndex.sentence_hashes, aligned with ArticleIndex.sentences (0 for
+shorter sentences).
+
+Once per corpus generation, repeated_passages() counts in how many
+articles each hash occurs and keeps, for every article, only the spans of
+its sentences that occur in another one. The search then gives a hit
+inside such a span the cluster key (hash, how many hits came before it in
+that sentence); later hits with a key already seen are listed under the
+first one instead of getting an excerpt of their own.
+"""
+import hashlib
+from array import array
+from bisect import bisect_right
+from collections import Counter
+
+from .generation import GenerationCache
+from .models import ArticleIndex
+from .vocabulary import WORD_RE, word_key
+
+MIN_PASSAGE_WORDS = 8
+_NO_END = 0xFFFFFFFF
+
+
+def _passage_hash(words):
+    digest = hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+def build_sentence_hashes(text, sentences):
+    """array('Q') bytes: hash of each sentence of text (sentences as stored by build_segments), 0 if short."""
+    starts = array('I')
+    starts.frombytes(sentences)
+    words = [[] for _ in starts]
+    keys = {}
+    for match in WORD_RE.finditer(text):
+        word = match.group()
+        key = keys.get(word)
+        if key is None:
+            key = keys[word] = word_key(word)
+        words[max(0, bisect_right(starts, match.start()) - 1)].append(key)
+    hashes = array('Q', (_passage_hash(ws) if len(ws) >= MIN_PASSAGE_WORDS else 0 for ws in words))
+    return hashes.tobytes()
+
+
+class RepeatedSentences:
+    """The sentences of one article that also occur in another: sorted spans with their hashes."""
+
+    def __init__(self, spans):
+        self.starts = array('I', [start for start, end, passage in spans])
+        self.ends = array('I', [end for start, end, passage in spans])
+        self.hashes = [passage for start, end, passage in spans]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def passage_at(self, offset):
+        """Hash of the repeated sentence containing offset, or None."""
+        i = bisect_right(self.starts, offset) - 1
+        if i >= 0 and offset < self.ends[i]:
+            return self.hashes[i]
+        return None
+
+
+def _load_repeated_passages():
+    rows = []
+    articles_per_hash = Counter()
+    for pk, sentences, data in ArticleIndex.objects.exclude(sentence_hashes=b'').values_list(
+            'article_id', 'sentences', 'sentence_hashes'):
+        starts, hashes = array('I'), array('Q')
+        starts.frombytes(sentences)
+        hashes.frombytes(data)
+        if len(starts) != len(hashes):
+            continue  # stored by another version of build_segments; skip until reprocessed
+        rows.append((pk, starts, hashes))
+        articles_per_hash.update(set(hashes) - {0})
+
+    repeated = {}
+    for pk, starts, hashes in rows:
+        spans = [
+            (starts[i], starts[i + 1] if i + 1 < len(starts) else _NO_END, passage)
+            for i, passage in enumerate(hashes) if articles_per_hash[passage] > 1
+        ]
+        if spans:
+            repeated[pk] = RepeatedSentences(spans)
+    return repeated
+
+
+# {article pk: RepeatedSentences} of the current corpus
+_REPEATED_PASSAGES = GenerationCache(_load_repeated_passages)
+
+
+def repeated_passages():
+    return _REPEATED_PASSAGES.get()
@@ -0,0 +1,141 @@
+"""
+Append-only log of the searches people run, one tab-separated line each:
+
+    unix time | type | style | latency (ms) | hits | query
+
+log_query() only puts the line on a queue; a background thread appends
+whatever has queued up in one write, so a search never waits for the disk
+(flush_query_log() waits for it). QUERY_LOG = '' turns logging off. `python manage.py top_queries` reads the
+log back.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+
+QueryRecord = namedtuple('QueryRecord', 'time search_type style latency_ms hits query')
+
+_QUEUE = queue.Queue()  # (log path, line)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _clean(value):
+    return ' '.join(str(value).split())
+
+
+def format_record(query, search_type, style, latency, hits, when=None):
+    return '\t'.join([
+        str(int(when if when is not None else time.time())),
+        _clean(search_type),
+        _clean(style),
+        str(round(latency * 1000)),
+        str(hits),
+        _clean(query),
+    ]) + '\n'
+
+
+def parse_record(line):
+    """QueryRecord from a log line, or None if the line is malformed."""
+    parts = line.rstrip('\n').split('\t')
+    if len(parts) != 6:
+        return None
+    try:
+        return QueryRecord(int(parts[0]), parts[1], parts[2], int(parts[3]), int(parts[4]), parts[5])
+    except ValueError:
+        return None
+
+
+def _append(path, lines):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(''.join(lines))
+
+
+def _drain():
+    """{path: [line]} of everything queued now."""
+    lines = defaultdict(list)
+    while True:
+        try:
+            path, line = _QUEUE.get_nowait()
+        except queue.Empty:
+            return lines
+        lines[path].append(line)
+
+
+def _write(lines):
+    for path, path_lines in lines.items():
+        try:
+            _append(path, path_lines)
+        except OSError as e:
+            print(f"Query log write failed: {e}")
+        for _ in path_lines:
+            _QUEUE.task_done()
+
+
+def _write_forever():
+    while True:
+        path, line = _QUEUE.get()
+        lines = _drain()
+        lines[path].insert(0, line)
+        _write(lines)
+
+
+def _flush_at_exit():
+    _write(_drain())
+
+
+def flush_query_log():
+    """Wait until every queued search is written."""
+    _QUEUE.join()
+
+
+def log_query(query, search_type, style, latency, hits):
+    """Queue one search for the log (returns immediately)."""
+    global _writer
+    path = settings.QUERY_LOG
+    if not path or not query:
+        return
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_forever, daemon=True, name='query-log')
+                _writer.start()
+                atexit.register(_flush_at_exit)
+    _QUEUE.put((path, format_record(query, search_type, style, latency, hits)))
+
+
+def read_query_log(path=None, since=None):
+    """Yield the QueryRecords in the log, optionally only those at or after unix time `since`."""
+    path = path or settings.QUERY_LOG
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = parse_record(line)
+            if record is not None and (since is None or record.time >= since):
+                yield record
+
+
+def top_queries(records, limit=20):
+    """
+    The `limit` most frequent (query, type) pairs in records (queries compared
+    case-insensitively), most frequent first:
+    [((query, type), {'count', 'query': latest spelling, 'hits': latest count, 'latency_ms': sorted list})].
+    """
+    stats = {}
+    for record in records:
+        key = (record.query.lower(), record.search_type)
+        entry = stats.setdefault(key, {'count': 0, 'latency_ms': []})
+        entry['count'] += 1
+        entry['query'] = record.query
+        entry['hits'] = record.hits
+        entry['latency_ms'].append(record.latency_ms)
+    ranked = sorted(stats.items(), key=lambda item: (-item[1]['count'], item[0]))[:limit]
+    for key, entry in ranked:
+        entry['latency_ms'].sort()
+    return ranked
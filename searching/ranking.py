@@ -0,0 +1,113 @@
+"""
+BM25 relevance ranking of search hits.
+
+A query is one word (its script variants count as the same term), so a
+document's score comes from its number of hits and its length
+(Article.word_count) against the corpus average. Every matching document
+is scored, also past the hit budget (the hits are counted without
+excerpts first), so the ranking does not depend on where the scan of the
+results-page order stopped. Documents are ranked with a heap: heapify is
+O(n) and only as many documents are popped as the hit budget, and then the
+requested page, need; the rest are never sorted.
+"""
+import heapq
+import math
+
+from django.db.models import Avg, Count
+
+from .generation import GenerationCache
+from .models import Article
+from .shards import shard_articles
+
+K1 = 1.2
+B = 0.75
+
+
+def bm25(tf, doc_len, avg_len, df, n_docs, k1=K1, b=B):
+    """BM25 weight of one term occurring tf times in a document of doc_len words."""
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+
+
+def _load_corpus_stats():
+    stats = shard_articles(Article.objects.all()).aggregate(n=Count('pk'), avg=Avg('word_count'))
+    return stats['n'], stats['avg'] or 1.0
+
+
+_CORPUS_STATS = GenerationCache(_load_corpus_stats)
+
+
+def corpus_stats():
+    """(number of documents, average word count) of the corpus this node searches, per generation."""
+    return _CORPUS_STATS.get()
+
+
+class RankedHits:
+    """
+    Hits of several documents, best-scoring document first, materialized
+    lazily: slicing pops documents off the heap until the slice is covered.
+    Enough for Paginator, which only needs len() and slicing.
+    """
+
+    def __init__(self, scored_docs):
+        # scored_docs: [(score, hits)]; ties keep the given (results-page) order
+        self._heap = [(-score, index, hits) for index, (score, hits) in enumerate(scored_docs)]
+        heapq.heapify(self._heap)
+        self._ranked = []
+        self.found = sum(len(hits) for score, hits in scored_docs)
+
+    def __len__(self):
+        return self.found
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            stop = index.stop
+        else:
+            stop = index + 1 if index >= 0 else None
+        if stop is None or stop < 0:
+            stop = self.found
+        while len(self._ranked) < stop and self._heap:
+            self._ranked.extend(heapq.heappop(self._heap)[2])
+        return self._ranked[index]
+
+
+def score_documents(doc_hits, k1=K1, b=B):
+    """
+    {article: BM25 score} of {article: number of hits}, every document of
+    the search: its document frequency is the number of documents.
+    """
+    n_docs, avg_len = corpus_stats()
+    df = len(doc_hits)
+    return {
+        art: round(bm25(tf, art.word_count or avg_len, avg_len, df, max(n_docs, df), k1, b), 4)
+        for art, tf in doc_hits.items()
+    }
+
+
+def top_documents(scores, doc_hits, max_hits=None):
+    """
+    The best-scoring articles, best first, until they hold max_hits hits
+    (all of them without). Ties keep the order of doc_hits.
+    """
+    heap = [(-score, index, art) for index, (art, score) in enumerate(scores.items())]
+    heapq.heapify(heap)
+    best, hits = [], 0
+    while heap and (max_hits is None or hits < max_hits):
+        art = heapq.heappop(heap)[2]
+        best.append(art)
+        hits += doc_hits[art]
+    return best
+
+
+def rank_hits(doc_hits, scores):
+    """
+    Rank [(article, hits)] by their scores (see score_documents()) and return
+    them as RankedHits. Each hit gets its document's score as hit['score'].
+    """
+    scored_docs = []
+    for art, hits in doc_hits:
+        score = scores[art]
+        for hit in hits:
+            hit['score'] = score
+        scored_docs.append((score, hits))
+    return RankedHits(scored_docs)
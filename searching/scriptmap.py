@@ -0,0 +1,86 @@
+"""
+Run-length map of which script each part of an article is written in.
+
+Built once at ingest: every word is classed as Latin or Cyrillic (words in
+neither, digits and punctuation are skipped) and consecutive words of the
+same script collapse into one run. A run starts at its first word and
+lasts until the next run starts. At query time a bisect over the run
+starts tells which scripts an excerpt window contains, so mixed documents
+get the right transliteration for each hit. The maps of all articles are
+read with one query and decoded once per corpus generation.
+"""
+import bisect
+import re
+from array import array
+
+from .generation import GenerationCache
+from .models import Article, ArticleIndex
+from .shards import shard_articles
+
+LATIN = 'latin'
+CYRILLIC = 'cyrillic'
+SCRIPT_CODES = {LATIN: 1, CYRILLIC: 2}
+SCRIPT_NAMES = {code: name for name, code in SCRIPT_CODES.items()}
+
+_WORD = re.compile(r'[^\W\d_]+')
+_CYRILLIC_LETTER = re.compile(r'[а-яёўғқҳ]', re.IGNORECASE)
+_LATIN_LETTER = re.compile(r'[a-z]', re.IGNORECASE)
+
+
+def build_script_map(text):
+    """Encode the script runs of text as bytes: array('I') of start, code pairs."""
+    runs = array('I')
+    current = None
+    for word in _WORD.finditer(text):
+        token = word.group(0)
+        if _CYRILLIC_LETTER.search(token):
+            code = SCRIPT_CODES[CYRILLIC]
+        elif _LATIN_LETTER.search(token):
+            code = SCRIPT_CODES[LATIN]
+        else:
+            continue
+        if code != current:
+            runs.extend((word.start(), code))
+            current = code
+    return runs.tobytes()
+
+
+class ScriptMap:
+    def __init__(self, data):
+        runs = array('I')
+        runs.frombytes(data)
+        self.starts = runs[0::2]
+        self.codes = runs[1::2]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def script_at(self, offset):
+        """Script of the run covering offset (the first run also covers text before it)."""
+        if not self.starts:
+            return 'unknown'
+        index = max(0, bisect.bisect_right(self.starts, offset) - 1)
+        return SCRIPT_NAMES[self.codes[index]]
+
+    def scripts_between(self, start, end):
+        """Set of scripts used in text[start:end]."""
+        if not self.starts:
+            return set()
+        first = max(0, bisect.bisect_right(self.starts, start) - 1)
+        last = max(0, bisect.bisect_left(self.starts, end) - 1)
+        return {SCRIPT_NAMES[code] for code in self.codes[first:last + 1]}
+
+
+def _load_script_maps():
+    rows = ArticleIndex.objects.filter(article__in=shard_articles(Article.objects.all())).values_list(
+        'article_id', 'script_map')
+    return {pk: ScriptMap(data) for pk, data in rows if data}
+
+
+# {article pk: ScriptMap} of the articles this node searches
+_SCRIPT_MAPS = GenerationCache(_load_script_maps)
+
+
+def load_script_map(art):
+    """ScriptMap stored for art at ingest, or None if it hasn't been processed yet."""
+    return _SCRIPT_MAPS.get().get(art.pk)
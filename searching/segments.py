@@ -0,0 +1,103 @@
+"""
+Sentence and paragraph boundaries of an article, found once at ingest.
+
+Each list is an array('I') of the offsets where a segment starts; a
+segment runs until the next one starts. Given a hit, a bisect finds the
+sentence (or paragraph) around it, so excerpts can be whole sentences
+instead of a fixed number of characters without scanning the text again.
+Like the script maps, the segments of all articles are read with one
+query and decoded once per corpus generation.
+
+Paragraphs end at a line break after sentence-final punctuation: the
+corpus files are hard-wrapped, often with blank lines between the wrapped
+lines, so line breaks alone say nothing. Sentences end at . ! ? …
+followed by whitespace and something that isn't a lowercase letter, and
+at every paragraph break.
+"""
+import bisect
+import re
+from array import array
+
+from .generation import GenerationCache
+from .models import Article, ArticleIndex
+from .shards import shard_articles
+
+_PARAGRAPH_BREAK = re.compile(r'(?<=[.!?…:;])[»"”’)\]]*[ \t]*\n\s*')
+_SENTENCE_BREAK = re.compile(r'[.!?…]+[»"”’)\]]*\s+')
+
+# Longest stretch taken on either side of a hit, for texts whose
+# "sentences" run for pages (tables, lists without punctuation)
+MAX_SEGMENT_CONTEXT = 400
+
+
+# Segment starts are stored as array('I') bytes, this many bytes each
+OFFSET_SIZE = array('I').itemsize
+
+
+def sentence_count(text, sentences):
+    """
+    Number of sentences in text given its sentence starts from
+    build_segments(); a blank text has one start but no sentence.
+    """
+    return len(sentences) // OFFSET_SIZE if text.strip() else 0
+
+
+def build_segments(text):
+    """(sentence_starts, paragraph_starts) of text, each as array('I') bytes."""
+    paragraphs = array('I', [0])
+    for brk in _PARAGRAPH_BREAK.finditer(text):
+        if brk.end() < len(text):
+            paragraphs.append(brk.end())
+
+    sentence_starts = set(paragraphs)
+    for brk in _SENTENCE_BREAK.finditer(text):
+        if brk.end() < len(text) and not text[brk.end()].islower():
+            sentence_starts.add(brk.end())
+    sentences = array('I', sorted(sentence_starts))
+
+    return sentences.tobytes(), paragraphs.tobytes()
+
+
+def _window(starts, start, end, extra, limit):
+    """Span of the segments around [start, end), plus `extra` segments on each side."""
+    first = max(0, bisect.bisect_right(starts, start) - 1 - extra)
+    last = bisect.bisect_right(starts, max(start, end - 1)) - 1 + extra
+    window_start = starts[first]
+    window_end = starts[last + 1] if last + 1 < len(starts) else end + limit
+    return max(window_start, start - limit), min(window_end, end + limit)
+
+
+class Segments:
+    def __init__(self, sentences, paragraphs):
+        self.sentences = array('I')
+        self.sentences.frombytes(sentences)
+        self.paragraphs = array('I')
+        self.paragraphs.frombytes(paragraphs)
+
+    def sentence_window(self, start, end, extra=0, limit=MAX_SEGMENT_CONTEXT):
+        """(window_start, window_end) of the sentence(s) holding [start, end), ±extra sentences."""
+        return _window(self.sentences, start, end, extra, limit)
+
+    def paragraph_window(self, start, end, extra=0, limit=MAX_SEGMENT_CONTEXT):
+        """(window_start, window_end) of the paragraph(s) holding [start, end), ±extra paragraphs."""
+        return _window(self.paragraphs, start, end, extra, limit)
+
+    def window(self, unit, start, end, extra=0):
+        if unit == 'paragraph':
+            return self.paragraph_window(start, end, extra)
+        return self.sentence_window(start, end, extra)
+
+
+def _load_segments():
+    rows = ArticleIndex.objects.filter(article__in=shard_articles(Article.objects.all())).values_list(
+        'article_id', 'sentences', 'paragraphs')
+    return {pk: Segments(sentences, paragraphs) for pk, sentences, paragraphs in rows if sentences}
+
+
+# {article pk: Segments} of the articles this node searches
+_SEGMENTS = GenerationCache(_load_segments)
+
+
+def load_segments(art):
+    """Segments stored for art at ingest, or None if it hasn't been processed yet."""
+    return _SEGMENTS.get().get(art.pk)
@@ -0,0 +1,160 @@
+"""
+Scatter-gather search over several corpus nodes.
+
+A shard node runs with CORPUS_SHARD = 'i/n' and only searches the articles
+whose id % n == i; it answers /qidiruv/api/ with its first `limit` hits (in
+results-page order), its hit total, its per-style counts and facet counts.
+
+A coordinator lists the shard base URLs in SEARCH_SHARDS. The search view
+then asks every shard in parallel for the hits up to the requested page,
+merges the already sorted lists and sums the counts. Shards that fail or
+miss SEARCH_SHARD_TIMEOUT are reported and the page is built from the rest.
+"""
+import heapq
+import itertools
+import json
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Mod
+from django.http import HttpResponseBadRequest, JsonResponse
+
+API_PATH = '/qidiruv/api/'
+
+
+def parse_shard(spec):
+    """'i/n' -> (i, n); empty or malformed -> None."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except (AttributeError, ValueError):
+        return None
+    if count < 1 or not 0 <= index < count:
+        return None
+    return index, count
+
+
+def shard_articles(qs):
+    """Restrict an Article queryset to this node's shard (no-op when not sharded)."""
+    shard = parse_shard(settings.CORPUS_SHARD)
+    if shard is None:
+        return qs
+    index, count = shard
+    return qs.annotate(shard=Mod(F('pk'), count)).filter(shard=index)
+
+
+def search_api(request):
+    """Shard-local search: this node's sorted hits as JSON."""
+    from .budget import default_budget, estimate_search_cost, search_slot
+    from .views import (
+        collect_search_hits, parse_context_mode, parse_filters, parse_search_query, parse_sort,
+        search_articles,
+    )
+
+    raw_q, search_ty, style_filt, search_variants = parse_search_query(request.GET)
+    context_mode = parse_context_mode(request.GET)
+    sort = parse_sort(request.GET)
+    filters = parse_filters(request.GET)
+    if not raw_q:
+        return HttpResponseBadRequest("Missing query parameter 'q'")
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return HttpResponseBadRequest("'limit' must be an integer")
+
+    cost = estimate_search_cost(search_articles(style_filt, filters), search_variants, search_ty)
+    with search_slot(cost.expensive) as has_slot:
+        if not has_slot:
+            return JsonResponse({'error': 'busy'}, status=503)
+        budget = default_budget()
+        hits, style_counts, facets = collect_search_hits(
+            search_variants, search_ty, style_filt, context_mode, filters, sort, budget)
+
+    return JsonResponse({
+        'shard': settings.CORPUS_SHARD,
+        'found': len(hits),
+        'found_at_least': budget.found_at_least,
+        'truncated': budget.truncated,
+        'style_counts': style_counts,
+        'facets': facets,
+        'hits': hits[:max(limit, 0)],
+    })
+
+
+class MergedHits:
+    """
+    Sequence of `found` hits of which only the first len(hits) were fetched.
+    Enough for Paginator, which only needs len() and slicing. `truncated` is
+    set when a shard stopped at its search budget (see budget.py).
+    """
+
+    def __init__(self, hits, found, found_at_least=None, truncated=False):
+        self.hits = hits
+        self.found = found
+        self.found_at_least = found if found_at_least is None else found_at_least
+        self.truncated = truncated
+
+    def __len__(self):
+        return self.found
+
+    def __getitem__(self, index):
+        return self.hits[index]
+
+
+def _fetch(base_url, params, timeout):
+    url = base_url.rstrip('/') + API_PATH + '?' + urllib.parse.urlencode(params)
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.load(response)
+
+
+def gather_search_hits(raw_q, search_ty, style_filt, limit, shards=None, timeout=None,
+                       context_mode='belgi', sort='uslub', filters=None):
+    """
+    Ask every shard for its first `limit` hits.
+
+    Returns (hits, style_counts, facets, failed_shards) where hits is a
+    MergedHits over the merged lists, facets the summed facet counts and
+    failed_shards names the shards left out.
+    """
+    from .facets import merge_facet_counts
+    from .views import SORT_OPTIONS
+
+    shards = shards if shards is not None else settings.SEARCH_SHARDS
+    timeout = timeout if timeout is not None else settings.SEARCH_SHARD_TIMEOUT
+    params = {'q': raw_q, 'type': search_ty, 'style': style_filt, 'context': context_mode,
+              'sort': sort, 'limit': limit, **(filters or {})}
+
+    executor = ThreadPoolExecutor(max_workers=len(shards))
+    futures = {shard: executor.submit(_fetch, shard, params, timeout) for shard in shards}
+    deadline = time.monotonic() + timeout
+
+    partials = []
+    failed_shards = []
+    for shard, future in futures.items():
+        try:
+            partials.append(future.result(timeout=max(0, deadline - time.monotonic())))
+        except Exception as e:
+            print(f"Shard {shard} failed: {e!r}")
+            failed_shards.append(shard)
+    # Don't wait for shards that already missed the deadline
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    style_counts = Counter()
+    for partial in partials:
+        style_counts.update(partial['style_counts'])
+    # Relevance scores use each shard's own corpus statistics, so they are
+    # only approximately comparable across shards
+    sort_key = SORT_OPTIONS[sort][1]
+    merged = list(itertools.islice(heapq.merge(*(p['hits'] for p in partials), key=sort_key), limit))
+    found = sum(p['found'] for p in partials)
+
+    facets = merge_facet_counts(p['facets'] for p in partials)
+
+    found_at_least = sum(p.get('found_at_least', p['found']) for p in partials)
+    truncated = any(p.get('truncated') for p in partials)
+
+    return MergedHits(merged, found, found_at_least, truncated), style_counts, facets, failed_shards
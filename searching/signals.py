@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import get_search_backend
+from .generation import bump_generation
+from .jobs import enqueue_article
+from .models import Article
+from .pagecache import clear_page_cache
+
+
+def corpus_changed():
+    """
+    Start a new corpus generation now, for this process, and again once the
+    transaction commits, so no other worker caches the pre-commit corpus
+    under the new number; drop the cached pages of the old one.
+    """
+    bump_generation()
+    transaction.on_commit(bump_generation)
+    # Keyed on the generation already: this only frees the space
+    transaction.on_commit(clear_page_cache)
+
+
+@receiver(post_save, sender=Article)
+def process_saved_article(sender, instance, raw=False, **kwargs):
+    """Hand the file off to the processing queue instead of reading it in the request."""
+    corpus_changed()
+    if raw:
+        return
+    enqueue_article(instance)
+
+
+@receiver(post_delete, sender=Article)
+def unindex_deleted_article(sender, instance, **kwargs):
+    corpus_changed()
+    get_search_backend().remove_article(instance.pk)
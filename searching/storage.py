@@ -0,0 +1,169 @@
+"""
+Block-compressed article storage.
+
+An .ozb file holds one article as independently compressed blocks of
+roughly BLOCK_CHARS characters, split at line ends, plus a table of each
+block's character and byte offsets:
+
+    b'OZB1' | codec (1 byte) | 3 bytes padding | block count n (uint32)
+    char_starts:  n + 1 uint64, character offset where each block starts
+    data_starts:  n + 1 uint64, byte offset of each block after the tables
+    compressed blocks (UTF-8 text, zlib or lzma)
+
+BlockText opens the tables only and decompresses blocks on demand, so
+slicing an excerpt out of a hit touches one block. Decompressed blocks are
+kept in a small LRU shared by every article.
+"""
+import bisect
+import lzma
+import os
+import struct
+import zlib
+from array import array
+from collections import OrderedDict
+
+MAGIC = b'OZB1'
+HEADER = struct.Struct('<4sB3xI')
+BLOCK_CHARS = 64 * 1024
+CODECS = {
+    'zlib': (0, lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (1, lzma.compress, lzma.decompress),
+}
+_DECOMPRESS = {code: decompress for code, compress, decompress in CODECS.values()}
+
+# Decompressed block LRU: {(path, mtime, block_index): text}
+_BLOCK_CACHE = OrderedDict()
+BLOCK_CACHE_CHARS = 8 * 1024 * 1024
+_block_cache_chars = 0
+
+
+def split_blocks(text, block_chars=BLOCK_CHARS):
+    """Cut text into blocks of about block_chars characters, preferring line ends."""
+    blocks = []
+    start = 0
+    while start < len(text):
+        end = start + block_chars
+        if end < len(text):
+            newline = text.rfind('\n', start + block_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        blocks.append(text[start:end])
+        start = end
+    return blocks
+
+
+def write_block_file(text, path, codec='zlib', block_chars=BLOCK_CHARS):
+    """Write text to path in block format (atomically, via a temporary file)."""
+    code, compress, _ = CODECS[codec]
+    blocks = split_blocks(text, block_chars)
+
+    char_starts = array('Q', [0])
+    data_starts = array('Q', [0])
+    compressed = []
+    for block in blocks:
+        data = compress(block.encode('utf-8'))
+        compressed.append(data)
+        char_starts.append(char_starts[-1] + len(block))
+        data_starts.append(data_starts[-1] + len(data))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, code, len(blocks)))
+        f.write(char_starts.tobytes())
+        f.write(data_starts.tobytes())
+        for data in compressed:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _cache_block(key, text):
+    global _block_cache_chars
+    _BLOCK_CACHE[key] = text
+    _block_cache_chars += len(text)
+    while _block_cache_chars > BLOCK_CACHE_CHARS and len(_BLOCK_CACHE) > 1:
+        _, evicted = _BLOCK_CACHE.popitem(last=False)
+        _block_cache_chars -= len(evicted)
+
+
+class BlockText:
+    """Read-only, str-like view of a block file: supports len() and slicing."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            magic, self.codec, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a block file')
+            self.char_starts = array('Q')
+            self.char_starts.frombytes(f.read(8 * (count + 1)))
+            self.data_starts = array('Q')
+            self.data_starts.frombytes(f.read(8 * (count + 1)))
+        self.data_offset = HEADER.size + 16 * (count + 1)
+
+    @property
+    def block_count(self):
+        return len(self.char_starts) - 1
+
+    def __len__(self):
+        return self.char_starts[-1]
+
+    def block(self, index):
+        """Decompressed text of one block (through the shared LRU)."""
+        key = (self.path, self.mtime, index)
+        text = _BLOCK_CACHE.get(key)
+        if text is not None:
+            _BLOCK_CACHE.move_to_end(key)
+            return text
+
+        start, end = self.data_starts[index], self.data_starts[index + 1]
+        with open(self.path, 'rb') as f:
+            f.seek(self.data_offset + start)
+            data = f.read(end - start)
+        text = _DECOMPRESS[self.codec](data).decode('utf-8')
+        _cache_block(key, text)
+        return text
+
+    def block_of(self, offset):
+        """Index of the block containing character offset."""
+        return max(0, bisect.bisect_right(self.char_starts, offset) - 1)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1] if key >= 0 else self[len(self) + key:len(self) + key + 1]
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError('BlockText only supports contiguous slices')
+        if start >= stop:
+            return ''
+
+        first, last = self.block_of(start), self.block_of(stop - 1)
+        text = ''.join(self.block(i) for i in range(first, last + 1))
+        base = self.char_starts[first]
+        return text[start - base:stop - base]
+
+    def __str__(self):
+        return self[:]
+
+    def scan_windows(self, overlap):
+        """
+        Yield (window, window_start, block_start, block_end) for each block:
+        the block plus one character before it and `overlap` after it, so a
+        pattern of bounded length sees the same surroundings as in the full text.
+        """
+        for index in range(self.block_count):
+            block_start, block_end = self.char_starts[index], self.char_starts[index + 1]
+            window_start = max(0, block_start - 1)
+            yield self[window_start:block_end + overlap], window_start, block_start, block_end
+
+
+_OPEN_FILES = {}  # {path: BlockText}, headers only
+
+
+def open_block_text(path):
+    """BlockText for path, reusing the parsed header while the file is unchanged."""
+    text = _OPEN_FILES.get(path)
+    if text is None or text.mtime != os.path.getmtime(path):
+        text = _OPEN_FILES[path] = BlockText(path)
+    return text
@@ -0,0 +1,226 @@
+"""
+Frequency statistics of a word across the corpus, from a document-term matrix.
+
+build_term_matrix() tokenizes every article (tokens.py: vocabulary.py
+keys, so Latin and Cyrillic spellings are one term) and writes, next to the
+vocabulary and token streams it also rewrites, TERM_MATRIX_PATH: an .npz
+holding the term-by-document counts in compressed sparse row form, rows in
+vocabulary order:
+
+    indptr[t]:indptr[t + 1]   slice of `docs`/`counts` for term t
+    docs, counts              document positions and counts
+    doc_ids, doc_tokens       Article pk and word count of each position
+
+Style, genre and year vectors aligned with doc_ids come from the database
+once per corpus generation, so editing an article's metadata needs no
+rebuild. word_stats() then sums the rows of a word's forms into one
+per-document vector and gets frequency per million by style, Juilland's D
+over the texts and the year-by-year trend from a few bincounts.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+
+from .generation import GenerationCache, corpus_generation
+from .models import Article
+from .tokens import save_token_streams, tokenize_articles
+from .vocabulary import get_vocabulary, save_vocabulary, word_key
+
+# Word search matches the query plus up to this many letters (backends.compile_search_pattern)
+MAX_SUFFIX = 6
+
+_MATRIX = None  # (mtime, TermMatrix)
+
+
+class TermMatrix:
+    """Term-by-document counts (CSR) with the documents' ids and sizes."""
+
+    def __init__(self, indptr, docs, counts, doc_ids, doc_tokens, vocabulary_crc):
+        self.indptr = indptr
+        self.docs = docs
+        self.counts = counts
+        self.doc_ids = doc_ids
+        self.doc_tokens = doc_tokens
+        self.vocabulary_crc = int(vocabulary_crc)
+        self.vectors = None  # (generation, document_vectors())
+
+    @classmethod
+    def from_token_streams(cls, streams):
+        """Count the terms of each document of a TokenStreams."""
+        tokens, offsets = streams.arrays()
+        terms, docs, counts = [], [], []
+        for position in range(len(streams)):
+            doc_terms, doc_counts = np.unique(tokens[offsets[position]:offsets[position + 1]], return_counts=True)
+            terms.append(doc_terms)
+            docs.append(np.full(len(doc_terms), position, dtype=np.int32))
+            counts.append(doc_counts)
+        terms = np.concatenate(terms or [np.zeros(0, dtype=np.uint32)]).astype(np.int64)
+        order = np.argsort(terms, kind='stable')
+        n_terms = int(terms.max()) + 1 if len(terms) else 0
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+        return cls(
+            indptr,
+            np.concatenate(docs or [np.zeros(0, dtype=np.int32)])[order],
+            np.concatenate(counts or [np.zeros(0, dtype=np.int64)]).astype(np.int32)[order],
+            np.asarray(streams.doc_ids, dtype=np.int64),
+            np.diff(offsets).astype(np.int64),
+            streams.vocabulary_crc,
+        )
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(
+            tmp, indptr=self.indptr, docs=self.docs, counts=self.counts,
+            doc_ids=self.doc_ids, doc_tokens=self.doc_tokens, vocabulary_crc=self.vocabulary_crc,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['indptr'], data['docs'], data['counts'],
+                data['doc_ids'], data['doc_tokens'], data['vocabulary_crc'],
+            )
+
+    def doc_counts(self, terms):
+        """Per-document occurrences of all the given term rows together (float array)."""
+        if not len(terms):
+            return np.zeros(len(self.doc_ids))
+        rows = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in terms]
+        entries = np.concatenate(rows)
+        return np.bincount(self.docs[entries], weights=self.counts[entries], minlength=len(self.doc_ids))
+
+
+def build_term_matrix(articles=None):
+    """
+    Tokenize articles (default: all) and write the vocabulary, TOKEN_STREAM_PATH
+    and TERM_MATRIX_PATH. Returns (vocabulary, matrix).
+    """
+    vocabulary, streams = tokenize_articles(articles)
+    matrix = TermMatrix.from_token_streams(streams)
+    save_vocabulary(vocabulary)
+    save_token_streams(streams)
+    matrix.save(settings.TERM_MATRIX_PATH)
+    return vocabulary, matrix
+
+
+def get_term_matrix():
+    """This worker's TermMatrix (reloaded when the file changes), or None if it is missing or stale."""
+    global _MATRIX
+    path = settings.TERM_MATRIX_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _MATRIX is None or _MATRIX[0] != mtime:
+        _MATRIX = (mtime, TermMatrix.load(path))
+    matrix = _MATRIX[1]
+    # Term rows are vocabulary positions: useless against another vocabulary
+    vocabulary = get_vocabulary()
+    return matrix if vocabulary is not None and matrix.vocabulary_crc == vocabulary.checksum() else None
+
+
+def _load_document_metadata():
+    rows = Article.objects.values_list('pk', 'style', 'genre', 'pub_year')
+    return {pk: (style or '', genre or '', pub_year or 0) for pk, style, genre, pub_year in rows}
+
+
+# {article pk: (style, genre, year)} of the current corpus
+_DOCUMENT_METADATA = GenerationCache(_load_document_metadata)
+
+
+def document_vectors(matrix):
+    """
+    Metadata aligned with matrix.doc_ids (a TermMatrix or TokenStreams):
+    (style index, style keys, year, alive) arrays; alive is False for
+    documents deleted since the build. Kept on the matrix for the corpus
+    generation.
+    """
+    generation = corpus_generation()
+    if matrix.vectors is not None and matrix.vectors[0] == generation:
+        return matrix.vectors[1]
+    metadata = _DOCUMENT_METADATA.get()
+    styles = [key for key, label in Article.STYLE_CHOICES]
+    style_index = {key: i for i, key in enumerate(styles)}
+    missing = ('', '', 0)
+    rows = [metadata.get(int(pk), missing) for pk in matrix.doc_ids]
+    style = np.asarray([style_index.get(row[0], len(styles)) for row in rows], dtype=np.int64)
+    year = np.asarray([row[2] for row in rows], dtype=np.int64)
+    alive = np.asarray([int(pk) in metadata for pk in matrix.doc_ids])
+    matrix.vectors = (generation, (style, styles, year, alive))
+    return matrix.vectors[1]
+
+
+def word_forms(vocabulary, key):
+    """Vocabulary indices of the forms a word search for key matches: key plus up to MAX_SUFFIX letters."""
+    lo, hi = vocabulary.prefix_range(key)
+    forms = []
+    for i in range(lo, hi):
+        rest = vocabulary.word(i)[len(key):]
+        if len(rest) <= MAX_SUFFIX and (not rest or rest.isalpha()):
+            forms.append(i)
+    return forms
+
+
+def juilland_d(per_doc, tokens):
+    """Juilland's D over texts of unequal size (relative frequencies), None if undefined."""
+    parts = tokens > 0
+    n = int(parts.sum())
+    if n < 2:
+        return None
+    relative = per_doc[parts] / tokens[parts]
+    mean = relative.mean()
+    if mean == 0:
+        return None
+    return max(0.0, float(1 - (relative.std() / mean) / np.sqrt(n - 1)))
+
+
+def word_stats(query):
+    """
+    Corpus statistics of a word and its suffixed forms, or None without a
+    term matrix: {'count', 'documents', 'per_million', 'dispersion',
+    'by_style': {style: per million}, 'by_year': [(year, count, per million)],
+    'trend': change in per million per year, or None}.
+    """
+    matrix = get_term_matrix()
+    key = word_key(query.strip())
+    if matrix is None or not key:
+        return None
+    forms = word_forms(get_vocabulary(), key)
+    style, styles, year, alive = document_vectors(matrix)
+    per_doc = matrix.doc_counts(forms) * alive
+    tokens = matrix.doc_tokens * alive
+
+    style_hits = np.bincount(style, weights=per_doc, minlength=len(styles) + 1)
+    style_tokens = np.bincount(style, weights=tokens, minlength=len(styles) + 1)
+    by_style = {
+        key: float(style_hits[i] / style_tokens[i] * 1e6) if style_tokens[i] else 0.0
+        for i, key in enumerate(styles)
+    }
+
+    by_year = []
+    dated = (year > 0) & (tokens > 0)
+    if dated.any():
+        years, year_pos = np.unique(year[dated], return_inverse=True)
+        year_hits = np.bincount(year_pos, weights=per_doc[dated])
+        year_tokens = np.bincount(year_pos, weights=tokens[dated])
+        year_pm = year_hits / year_tokens * 1e6
+        by_year = [(int(y), int(h), float(pm)) for y, h, pm in zip(years, year_hits, year_pm)]
+    trend = None
+    if len(by_year) >= 2:
+        trend = float(np.polyfit([y for y, h, pm in by_year], [pm for y, h, pm in by_year], 1)[0])
+
+    total_tokens = tokens.sum()
+    return {
+        'count': int(per_doc.sum()),
+        'documents': int((per_doc > 0).sum()),
+        'per_million': float(per_doc.sum() / total_tokens * 1e6) if total_tokens else 0.0,
+        'dispersion': juilland_d(per_doc, tokens),
+        'by_style': by_style,
+        'by_year': by_year,
+        'trend': trend,
+    }
@@ -1,3 +1,859 @@
-from django.test import TestCase
+import csv
+import io
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter, namedtuple
+from contextlib import redirect_stdout
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.http import QueryDict
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .analysis import minhash, near_duplicate_pairs, normalized_words, shingle_hashes
+from .backends import FTS5SearchBackend, RegexSearchBackend, iter_matches
+from .converters import Transliterator, cyrillic_to_latin_converter, latin_to_cyrillic_converter
+from .corpus import _CONTENT_CACHE
+from .export import EXPORT_COLUMNS, openpyxl
+from .facets import decade, facet_filter_query
+from .generation import GenerationCache, bump_generation, corpus_generation
+from .budget import SearchBudget
+from .collocations import collocates, ngrams
+from .jobs import LEASE_TIMEOUT, claim_next_job, run_job
+from .models import Article, ArticleJob
+from .highlight import highlighter
+from .hitcache import cached_matches
+from .pagecache import page_version
+from .passages import RepeatedSentences, build_sentence_hashes
+from .querylog import flush_query_log, log_query
+from .ranking import RankedHits, bm25, rank_hits, score_documents, top_documents
+from .scriptmap import ScriptMap, build_script_map
+from .segments import Segments, build_segments
+from .shards import gather_search_hits
+from .storage import BlockText, write_block_file
+from .termstats import TermMatrix, juilland_d
+from .views import _distinct_matches, article_passes, collect_search_hits, generate_search_variants, parse_collocation_query
+from .tokens import tokenize
+from .vocabulary import Vocabulary, count_words, cyrillic_forms, key_counts, suggest, word_key, written_word_counts
+
+FTS5_BACKEND = 'searching.backends.FTS5SearchBackend'
+
+# Small real texts from the corpus (Latin and Cyrillic) plus a synthetic one
+# with the edge cases the tokenizers disagree on.
+CORPUS_FILES = [
+    ('rasmiy', 'constitution_oz.txt'),
+    ('rasmiy', 'Мехнат-шартномаси-контракт.txt'),
+    ('rasmiy', 'ШАРТНОМА-ижарага-бериш.txt'),
+    ('rasmiy', "Tilxat yozish qoidalari va namunalari to'liq.txt"),
+]
+SYNTHETIC_TEXT = (
+    "O'zbekiston o'g'illari MODDA_1 moddalar. Ўзбекистон ЎҒИЛЛАРИ моддаларнинг "
+    "ta'lim-tarbiya, ta’lim; qonunchilik 2025-yil qonunlar\n"
+    "Кодекснинг 5-моддаси. Xalq so'zi\n"
+)
+
+# Files the app writes (generation counter, file caches, query log, corpus
+# word lists) go to a temporary directory for the test run, so tests neither
+# bump the real corpus generation nor clear the real page cache
+_state_dir = None
+_isolated_state = None
+
+
+def setUpModule():
+    global _state_dir, _isolated_state
+    _state_dir = tempfile.mkdtemp(prefix='korpus-tests-')
+    _isolated_state = override_settings(
+        CORPUS_GENERATION_FILE=os.path.join(_state_dir, 'generation'),
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'search': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(_state_dir, 'search'),
+            },
+            'pages': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(_state_dir, 'pages'),
+            },
+            'template_fragments': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'test-fragments',
+            },
+        },
+        QUERY_LOG='',
+        VOCABULARY_PATH=os.path.join(_state_dir, 'vocabulary.bin'),
+        TERM_MATRIX_PATH=os.path.join(_state_dir, 'terms.npz'),
+        TOKEN_STREAM_PATH=os.path.join(_state_dir, 'tokens.bin'),
+        SEARCH_SLOTS_DIR=os.path.join(_state_dir, 'slots'),
+    )
+    _isolated_state.enable()
+
+
+def tearDownModule():
+    _isolated_state.disable()
+    shutil.rmtree(_state_dir, ignore_errors=True)
+
+
+WORD_QUERIES = ['modda', 'Кодекс', "o'z", 'qonun', 'a', 'ўз', 'MODDA', "ta'lim", 'huquq', 'fuqaro', "-"]
+SUFFIX_QUERIES = ['lar', 'da', 'ning', 'ган', 'ини', 'lik', 'x', "'i", 'sining']
+
+
+class FTS5BackendEquivalenceTest(TestCase):
+    """The FTS5 backend must return exactly the hits of the regex reference backend."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, SEARCH_BACKEND=FTS5_BACKEND, ARTICLE_JOBS_EAGER=True,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        _CONTENT_CACHE.clear()
+
+        os.makedirs(os.path.join(self.media_root, 'articles'))
+        for style, name in CORPUS_FILES:
+            shutil.copy(
+                os.path.join(settings.BASE_DIR, 'media', 'articles', style, name),
+                os.path.join(self.media_root, 'articles', name),
+            )
+            Article.objects.create(title=name, style=style, file=f'articles/{name}')
+        self.synthetic = self._create_article('synthetic.txt', SYNTHETIC_TEXT)
+
+    def _create_article(self, name, text):
+        with open(os.path.join(self.media_root, 'articles', name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return Article.objects.create(title=name, file=f'articles/{name}')
+
+    def _hits(self, backend, query, search_type):
+        variants = generate_search_variants(query)
+        return [
+            (art.pk, matches)
+            for art, content, matches in backend.search(Article.objects.all(), variants, search_type)
+        ]
+
+    def assertSameHits(self, query, search_type):
+        expected = self._hits(RegexSearchBackend(), query, search_type)
+        actual = self._hits(FTS5SearchBackend(), query, search_type)
+        self.assertEqual(actual, expected, f'{search_type} query {query!r}')
+
+    def test_word_queries(self):
+        for query in WORD_QUERIES:
+            self.assertSameHits(query, 'word')
+
+    def test_suffix_queries(self):
+        for query in SUFFIX_QUERIES:
+            self.assertSameHits(query, 'suffix')
+
+    def test_index_follows_save_and_delete(self):
+        backend = FTS5SearchBackend()
+        variants = ['zilzila']
+        self.assertEqual(list(backend.candidates(Article.objects.all(), variants, 'word')), [])
+
+        with open(os.path.join(self.media_root, 'articles', 'synthetic.txt'), 'w', encoding='utf-8') as f:
+            f.write('Kuchli zilzilalar')
+        self.synthetic.save()
+        self.assertEqual(list(backend.candidates(Article.objects.all(), variants, 'word')), [self.synthetic])
+
+        self.synthetic.delete()
+        self.assertEqual(list(backend.candidates(Article.objects.all(), variants, 'word')), [])
+
+    def test_regex_backend_deletes_indexed_text(self):
+        pk = self.synthetic.pk
+        query = f'SELECT article_id FROM {FTS5SearchBackend.text_table} WHERE article_id = %s'
+        with connection.cursor() as cursor:
+            cursor.execute(query, [pk])
+            self.assertEqual(cursor.fetchall(), [(pk,)])
+
+            with self.settings(SEARCH_BACKEND='searching.backends.RegexSearchBackend'):
+                self.synthetic.delete()
+            cursor.execute(query, [pk])
+            self.assertEqual(cursor.fetchall(), [])
+
+
+class TransliteratorTest(SimpleTestCase):
+    """Streaming transliteration must not depend on where the text is cut."""
+
+    def _feed(self, to, text, piece):
+        transliterator = Transliterator(to)
+        out = [transliterator.feed(text[i:i + piece]) for i in range(0, len(text), piece)]
+        return ''.join(out) + transliterator.finish()
+
+    def test_pieces_match_whole_text(self):
+        latin = SYNTHETIC_TEXT + "Shahar CHOY yo'l Yo‘l g‘isht o'g'il sh"
+        for to, text in (('cyrillic', latin), ('latin', SYNTHETIC_TEXT)):
+            whole = self._feed(to, text, len(text))
+            for piece in range(1, 8):
+                self.assertEqual(self._feed(to, text, piece), whole, f'{to}, pieces of {piece}')
+
+    def test_matches_whole_string_converters(self):
+        latin = "Shahar CHOY Choy o'g'il G'ISHT ta'lim"
+        self.assertEqual(self._feed('cyrillic', latin, 1), latin_to_cyrillic_converter(latin))
+        self.assertEqual(self._feed('latin', SYNTHETIC_TEXT, 1), cyrillic_to_latin_converter(SYNTHETIC_TEXT))
+        self.assertEqual(self._feed('cyrillic', "yo'l Yo‘l", 1), 'йўл Йўл')
+
+
+class HighlighterTest(SimpleTestCase):
+    """Offsets are highlighted exactly, and everything around them is escaped."""
+
+    def test_escapes_around_the_match(self):
+        content = 'a<b> & "kitob" <script>alert(1)</script>'
+        start = content.index('kitob')
+        self.assertEqual(
+            highlighter.excerpt(content, start, start + 5),
+            'a&lt;b&gt; &amp; "<span class="highlight">kitob</span>" &lt;script&gt;alert(1)&lt;/script&gt;',
+        )
+        self.assertEqual(
+            highlighter.excerpt(content, start, start + 5, convert=latin_to_cyrillic_converter, window=(0, 13)),
+            'а&lt;б&gt; &amp; "<span class="highlight">китоб</span>',
+        )
+        self.assertEqual(highlighter.split(content, start, start + 5, window=(0, 13)), ('a<b> & "', 'kitob', ''))
+
+    def test_match_at_the_edges(self):
+        self.assertEqual(highlighter.excerpt('kitob', 0, 5), '<span class="highlight">kitob</span>')
+        self.assertEqual(highlighter.excerpt('<kitob>', 1, 6), '&lt;<span class="highlight">kitob</span>&gt;')
+
+    def test_adjacent_matches(self):
+        self.assertEqual(highlighter.mark('ab<cd', [(0, 2), (2, 3)]),
+                         '<span class="highlight">ab</span><span class="highlight">&lt;</span>cd')
+        self.assertEqual(highlighter.highlight('sud-sud <sud>', 'sud'),
+                         '<span class="highlight">sud</span>-<span class="highlight">sud</span> '
+                         '&lt;<span class="highlight">sud</span>&gt;')
+        self.assertEqual(highlighter.highlight('<i>', ''), '&lt;i&gt;')
+
+    def test_overlapping_matches_are_one_hit(self):
+        matches = [(9, 14, 'kitob', 'kitob'), (0, 8, 'kitoblar', 'kitob'), (0, 5, 'kitob', 'kitob'),
+                   (3, 8, 'oblar', 'oblar'), (8, 9, ' ', ' ')]
+        self.assertEqual([m[:2] for m in _distinct_matches(matches)], [(0, 8), (8, 9), (9, 14)])
+
+
+class TermMatrixTest(SimpleTestCase):
+    """Token streams and the CSR rows counted from them must agree with count_words()."""
+
+    def test_rows_match_document_counts(self):
+        texts = [SYNTHETIC_TEXT, 'shahar shahar kitob', "Kitob va daftar. Шаҳар o'g'il"]
+        vocabulary, streams = tokenize(enumerate(texts, 1))
+        self.assertEqual(dict(zip(map(vocabulary.word, range(len(vocabulary))), vocabulary.counts)),
+                         dict(count_words(texts)))
+        matrix = TermMatrix.from_token_streams(streams)
+        doc_counts = [count_words([text]) for text in texts]
+        for position, counts in enumerate(doc_counts):
+            self.assertEqual(Counter(map(vocabulary.word, streams.document(position))), counts)
+        for i in range(len(vocabulary)):
+            word = vocabulary.word(i)
+            self.assertEqual(list(matrix.doc_counts([i])), [counts[word] for counts in doc_counts], word)
+        self.assertEqual(list(matrix.doc_tokens), [sum(counts.values()) for counts in doc_counts])
+
+    def test_juilland_d(self):
+        tokens = np.array([100.0, 100.0, 100.0])
+        self.assertAlmostEqual(juilland_d(np.array([5.0, 5.0, 5.0]), tokens), 1.0)
+        self.assertAlmostEqual(juilland_d(np.array([9.0, 0.0, 0.0]), tokens), 0.0)
+        self.assertIsNone(juilland_d(np.array([0.0, 0.0, 0.0]), tokens))
+
+
+class DuplicateDetectionTest(SimpleTestCase):
+    """Script editions normalize to the same words; MinHash pairs up only similar texts."""
+
+    def test_editions_have_the_same_words(self):
+        latin = "Shahar ko'chalari keng, g'isht uylar baland. Choy ichdik"
+        self.assertEqual(normalized_words(latin_to_cyrillic_converter(latin)), normalized_words(latin))
+
+    def test_near_duplicates(self):
+        words = normalized_words(SYNTHETIC_TEXT * 3) + [f'soz{i}' for i in range(400)]
+        signatures = {
+            1: minhash(shingle_hashes(words)),
+            2: minhash(shingle_hashes(words[:-20])),
+            3: minhash(shingle_hashes(words[::-1])),
+        }
+        self.assertEqual([(a, b) for a, b, similarity in near_duplicate_pairs(signatures, 0.8)], [(1, 2)])
+
+
+class RepeatedPassageTest(SimpleTestCase):
+    """Sentence hashes ignore the script; hits are placed in repeated sentences by offset."""
+
+    def test_editions_have_the_same_sentence_hashes(self):
+        latin = "Qisqa gap. Sud majlisiga guvohlarni chaqirish tartibi ushbu kodeks bilan belgilanadi. Choy ichdik."
+        cyrillic = latin_to_cyrillic_converter(latin)
+        hashes = build_sentence_hashes(latin, build_segments(latin)[0])
+        self.assertEqual(hashes, build_sentence_hashes(cyrillic, build_segments(cyrillic)[0]))
+        self.assertEqual(np.frombuffer(hashes, dtype=np.uint64).astype(bool).tolist(), [False, True, False])
+
+    def test_passage_at(self):
+        sentences = RepeatedSentences([(10, 50, 7), (80, 120, 9)])
+        self.assertEqual([sentences.passage_at(offset) for offset in (0, 10, 49, 50, 80, 119, 120)],
+                         [None, 7, 7, None, 9, 9, None])
+
+
+class BlockTextTest(SimpleTestCase):
+    """A block file reads and searches exactly like the text it was written from."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        # Small blocks, so words and matches fall across block boundaries
+        self.text = SYNTHETIC_TEXT * 20 + 'oxirgi modda'
+
+    def block_text(self, codec):
+        path = os.path.join(self.dir, f'{codec}.ozb')
+        write_block_file(self.text, path, codec=codec, block_chars=50)
+        return BlockText(path)
+
+    def test_slices_match_the_text(self):
+        for codec in ('zlib', 'lzma'):
+            with self.subTest(codec=codec):
+                block = self.block_text(codec)
+                self.assertGreater(block.block_count, 10)
+                self.assertEqual(len(block), len(self.text))
+                self.assertEqual(str(block), self.text)
+                for start, stop in ((0, 1), (45, 130), (len(self.text) - 7, None), (-12, -3), (300, 300)):
+                    self.assertEqual(block[start:stop], self.text[start:stop])
+                self.assertEqual(block[-1], self.text[-1])
+
+    def test_matches_match_the_text(self):
+        block = self.block_text('zlib')
+        for search_type, queries in (('word', WORD_QUERIES), ('suffix', SUFFIX_QUERIES)):
+            for query in queries:
+                variants = generate_search_variants(query)
+                with self.subTest(search_type=search_type, query=query):
+                    self.assertEqual(
+                        list(iter_matches(block, variants, search_type)),
+                        list(iter_matches(self.text, variants, search_type)),
+                    )
+
+
+class ArticleJobQueueTest(TestCase):
+    """Saving queues a job; workers claim each job once, and jobs of dead workers come back."""
+
+    def setUp(self):
+        # No file behind it: every run fails
+        self.article = Article.objects.create(title='missing', file='articles/missing.txt')
+        self.job = ArticleJob.objects.get(article=self.article)
+
+    def _abandon(self, job):
+        ArticleJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=LEASE_TIMEOUT + 1))
+
+    def test_claim_and_retry(self):
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status), (self.job.pk, ArticleJob.RUNNING))
+        self.assertIsNone(claim_next_job())
+
+        job = run_job(job)
+        self.assertEqual((job.status, job.attempts), (ArticleJob.PENDING, 1))
+        self.assertIn('FileNotFoundError', job.last_error)
+        self.assertIsNone(claim_next_job())  # waiting for its retry delay
+        ArticleJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(claim_next_job().pk, job.pk)
+
+    def test_abandoned_job_is_reclaimed(self):
+        claim_next_job()
+        self._abandon(self.job)
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status, job.attempts), (self.job.pk, ArticleJob.RUNNING, 1))
+        self.assertIsNone(claim_next_job())
+
+        self._abandon(job)
+        ArticleJob.objects.filter(pk=job.pk).update(attempts=job.max_attempts - 1)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(ArticleJob.objects.get(pk=job.pk).status, ArticleJob.FAILED)
+
+    def test_admin_retry_resets_only_abandoned_running_jobs(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        retry = {'action': 'retry_jobs', '_selected_action': [self.job.pk]}
+        claim_next_job()
+        self.client.post('/admin/searching/articlejob/', retry)
+        self.assertEqual(ArticleJob.objects.get(pk=self.job.pk).status, ArticleJob.RUNNING)
+
+        self._abandon(self.job)
+        self.client.post('/admin/searching/articlejob/', retry)
+        job = ArticleJob.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.attempts), (ArticleJob.PENDING, 0))
+
+
+class ArticleFilterTest(SimpleTestCase):
+    """Metadata filters compare authors as the facet links show them."""
+
+    def test_author_facet_value_matches(self):
+        art = Article(author='— Abdulla Qodiriy', style='badiiy', pub_year=1926)
+        self.assertTrue(article_passes(art, '', {'author': 'Abdulla Qodiriy'}))
+        self.assertTrue(article_passes(art, 'badiiy', {'author': '— Abdulla Qodiriy', 'year_to': 1930}))
+        self.assertFalse(article_passes(art, '', {'author': 'Abdulla'}))
+        self.assertFalse(article_passes(art, 'ilmiy', {}))
+
+
+class CollocationQueryTest(SimpleTestCase):
+    def test_numbers_are_clamped(self):
+        options = parse_collocation_query({'q': 'sud', 'window': '-3', 'min': '-1', 'limit': '-5'})
+        self.assertEqual((options['window'], options['min_count'], options['limit']), (1, 1, 1))
+        self.assertEqual(parse_collocation_query({'limit': '100000'})['limit'], 200)
+        with self.assertRaises(ValueError):
+            parse_collocation_query({'limit': 'ko'})
+
+
+class FacetFilterTest(SimpleTestCase):
+    def test_decade_links_keep_the_whole_year(self):
+        for year, bounds in ((985, ('980', '989')), (2013, ('2010', '2019'))):
+            query = QueryDict(facet_filter_query(QueryDict('q=sud&page=3'), 'decade', decade(year)))
+            self.assertEqual((query['year_from'], query['year_to']), bounds)
+            self.assertNotIn('page', query)
+
+
+class CorpusTestCase(TestCase):
+    """Articles written to a temporary MEDIA_ROOT and processed as they are saved."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, ARTICLE_JOBS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        _CONTENT_CACHE.clear()
+        os.makedirs(os.path.join(self.media_root, 'articles'))
+
+    def create_article(self, name, text, **fields):
+        with open(os.path.join(self.media_root, 'articles', name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return Article.objects.create(title=name, file=f'articles/{name}', **fields)
+
+
+def _shard_hit(style, author, position):
+    return {'style_key': style, 'author': author, 'title': author, 'match_position': position, 'doc_id': 1}
+
+
+RankedDoc = namedtuple('RankedDoc', 'name word_count')
+
+
+class RankingTest(SimpleTestCase):
+    """BM25 order, ties in the given order, and only as many documents popped as needed."""
+
+    DOCS = {
+        RankedDoc('A', 50): 1,
+        RankedDoc('B', 200): 3,
+        RankedDoc('C', 200): 3,
+        RankedDoc('D', 10): 2,
+    }
+
+    def setUp(self):
+        patcher = mock.patch('searching.ranking.corpus_stats', return_value=(100, 50.0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scores = score_documents(self.DOCS)
+
+    def test_scores(self):
+        idf = math.log(1 + (100 - 4 + 0.5) / (4 + 0.5))
+        self.assertAlmostEqual(bm25(1, 50, 50, 4, 100), idf * 2.2 / 2.2)
+        self.assertAlmostEqual(self.scores[RankedDoc('D', 10)], round(idf * 4.4 / (2 + 1.2 * (0.25 + 0.75 * 0.2)), 4))
+
+    def test_order(self):
+        self.assertEqual([doc.name for doc in top_documents(self.scores, self.DOCS)], ['D', 'A', 'B', 'C'])
+        # Stops once the documents taken hold max_hits hits
+        self.assertEqual([doc.name for doc in top_documents(self.scores, self.DOCS, max_hits=3)], ['D', 'A'])
+
+    def test_ranked_hits_pop_lazily(self):
+        doc_hits = [(doc, [{'doc': doc.name, 'n': n} for n in range(tf)]) for doc, tf in self.DOCS.items()]
+        hits = rank_hits(doc_hits, self.scores)
+        self.assertEqual(len(hits), 9)
+        self.assertEqual([hit['doc'] for hit in hits[:2]], ['D', 'D'])
+        self.assertEqual(len(hits._heap), 3)
+        self.assertEqual([(hit['doc'], hit['n']) for hit in hits[2:9]],
+                         [('A', 0), ('B', 0), ('B', 1), ('B', 2), ('C', 0), ('C', 1), ('C', 2)])
+        self.assertEqual(hits[0]['score'], self.scores[RankedDoc('D', 10)])
+        self.assertIsInstance(hits, RankedHits)
+
+
+class ScatterGatherTest(SimpleTestCase):
+    """The coordinator merges the shards' sorted hits and sums their counts."""
+
+    PARTIALS = {
+        'http://a': {
+            'found': 3, 'found_at_least': 3, 'truncated': False,
+            'style_counts': {'badiiy': 1, 'rasmiy': 2},
+            'facets': {'style': {'badiiy': 1, 'rasmiy': 1}, 'author': {'A': 1, 'C': 1}},
+            'hits': [_shard_hit('badiiy', 'A', 5), _shard_hit('rasmiy', 'C', 1), _shard_hit('rasmiy', 'C', 9)],
+        },
+        'http://b': {
+            'found': 2, 'found_at_least': 7, 'truncated': True,
+            'style_counts': {'badiiy': 2, 'rasmiy': 5},
+            'facets': {'style': {'badiiy': 1, 'rasmiy': 1}, 'author': {'B': 1, 'D': 1}},
+            'hits': [_shard_hit('badiiy', 'B', 2), _shard_hit('rasmiy', 'D', 4)],
+        },
+    }
+
+    def fetch(self, base_url, params, timeout):
+        if base_url not in self.PARTIALS:
+            raise OSError('connection refused')
+        return self.PARTIALS[base_url]
+
+    def gather(self, limit):
+        with mock.patch('searching.shards._fetch', self.fetch), redirect_stdout(io.StringIO()):
+            return gather_search_hits('kitob', 'word', '', limit, shards=['http://a', 'http://down', 'http://b'],
+                                      timeout=5)
+
+    def test_merge(self):
+        hits, style_counts, facets, failed_shards = self.gather(limit=4)
+        self.assertEqual([(hit['author'], hit['match_position']) for hit in hits[:4]],
+                         [('A', 5), ('B', 2), ('C', 1), ('C', 9)])
+        self.assertEqual(len(hits), 5)
+        self.assertEqual((hits.found_at_least, hits.truncated), (10, True))
+        self.assertEqual(dict(style_counts), {'badiiy': 3, 'rasmiy': 7})
+        self.assertEqual(facets['style'], {'badiiy': 2, 'rasmiy': 2})
+        self.assertEqual(facets['author'], {'A': 1, 'B': 1, 'C': 1, 'D': 1})
+        self.assertEqual(failed_shards, ['http://down'])
+
+
+class CompressCorpusTest(CorpusTestCase):
+    def test_originals_kept_without_block_storage(self):
+        art = self.create_article('a.txt', 'Yangi kitob.')
+        with override_settings(CORPUS_BLOCK_STORAGE=False), self.assertRaises(CommandError):
+            call_command('compress_corpus', delete_originals=True)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, art.file.name)))
+
+    def test_compressing_starts_a_generation(self):
+        self.create_article('a.txt', 'Yangi kitob.')
+        generation = corpus_generation()
+        with override_settings(CORPUS_BLOCKS_ROOT=os.path.join(self.media_root, 'blocks')):
+            call_command('compress_corpus', stdout=io.StringIO())
+        self.assertEqual(corpus_generation(), generation + 1)
+
+
+class SegmentWindowTest(CorpusTestCase):
+    """Context windows at the edges of sentences and paragraphs."""
+
+    TEXT = 'Birinchi gap. Ikkinchi gap!\nUchinchi gap keladi.\nOxirgi xatboshi. Tamom.'
+
+    def setUp(self):
+        super().setUp()
+        self.segments = Segments(*build_segments(self.TEXT))
+
+    def at(self, word):
+        return self.TEXT.index(word)
+
+    def test_boundaries(self):
+        self.assertEqual(list(self.segments.sentences),
+                         [0, self.at('Ikkinchi'), self.at('Uchinchi'), self.at('Oxirgi'), self.at('Tamom')])
+        self.assertEqual(list(self.segments.paragraphs), [0, self.at('Uchinchi'), self.at('Oxirgi')])
+
+    def test_first_sentence(self):
+        self.assertEqual(self.segments.sentence_window(0, 8), (0, self.at('Ikkinchi')))
+        self.assertEqual(self.segments.sentence_window(0, 8, extra=1), (0, self.at('Uchinchi')))
+
+    def test_hit_across_a_sentence_break(self):
+        self.assertEqual(self.segments.sentence_window(self.at('gap.'), self.at('Ikkinchi') + 3),
+                         (0, self.at('Uchinchi')))
+
+    def test_last_paragraph(self):
+        start, end = self.segments.paragraph_window(self.at('Tamom'), self.at('Tamom') + 5)
+        self.assertEqual(start, self.at('Oxirgi'))
+        self.assertGreaterEqual(end, len(self.TEXT))
+
+        # The search stops the window at the end of the text
+        self.create_article('s.txt', self.TEXT)
+        hits, counts, facets = collect_search_hits(
+            generate_search_variants('tamom'), 'word', '', context_mode='xatboshi')
+        self.assertEqual(hits[0]['context_window'], (self.at('Oxirgi'), len(self.TEXT)))
+        self.assertEqual(hits[0]['excerpt_lat'], 'Oxirgi xatboshi. <span class="highlight">Tamom</span>.')
+
+
+class ScriptMapTest(CorpusTestCase):
+    """Both editions in one document: each excerpt is converted from its own segment's script."""
+
+    TEXT = "Kitob o'qish foydali.\n\nКитоб ўқиш фойдали."
+
+    def test_runs(self):
+        script_map = ScriptMap(build_script_map(self.TEXT))
+        cyrillic_start = self.TEXT.index('Китоб')
+        self.assertEqual(list(script_map.starts), [0, cyrillic_start])
+        self.assertEqual(script_map.script_at(3), 'latin')
+        self.assertEqual(script_map.script_at(cyrillic_start + 2), 'cyrillic')
+        self.assertEqual(script_map.scripts_between(0, cyrillic_start), {'latin'})
+        self.assertEqual(script_map.scripts_between(10, cyrillic_start + 1), {'latin', 'cyrillic'})
+
+    def test_excerpts_per_segment(self):
+        self.create_article('m.txt', self.TEXT, style='badiiy')
+        hits, counts, facets = collect_search_hits(generate_search_variants('kitob'), 'word', '', context_mode='gap')
+        self.assertEqual([(hit['original_script'], hit['excerpt_scripts']) for hit in hits],
+                         [('latin', ['latin']), ('cyrillic', ['cyrillic'])])
+        for hit in hits:
+            self.assertEqual(hit['excerpt_lat'], '<span class="highlight">Kitob</span> o\'qish foydali.')
+            self.assertEqual(hit['excerpt_cyr'], '<span class="highlight">Китоб</span> ўқиш фойдали.')
+
+
+class GenerationTest(CorpusTestCase):
+    """Corpus data is rebuilt once per generation, and a sweep bumps it only for new changes."""
+
+    def test_cache_follows_the_generation(self):
+        builds = []
+        cache = GenerationCache(lambda: builds.append(corpus_generation()) or len(builds))
+        self.assertEqual((cache.get(), cache.get()), (1, 1))
+        bump_generation()
+        self.assertEqual(cache.get(), 2)
+        self.create_article('a.txt', 'Yangi kitob.')
+        self.assertEqual(cache.get(), 3)
+        self.assertEqual(builds[-1], corpus_generation())
+
+    def sweep(self):
+        generation = corpus_generation()
+        call_command('sweep_corpus', stdout=io.StringIO())
+        return corpus_generation() - generation
+
+    def test_sweep(self):
+        self.create_article('a.txt', 'Yangi kitob.')
+        art = self.create_article('b.txt', 'Eski kitob.')
+        self.assertEqual(self.sweep(), 0)
+        os.remove(os.path.join(self.media_root, art.file.name))
+        self.assertEqual(self.sweep(), 1)
+        self.assertEqual(self.sweep(), 0)
+
+
+class CollocationTest(CorpusTestCase):
+    """Association measures on a six-token corpus, against values worked out by hand."""
+
+    def setUp(self):
+        super().setUp()
+        # Word lists of this corpus only, gone with the test
+        settings_override = override_settings(**{
+            name: os.path.join(self.media_root, filename)
+            for name, filename in (('VOCABULARY_PATH', 'vocabulary.bin'), ('TERM_MATRIX_PATH', 'terms.npz'),
+                                   ('TOKEN_STREAM_PATH', 'tokens.bin'))
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.create_article('a.txt', 'Yangi kitob, yangi daftar.', style='badiiy')
+        self.create_article('b.txt', 'Eski kitob.', style='ilmiy')
+        call_command('build_vocabulary', stdout=io.StringIO())
+
+    def test_measures(self):
+        # ±1 around both "kitob": yangi, yangi | eski (the window stops at the article end)
+        result = collocates('kitob', window=1, min_count=1)
+        self.assertEqual((result['node_count'], result['tokens']), (2, 6))
+        yangi, eski = result['collocates']
+        self.assertEqual((yangi['word'], yangi['count'], yangi['frequency']), ('yangi', 2, 2))
+        self.assertEqual((eski['word'], eski['count'], eski['frequency']), ('eski', 1, 1))
+
+        # E = slots * f / N with 3 slots; LL over the tables [[2, 1], [0, 3]] and [[1, 2], [0, 3]]
+        self.assertAlmostEqual(yangi['expected'], 1.0)
+        self.assertAlmostEqual(yangi['mi'], 1.0)
+        self.assertAlmostEqual(yangi['t'], 1 / math.sqrt(2))
+        self.assertAlmostEqual(yangi['ll'], 2 * (2 * math.log(2) + math.log(1 / 2) + 3 * math.log(3 / 2)))
+        self.assertAlmostEqual(eski['expected'], 0.5)
+        self.assertAlmostEqual(eski['mi'], 1.0)
+        self.assertAlmostEqual(eski['t'], 0.5)
+        self.assertAlmostEqual(eski['ll'], 2 * (math.log(2) + 2 * math.log(2 / 2.5) + 3 * math.log(3 / 2.5)))
+
+        self.assertEqual([c['word'] for c in collocates('kitob', window=1, measure='t', min_count=1)['collocates']],
+                         ['yangi', 'eski'])
+        self.assertEqual(collocates('kitob', window=1, min_count=2)['collocates'][0]['word'], 'yangi')
+        self.assertEqual(len(collocates('kitob', window=1, min_count=2)['collocates']), 1)
+
+    def test_ngrams(self):
+        # No bigram runs across the two articles
+        self.assertEqual(ngrams(2), [('eski kitob', 1), ('kitob yangi', 1), ('yangi daftar', 1), ('yangi kitob', 1)])
+        self.assertEqual(ngrams(2, style='ilmiy'), [('eski kitob', 1)])
+
+
+class SearchCountsTest(CorpusTestCase):
+    """Style and facet counts cover every hit, also those past the hit budget."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_article('a.txt', 'Kitob. Yangi kitob. Eski kitob.', style='badiiy', author='A')
+        self.create_article('b.txt', 'Kitob va daftar. Kitob!', style='ilmiy', author='B')
+        self.create_article('c.txt', 'Kitob', style='publitsistik', author='C')
+
+    def test_counts_past_the_budget(self):
+        budget = SearchBudget(max_hits=2)
+        hits, counts, facets = collect_search_hits(generate_search_variants('kitob'), 'word', '', budget=budget)
+        self.assertEqual(len(hits), 2)
+        self.assertTrue(budget.truncated)
+        self.assertEqual(budget.found_at_least, 6)
+        self.assertEqual(dict(counts), {'badiiy': 3, 'ilmiy': 2, 'publitsistik': 1})
+        self.assertEqual(facets['style'], {'badiiy': 1, 'ilmiy': 1, 'publitsistik': 1})
+        self.assertEqual(facets['author'], {'A': 1, 'B': 1, 'C': 1})
+
+    def test_time_budget_stops_the_scan(self):
+        budget = SearchBudget(seconds=60)
+        budget.deadline = time.monotonic() - 1
+        hits, counts, facets = collect_search_hits(generate_search_variants('kitob'), 'word', '', budget=budget)
+        self.assertEqual(hits, [])
+        self.assertTrue(budget.truncated)
+
+    def test_relevance_order_counts_past_the_budget(self):
+        hits, counts, facets = collect_search_hits(
+            generate_search_variants('kitob'), 'word', '', sort='mos', budget=SearchBudget(max_hits=4))
+        self.assertEqual(len(hits), 4)
+        self.assertEqual(dict(counts), {'badiiy': 3, 'ilmiy': 2, 'publitsistik': 1})
+
+    def test_relevance_ranks_documents_past_the_budget(self):
+        # Scanned last (rasmiy comes after the other styles), but the best match
+        best = self.create_article('d.txt', 'Kitob, kitob, kitob va kitob.', style='rasmiy', author='D')
+        budget = SearchBudget(max_hits=2)
+        hits, counts, facets = collect_search_hits(
+            generate_search_variants('kitob'), 'word', '', sort='mos', budget=budget)
+        # Only the best document gets its hits built
+        self.assertEqual([hit['doc_id'] for hit in hits], [best.pk, best.pk])
+        self.assertEqual(budget.found_at_least, 10)
+        self.assertTrue(budget.truncated)
+        self.assertEqual(counts['rasmiy'], 4)
+
+
+class CollapsedHitsTest(CorpusTestCase):
+    """Hits in a passage repeated across articles are listed once but all counted."""
+
+    def setUp(self):
+        super().setUp()
+        passage = 'Ushbu kitob barcha fuqarolar uchun bepul tarqatiladi va sotilmaydi.'
+        self.create_article('a.txt', f'{passage} Boshqa gap.', style='rasmiy', author='A')
+        self.create_article('b.txt', f'Kirish. {passage}', style='publitsistik', author='B')
+
+    def test_collapsed_hits_are_counted(self):
+        budget = SearchBudget()
+        hits, counts, facets = collect_search_hits(generate_search_variants('kitob'), 'word', '', budget=budget)
+        self.assertEqual(len(hits), 1)
+        self.assertEqual([similar['doc_id'] for similar in hits[0]['similar']], [Article.objects.get(title='b.txt').pk])
+        self.assertEqual(dict(counts), {'rasmiy': 1, 'publitsistik': 1})
+        self.assertEqual(facets['author'], {'A': 1, 'B': 1})
+        self.assertEqual(budget.found_at_least, 2)
+
+
+class ExportTest(CorpusTestCase):
+    """The export has one row per hit, repeated passages included."""
+
+    def setUp(self):
+        super().setUp()
+        passage = 'Ushbu kitob barcha fuqarolar uchun bepul tarqatiladi va sotilmaydi.'
+        self.create_article('a.txt', f'{passage} Yangi kitob.', style='rasmiy', author='A')
+        self.create_article('b.txt', f'Kirish. {passage}', style='publitsistik', author='B')
+
+    def export(self, **params):
+        return self.client.get(reverse('export_results'), {'q': 'kitob', 'type': 'word', **params})
+
+    def rows(self, response, delimiter=','):
+        body = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(body), delimiter=delimiter))
+
+    def test_csv_and_tsv(self):
+        for fmt, delimiter in (('csv', ','), ('tsv', '\t')):
+            with self.subTest(fmt=fmt):
+                response = self.export(format=fmt)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(f'korpus_kitob.{fmt}', response['Content-Disposition'])
+                header, *rows = self.rows(response, delimiter)
+                self.assertEqual(header, EXPORT_COLUMNS)
+                self.assertEqual(len(rows), 3)
+                self.assertEqual({row[header.index('match_lat')] for row in rows}, {'kitob'})
+                self.assertEqual({row[header.index('match_cyr')] for row in rows}, {'китоб'})
+                self.assertEqual([row[header.index('author')] for row in rows], ['A', 'A', 'B'])
+
+    @override_settings(SEARCH_EXPENSIVE_SIZE=0, SEARCH_EXPENSIVE_SLOTS=1, SEARCH_SLOT_WAIT=0)
+    def test_expensive_export_frees_its_slot(self):
+        # Written out with the slot held, so a download that has not started holds no slot
+        pending = self.export(format='tsv')
+        response = self.export(format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.rows(response)), 4)
+        self.assertEqual(len(self.rows(pending, '\t')), 4)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export(q='').status_code, 400)
+        self.assertEqual(self.export(format='pdf').status_code, 400)
+
+    def test_xlsx(self):
+        response = self.export(format='xlsx')
+        if openpyxl is None:
+            self.assertEqual(response.status_code, 400)
+        else:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content)[:2], b'PK')
+
+
+class PageCacheTest(CorpusTestCase):
+    """Corpus pages answer revalidation with 304 until the corpus changes."""
+
+    def test_etag_follows_the_generation(self):
+        url = reverse('index')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        self.create_article('a.txt', 'Yangi kitob.')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_params_share_the_page(self):
+        self.assertEqual(self.client.get(reverse('index'), {'x': '1'})['ETag'],
+                         self.client.get(reverse('index'), {'x': '2'})['ETag'])
+
+        def version(url):
+            return page_version(RequestFactory().get(url), params=('q', 'style'))
+
+        self.assertEqual(version('/?q=a&style=ilmiy&x=1'), version('/?x=2&style=ilmiy&q=a'))
+        self.assertNotEqual(version('/?q=a'), version('/?q=b'))
+        self.assertNotEqual(version('/?q=a'), version('/statistika/?q=a'))
+
+
+class QueryLogTest(CorpusTestCase):
+    """Searches reach the log through the writer thread; top_queries reads them back and warms them."""
+
+    def setUp(self):
+        super().setUp()
+        self.log = os.path.join(self.media_root, 'queries.tsv')
+        settings_override = override_settings(QUERY_LOG=self.log)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_log_report_and_warm(self):
+        art = self.create_article('a.txt', 'Yangi kitob. Eski kitob.')
+        for query, search_ty, latency in (('kitob', 'word', 0.012), ('sud', 'suffix', 0.005),
+                                          ('kitob', 'word', 0.020), ('Kitob', 'word', 0.012)):
+            log_query(query, search_ty, '', latency, 2)
+        flush_query_log()
+        with open(self.log, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+        out = io.StringIO()
+        call_command('top_queries', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1:], [
+            f"{3:>7}  {'word':<7} {2:>7} {12:>7} {20:>7}  Kitob",
+            f"{1:>7}  {'suffix':<7} {2:>7} {5:>7} {5:>7}  sud",
+        ])
+
+        out = io.StringIO()
+        call_command('top_queries', '--warm', verbosity=0, stdout=out)
+        self.assertIn('Warmed word "Kitob": 2 matches', out.getvalue())
+        matches = cached_matches(generate_search_variants('kitob'), 'word')
+        self.assertEqual([(start, end) for start, end, *_ in matches[art.pk]], [(6, 11), (18, 23)])
+
+
+class VocabularyTest(SimpleTestCase):
+    """Autocomplete only reads the word list that build_vocabulary wrote."""
+
+    def test_no_vocabulary_file(self):
+        self.assertEqual(suggest('kit'), [])
+        self.assertFalse(os.path.exists(settings.VOCABULARY_PATH))
+
+    def test_cyrillic_words_keep_their_spelling(self):
+        written = written_word_counts(['Цех ишчилари цехда.', 'Sex ishchilari. Цех', 'Объект'])
+        vocabulary = Vocabulary.from_bytes(
+            Vocabulary.from_counter(key_counts(written), cyrillic_forms(written)).to_bytes())
+        # ц and ъ do not survive a Latin round trip: the stored spelling is shown
+        self.assertEqual(vocabulary.top(word_key('це'), cyrillic=True)[0], ('цех', 3))
+        self.assertEqual(vocabulary.top(word_key('об'), cyrillic=True), [('объект', 1)])
+        self.assertEqual(vocabulary.top(word_key('се'))[0], (word_key('цех'), 3))
@@ -0,0 +1,137 @@
+"""
+The corpus as streams of vocabulary ids, one per article.
+
+tokenize() reads every article once and turns each word into the position
+of its key (vocabulary.word_key) in the sorted Vocabulary, giving both the
+vocabulary and the token streams in one pass; the document-term matrix of
+termstats.py is counted from the same streams. TOKEN_STREAM_PATH holds
+
+    b'OZT1' | n (uint32) | vocabulary crc (uint32) | doc_ids: n x uint32
+            | offsets: n+1 x uint32 | token ids: uint32 ...
+
+where document i is tokens[offsets[i]:offsets[i + 1]]. Each worker loads
+it into array('I')s (4 bytes a word) and looks at them through NumPy
+views without copying, so window and n-gram counts for collocations.py
+never read or split a text again.
+"""
+import os
+import struct
+from array import array
+
+import numpy as np
+from django.conf import settings
+
+from .corpus import read_article_text
+from .models import Article
+from .vocabulary import WORD_RE, Vocabulary, cyrillic_forms, get_vocabulary, word_key
+
+MAGIC = b'OZT1'
+
+_STREAMS = None  # (mtime, TokenStreams)
+
+
+class _WordIds(dict):
+    """{word as written (lowercased): provisional id, in order of first appearance}, filling itself in."""
+
+    def __missing__(self, word):
+        pid = self[word] = len(self)
+        return pid
+
+
+class TokenStreams:
+    """Token ids of each document, concatenated, with the documents' Article pks."""
+
+    def __init__(self, doc_ids, offsets, tokens, vocabulary_crc):
+        self.doc_ids = doc_ids
+        self.offsets = offsets
+        self.tokens = tokens
+        self.vocabulary_crc = vocabulary_crc
+        self.vectors = None  # (generation, termstats.document_vectors())
+        self.memo = {}  # per-generation results of collocations.py
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC:
+            raise ValueError('not a token stream file')
+        n, crc = struct.unpack_from('<II', data, 4)
+        doc_ids, offsets, tokens = array('I'), array('I'), array('I')
+        start = 12
+        doc_ids.frombytes(data[start:start + 4 * n])
+        start += 4 * n
+        offsets.frombytes(data[start:start + 4 * (n + 1)])
+        start += 4 * (n + 1)
+        tokens.frombytes(data[start:])
+        return cls(doc_ids, offsets, tokens, crc)
+
+    def to_bytes(self):
+        header = MAGIC + struct.pack('<II', len(self.doc_ids), self.vocabulary_crc)
+        return header + self.doc_ids.tobytes() + self.offsets.tobytes() + self.tokens.tobytes()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def document(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def arrays(self):
+        """(token ids, offsets) as NumPy views of the arrays."""
+        return np.frombuffer(self.tokens, dtype=np.uint32), np.frombuffer(self.offsets, dtype=np.uint32)
+
+
+def tokenize(documents):
+    """(Vocabulary, TokenStreams) of [(article pk, text)]."""
+    ids = _WordIds()
+    doc_ids, offsets, tokens = array('I'), array('I', [0]), array('I')
+    for pk, text in documents:
+        tokens.extend(map(ids.__getitem__, WORD_RE.findall(text.lower())))
+        doc_ids.append(pk)
+        offsets.append(len(tokens))
+
+    # Provisional ids are words as written in order of first appearance:
+    # map them to their keys, then renumber the keys in vocabulary order
+    written = list(ids)
+    written_counts = np.bincount(np.frombuffer(tokens, dtype=np.uint32), minlength=len(written))
+    key_ids = {}
+    key_of = np.fromiter((key_ids.setdefault(word_key(word), len(key_ids)) for word in written),
+                         dtype=np.uint32, count=len(written))
+    keys = list(key_ids)
+    counts = np.bincount(key_of, weights=written_counts, minlength=len(keys)).astype(np.int64)
+    vocabulary = Vocabulary.from_counter(
+        dict(zip(keys, counts.tolist())), cyrillic_forms(dict(zip(written, written_counts.tolist()))))
+    order = sorted(range(len(keys)), key=lambda kid: keys[kid].encode('utf-8'))
+    renumber = np.empty(len(keys), dtype=np.uint32)
+    renumber[order] = np.arange(len(keys), dtype=np.uint32)
+    tokens = array('I', renumber[key_of][np.frombuffer(tokens, dtype=np.uint32)].tobytes())
+    return vocabulary, TokenStreams(doc_ids, offsets, tokens, vocabulary.checksum())
+
+
+def tokenize_articles(articles=None):
+    """(Vocabulary, TokenStreams) of articles (default: all)."""
+    articles = articles if articles is not None else Article.objects.all()
+    return tokenize((art.pk, read_article_text(art)) for art in articles)
+
+
+def save_token_streams(streams, path=None):
+    """Write streams to path (default TOKEN_STREAM_PATH) atomically."""
+    path = path or settings.TOKEN_STREAM_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(streams.to_bytes())
+    os.replace(tmp, path)
+
+
+def get_token_streams():
+    """This worker's TokenStreams (reloaded when the file changes), or None if it is missing or stale."""
+    global _STREAMS
+    path = settings.TOKEN_STREAM_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _STREAMS is None or _STREAMS[0] != mtime:
+        with open(path, 'rb') as f:
+            _STREAMS = (mtime, TokenStreams.from_bytes(f.read()))
+    streams = _STREAMS[1]
+    vocabulary = get_vocabulary()
+    return streams if vocabulary is not None and streams.vocabulary_crc == vocabulary.checksum() else None
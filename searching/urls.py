@@ -1,9 +1,15 @@
 from django.urls import path
-from . import views
+from . import diagnostics, export, shards, views
 
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('qidiruv/', views.search_results, name='search_results'),
+    path('qidiruv/api/', shards.search_api, name='search_api'),
+    path('qidiruv/taklif/', views.autocomplete, name='autocomplete'),
+    path('qidiruv/kollokatsiyalar/', views.collocations_view, name='collocations'),
+    path('qidiruv/kollokatsiyalar/api/', views.collocations_api, name='collocations_api'),
+    path('qidiruv/eksport/', export.export_results, name='export_results'),
     path('statistika/', views.statistics_view, name='statistics'),  # Changed from 'statistics'
-]
\ No newline at end of file
+    path('diagnostika/', diagnostics.diagnostics_view, name='diagnostics'),
+]
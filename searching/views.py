@@ -1,130 +1,48 @@
-import os
+import itertools
 import re
 from collections import Counter
+from datetime import datetime, timezone as dt_timezone
 import chardet
 from django.conf import settings
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
+from django.db.models import Sum
 from django.utils import timezone
 from django.core.paginator import Paginator
 
-from .models import Article
-
-import time
-
-# ——————————————————————————————
-# IN-MEMORY CORPUS CACHE
-# ——————————————————————————————
-_CONTENT_CACHE = {}   # {article_id: (mtime, content)}
-
-def get_cached_content(art, path):
-    """Return file content from memory, re-reading only if the file changed on disk."""
-    try:
-        mtime = os.path.getmtime(path)
-    except OSError:
-        return None
-
-    cached = _CONTENT_CACHE.get(art.id)
-    if cached and cached[0] == mtime:
-        return cached[1]
-
-    content = read_file_content(path)
-    _CONTENT_CACHE[art.id] = (mtime, content)
-    return content
-# ——————————————————————————————
-# CUSTOM UZBEK SCRIPT CONVERTER
-# ——————————————————————————————
-
-# Uzbek Cyrillic to Latin alphabet mapping
-CYRILLIC_TO_LATIN = {
-    'а': 'a', 'А': 'A',
-    'б': 'b', 'Б': 'B',
-    'в': 'v', 'В': 'V',
-    'г': 'g', 'Г': 'G',
-    'д': 'd', 'Д': 'D',
-    'е': 'e', 'Е': 'E',
-    'ё': 'yo', 'Ё': 'Yo',
-    'ж': 'j', 'Ж': 'J',
-    'з': 'z', 'З': 'Z',
-    'и': 'i', 'И': 'I',
-    'й': 'y', 'Й': 'Y',
-    'к': 'k', 'К': 'K',
-    'л': 'l', 'Л': 'L',
-    'м': 'm', 'М': 'M',
-    'н': 'n', 'Н': 'N',
-    'о': 'o', 'О': 'O',
-    'п': 'p', 'П': 'P',
-    'р': 'r', 'Р': 'R',
-    'с': 's', 'С': 'S',
-    'т': 't', 'Т': 'T',
-    'у': 'u', 'У': 'U',
-    'ф': 'f', 'Ф': 'F',
-    'х': 'x', 'Х': 'X',
-    'ц': 's', 'Ц': 'S',
-    'ч': 'ch', 'Ч': 'Ch',
-    'ш': 'sh', 'Ш': 'Sh',
-    'щ': 'sh', 'Щ': 'Sh',
-    'ъ': "'", 'Ъ': "'",
-    'ы': 'i', 'Ы': 'I',
-    'ь': "'", 'Ь': "'",
-    'э': 'e', 'Э': 'E',
-    'ю': 'yu', 'Ю': 'Yu',
-    'я': 'ya', 'Я': 'Ya',
-    'ў': "o'", 'Ў': "O'",
-    'ғ': "g'", 'Ғ': "G'",
-    'қ': 'q', 'Қ': 'Q',
-    'ҳ': 'h', 'Ҳ': 'H'
-}
-
-# Create reverse mapping (Latin to Cyrillic)
-LATIN_TO_CYRILLIC = {}
-for cyr, lat in CYRILLIC_TO_LATIN.items():
-    if lat not in LATIN_TO_CYRILLIC:
-        LATIN_TO_CYRILLIC[lat] = []
-    LATIN_TO_CYRILLIC[lat].append(cyr)
-
-
-def cyrillic_to_latin_converter(text):
-    """Convert Uzbek Cyrillic text to Latin using custom mapping"""
-    if not text:
-        return text
-
-    result = ''
-    for char in text:
-        result += CYRILLIC_TO_LATIN.get(char, char)
-    return result
-
-
-def latin_to_cyrillic_converter(text):
-    """Convert Uzbek Latin text to Cyrillic using custom mapping"""
-    if not text:
-        return text
-
-    result = text
-    # Sort by length (longest first) to handle multi-character mappings correctly
-    sorted_latin_keys = sorted(LATIN_TO_CYRILLIC.keys(), key=len, reverse=True)
-
-    for latin_char in sorted_latin_keys:
-        cyrillic_options = LATIN_TO_CYRILLIC[latin_char]
-        if cyrillic_options:
-            # Use lowercase version by default, but preserve case
-            cyrillic_char = next((c for c in cyrillic_options if c.islower()), cyrillic_options[0])
-
-            # Create regex pattern, escaping special characters
-            pattern = re.escape(latin_char)
-            regex = re.compile(pattern, re.IGNORECASE)
-
-            def replace_func(match):
-                matched = match.group(0)
-                if matched.isupper():
-                    return cyrillic_char.upper() if cyrillic_char.islower() else cyrillic_char
-                elif matched.istitle():
-                    return cyrillic_char.capitalize() if cyrillic_char.islower() else cyrillic_char
-                else:
-                    return cyrillic_char.lower() if cyrillic_char.isupper() else cyrillic_char
-
-            result = regex.sub(replace_func, result)
-
-    return result
+from .backends import get_search_backend
+from .converters import (
+    cyrillic_to_latin_converter,
+    detect_script_type,
+    generate_search_variants,
+    latin_to_cyrillic_converter,
+)
+from .corpus import get_article_text, read_article_text
+from .highlight import highlighter
+from .models import Article, ArticleIndex
+from .budget import default_budget, estimate_search_cost, search_slot
+from .collocations import (
+    DEFAULT_MIN_COUNT,
+    DEFAULT_WINDOW,
+    MAX_RESULTS,
+    MAX_WINDOW,
+    MEASURES,
+    NGRAM_SIZES,
+    collocates,
+    ngrams,
+)
+from .facets import facet_counts, facet_panel
+from .generation import GenerationCache, generation_time
+from .hitcache import cached_matches
+from .pagecache import corpus_page
+from .passages import repeated_passages
+from .querylog import log_query
+from .ranking import rank_hits, score_documents, top_documents
+from .scriptmap import load_script_map
+from .segments import load_segments
+from .shards import gather_search_hits, shard_articles
+from .termstats import word_stats
+from .vocabulary import MAX_SUGGESTIONS, suggest
 
 
 def get_style_priority(style_key):
@@ -243,47 +161,6 @@ def group_results_by_style(results):
 
 
 
-def detect_script_type(text):
-    """Detect if text is primarily Cyrillic, Latin, or mixed"""
-    if not text:
-        return 'unknown'
-
-    cyrillic_count = len(re.findall(r'[а-яёўғқҳ]', text, re.IGNORECASE))
-    latin_count = len(re.findall(r'[a-z\']', text, re.IGNORECASE))
-
-    total = cyrillic_count + latin_count
-    if total == 0:
-        return 'unknown'
-
-    cyrillic_ratio = cyrillic_count / total
-
-    if cyrillic_ratio > 0.7:
-        return 'cyrillic'
-    elif cyrillic_ratio < 0.3:
-        return 'latin'
-    else:
-        return 'mixed'
-
-
-def generate_search_variants(search_term):
-    """Generate both Cyrillic and Latin variants of search term"""
-    if not search_term:
-        return [search_term]
-
-    variants = [search_term]
-    script_type = detect_script_type(search_term)
-
-    if script_type in ['cyrillic', 'mixed']:
-        latin_variant = cyrillic_to_latin_converter(search_term)
-        if latin_variant != search_term:
-            variants.append(latin_variant)
-
-    if script_type in ['latin', 'mixed']:
-        cyrillic_variant = latin_to_cyrillic_converter(search_term)
-        if cyrillic_variant != search_term:
-            variants.append(cyrillic_variant)
-
-    return list(set(variants))  # Remove duplicates
 
 
 # ——————————————————————————————
@@ -296,6 +173,9 @@ STYLES = {
     'rasmiy': 'Rasmiy uslub',
 }
 
+# Order of the style summary cards on the results page (others come last)
+STYLE_CARD_ORDER = ['badiiy', 'rasmiy', 'publitsistik', 'ilmiy']
+
 common_suffixes = {
     'di', 'gan', 'yap', 'moq', 'adi', 'ing', 'ar', 'ib', 'mi', 'chi', 'lik', 'lar',
     'da', 'dan', 'ga', 'ni', 'ning', 'si', 'siz', 'cha', 'dagi', 'man', 'san',
@@ -313,191 +193,462 @@ def detect_encoding(file_path):
     return result['encoding']
 
 
-def search_results(request):
-    """Enhanced search with cross-script support, pagination, and proper template integration"""
-    # Start timer for search performance measurement
-    start_time = timezone.now()
+CONTEXT = 50  # Characters to show around matches
+RESULTS_PER_PAGE = 20
 
-    # Get and clean search parameters
-    raw_q = request.GET.get('q', '').strip()
-    search_ty = request.GET.get('type', 'word')
-    style_filt = request.GET.get('style', '')
 
-    # Initialize empty results if no query
+def hit_sort_key(hit):
+    """Results-page order: style priority, author, title, then position."""
+    return (
+        get_style_priority(hit['style_key']),  # PRIMARY: Style priority
+        hit['author'] or '',  # Secondary: Author
+        hit['title'] or '',  # Tertiary: Title
+        hit.get('match_position', 0)  # Final: Position
+    )
+
+
+def relevance_sort_key(hit):
+    """Relevance order: BM25 score (see ranking.py), then results-page order per document."""
+    return (-hit['score'], *hit_sort_key(hit)[:3], hit['doc_id'], hit.get('match_position', 0))
+
+
+# ?sort= value -> (label, hit sort key)
+SORT_OPTIONS = {
+    'uslub': ('Uslub va muallif', hit_sort_key),
+    'mos': ('Moslik', relevance_sort_key),
+}
+DEFAULT_SORT = 'uslub'
+
+
+def parse_sort(params):
+    sort = params.get('sort', DEFAULT_SORT)
+    return sort if sort in SORT_OPTIONS else DEFAULT_SORT
+
+
+# Excerpt context choices: ?context= value -> (label, segment unit, extra segments).
+# 'belgi' is the plain ±CONTEXT characters; the others use the segment index.
+CONTEXT_MODES = {
+    'belgi': (f'{CONTEXT} belgi', None, 0),
+    'gap': ('Gap', 'sentence', 0),
+    'gap1': ('±1 gap', 'sentence', 1),
+    'gap2': ('±2 gap', 'sentence', 2),
+    'xatboshi': ('Xatboshi', 'paragraph', 0),
+}
+DEFAULT_CONTEXT_MODE = 'belgi'
+
+
+def parse_context_mode(params):
+    mode = params.get('context', DEFAULT_CONTEXT_MODE)
+    return mode if mode in CONTEXT_MODES else DEFAULT_CONTEXT_MODE
+
+
+def search_query_string(params, drop=('page', 'format')):
+    """The search parameters of params, urlencoded without the `drop` keys (for links)."""
+    params = params.copy()
+    for key in drop:
+        params.pop(key, None)
+    return params.urlencode()
+
+
+def parse_filters(params):
+    """
+    Metadata filters from request.GET: genre, year_from, year_to, author.
+    Missing or invalid values are left out.
+    """
+    filters = {}
+    genre = params.get('genre', '')
+    if genre in dict(Article.GENRE_CHOICES):
+        filters['genre'] = genre
+    for key in ('year_from', 'year_to'):
+        try:
+            filters[key] = int(params.get(key, ''))
+        except ValueError:
+            pass
+    author = params.get('author', '').strip()
+    if author:
+        filters['author'] = author
+    return filters
+
+
+def article_passes(art, style_filt, filters=None):
+    """Whether an article passes the style and metadata filters; authors compare as shown (_clean_meta)."""
+    filters = filters or {}
+    if style_filt in STYLES and art.style != style_filt:
+        return False
+    if 'genre' in filters and art.genre != filters['genre']:
+        return False
+    if 'year_from' in filters and (art.pub_year is None or art.pub_year < filters['year_from']):
+        return False
+    if 'year_to' in filters and (art.pub_year is None or art.pub_year > filters['year_to']):
+        return False
+    if 'author' in filters and _clean_meta(art.author) != _clean_meta(filters['author']):
+        return False
+    return True
+
+
+def parse_search_query(params):
+    """
+    Read q/type/style from request.GET (or any dict) the way the search page does.
+
+    Returns (query, search_type, style_filter, search_variants); the query has
+    its apostrophes normalized and search_variants is empty when there is no query.
+    """
+    raw_q = params.get('q', '').strip()
+    search_ty = params.get('type', 'word')
+    style_filt = params.get('style', '')
+
     if not raw_q:
-        return render(request, 'results.html', {
-            'query': raw_q,
-            'search_type': search_ty,
-            'style_filter': style_filt,
-            'found': 0,
-            'page_obj': None,
-            'frequency_data': [],
-            'search_time': 0,
-            'style_name': '',
-        })
+        return raw_q, search_ty, style_filt, []
 
     # Normalize apostrophes in query
     raw_q = _normalize_apostrophes(raw_q)
 
     # Generate all script variants of the search query
-    search_variants = generate_search_variants(raw_q)
+    return raw_q, search_ty, style_filt, generate_search_variants(raw_q)
 
-    # Apply style filter if specified
-    qs = Article.objects.all()
-    if style_filt in STYLES:
-        qs = qs.filter(style=style_filt)
 
-    hits = []
-    CONTEXT = 50  # Characters to show around matches
+def _clean_meta(value):
+    return value.lstrip('—– -').strip() if value else ''
 
-    # Search through all filtered articles
-    for art in qs:
-        path = os.path.join(settings.MEDIA_ROOT, art.file.name)
-        if not os.path.exists(path):
-            continue
 
-        try:
-            # Read file content with proper encoding
-            original_content = get_cached_content(art, path)
-            if not original_content or not original_content.strip():
-                continue
+def excerpt_converters(scripts):
+    """
+    (to_latin, to_cyrillic) converters for an excerpt written in `scripts`;
+    None means that version is the original text.
+    """
+    to_latin = cyrillic_to_latin_converter if scripts & {'cyrillic', 'mixed'} else None
+    to_cyrillic = latin_to_cyrillic_converter if scripts & {'latin', 'mixed'} else None
+    return to_latin, to_cyrillic
 
-            # Determine original script of the file
-            original_script = detect_script_type(original_content)
 
-            # Clean metadata
-            author_clean = art.author.lstrip('—– -').strip() if art.author else ''
-            title_clean = art.title.lstrip('—– -').strip() if art.title else ''
+def _load_search_articles():
+    return sorted(shard_articles(Article.objects.all()), key=lambda art: (
+        get_style_priority(art.style), _clean_meta(art.author), _clean_meta(art.title)
+    ))
 
-            # Track unique matches to avoid duplicates
-            matches_found = set()
 
-            for variant in search_variants:
-                if not variant.strip():
-                    continue
+# This node's articles in results-page order, fetched once per corpus generation
+_SEARCH_ARTICLES = GenerationCache(_load_search_articles)
+
+
+def search_articles(style_filt, filters=None):
+    """This node's articles passing the filters, in results-page order."""
+    # Style and metadata filters are applied before any content is read
+    return [art for art in _SEARCH_ARTICLES.get() if article_passes(art, style_filt, filters)]
+
+
+class HitCounts:
+    """
+    Hits of a search per style and per document (an article's term
+    frequency, in results-page order), counted by iter_search_hits() also
+    past the hit budget, where no hit is built.
+    """
+
+    def __init__(self):
+        self.styles = Counter()
+        self.documents = Counter()  # {article: hits}
+
+    def add(self, art, hits=1):
+        self.styles[art.style] += hits
+        self.documents[art] += hits
+
+    @property
+    def doc_ids(self):
+        return {art.pk for art in self.documents}
+
+    @property
+    def total(self):
+        return sum(self.styles.values())
 
-                # Create appropriate search pattern
-                if search_ty == 'word':
-                    # Modified pattern to match word and its suffixes
-                    pattern = rf'\b{re.escape(variant)}([^\W\d_]{{0,6}})?\b'  # Matches word + up to 6 letter suffix
-                else:  # suffix search
-                    pattern = rf'{re.escape(variant)}\b'
-
-                try:
-                    regex = re.compile(pattern, re.IGNORECASE)
-                    # Search in original content
-                    for match in regex.finditer(original_content):
-                        start, end = match.span()
-                        matched_word = match.group(0)
-
-                        # Create unique match identifier
-                        match_id = f"{start}_{end}_{matched_word.lower()}"
-
-                        # Skip duplicates or near-duplicates
-                        if match_id in matches_found:
-                            continue
-                        matches_found.add(match_id)
 
-                        # Extract context around match
-                        context_start = max(0, start - CONTEXT)
-                        context_end = min(len(original_content), end + CONTEXT)
-                        context = original_content[context_start:context_end].strip()
+def _distinct_matches(matches):
+    """Matches by position, the longest first where several start at one place, overlaps left out."""
+    last_end = -1
+    for match in sorted(matches, key=lambda m: (m[0], -m[1])):
+        if match[0] >= last_end:
+            last_end = match[1]
+            yield match
 
-                        if not context:
+
+def iter_search_hits(search_variants, search_ty, style_filt, context=CONTEXT,
+                     context_mode=DEFAULT_CONTEXT_MODE, filters=None, budget=None, collapse=True,
+                     counts=None, articles=None, excerpts=True, parts=False):
+    """
+    Yield (article, content, hit) for every hit, one article at a time.
+
+    Articles come in results-page order (style priority, author, title) and
+    hits within an article by position, so callers can stream them without
+    collecting and sorting the whole hit list. context_mode picks the excerpt
+    window (see CONTEXT_MODES); articles without a segment index get ±context.
+    filters are the metadata filters from parse_filters(). With a SearchBudget,
+    hits stop after budget.max_hits (the rest are only counted, in budget and
+    in counts, a HitCounts) and scanning stops when its time is up.
+
+    Overlapping matches (several variants or forms at one place) are one hit.
+    With collapse, a hit in a passage repeated across articles (see
+    passages.py) that an earlier hit already shows is only listed in that
+    hit's 'similar' (doc_id, author, title, match_position), without an
+    excerpt; it is still counted in counts and budget.found_at_least.
+
+    articles, if given, are searched instead of search_articles(), in their
+    order. Without excerpts nothing is yielded: the hits are only counted in
+    counts (the time budget still applies, the hit budget does not). With
+    parts, hits also carry the plain (left, match, right) text their
+    excerpts are built from, as 'parts_lat' and 'parts_cyr'.
+    """
+    _, unit, extra = CONTEXT_MODES[context_mode]
+    if articles is None:
+        articles = search_articles(style_filt, filters)
+    passages = repeated_passages() if collapse else {}
+    clusters = {}  # (passage hash, n-th hit in that sentence) -> first hit
+
+    # Search through all filtered articles, unless the matches were precomputed
+    stored = cached_matches(search_variants, search_ty)
+    if stored is not None:
+        found = (
+            (art, get_article_text(art), stored[art.pk])
+            for art in articles if art.pk in stored
+        )
+    else:
+        found = get_search_backend().search(articles, search_variants, search_ty, budget)
+
+    for art, original_content, matches in found:
+        if not excerpts:
+            if counts is not None:
+                counts.add(art, sum(1 for _ in _distinct_matches(matches)))
+            continue
+        try:
+            # Script runs stored at ingest; fall back to one label for the whole file
+            script_map = load_script_map(art)
+            if script_map is None:
+                original_script = art.script or detect_script_type(original_content)
+            segments = load_segments(art) if unit else None
+
+            # Clean metadata
+            author_clean = _clean_meta(art.author)
+            title_clean = _clean_meta(art.title)
+
+            repeated = passages.get(art.pk)
+            passage_hits = Counter()
+
+            for start, end, matched_word, variant in _distinct_matches(matches):
+                # Every occurrence counts; repeats are only collapsed for display
+                if counts is not None:
+                    counts.add(art)
+
+                cluster = None
+                if repeated is not None:
+                    passage = repeated.passage_at(start)
+                    if passage is not None:
+                        cluster = (passage, passage_hits[passage])
+                        passage_hits[passage] += 1
+                        if cluster in clusters:
+                            clusters[cluster]['similar'].append({
+                                'doc_id': art.id,
+                                'author': author_clean,
+                                'title': title_clean,
+                                'match_position': start,
+                            })
+                            if budget is not None:
+                                budget.found_at_least += 1
                             continue
 
-                        # Calculate match position within context
-                        match_start_in_context = start - context_start
-                        match_end_in_context = end - context_start
-
-                        # Create highlighted excerpts
-                        excerpt_original = (
-                                context[:match_start_in_context] +
-                                f'<span class="highlight">{context[match_start_in_context:match_end_in_context]}</span>' +
-                                context[match_end_in_context:]
-                        )
-
-                        # Generate alternate script version
-                        if original_script == 'cyrillic':
-                            excerpt_lat = cyrillic_to_latin_converter(excerpt_original)
-                            excerpt_cyr = excerpt_original
-                        elif original_script == 'latin':
-                            excerpt_cyr = latin_to_cyrillic_converter(excerpt_original)
-                            excerpt_lat = excerpt_original
-                        else:
-                            excerpt_lat = excerpt_cyr = excerpt_original
-
-                        # Add hit to results
-                        hits.append({
-                            'author': author_clean,
-                            'title': title_clean,
-                            'style_key': art.style,
-                            'style_name': STYLES.get(art.style, art.style),
-                            'excerpt_lat': excerpt_lat.strip(),
-                            'excerpt_cyr': excerpt_cyr.strip(),
-                            'original_script': original_script,
-                            'match_position': start,
-                            'search_variant': variant,
-                            'matched_word': matched_word,
-                            'doc_id': art.id,
-                        })
-
-                except re.error as e:
-                    print(f"Regex error with variant '{variant}': {e}")
-                    continue
-                except Exception as e:
-                    print(f"Error searching with variant '{variant}': {e}")
+                if budget is not None and budget.full:
+                    # Past the hit budget only count: a lower bound, as scanning may stop early
+                    budget.truncated = True
+                    budget.found_at_least += 1
+                    if cluster is not None:
+                        clusters[cluster] = {'similar': []}
                     continue
 
+                if segments is not None:
+                    window = segments.window(unit, start, end, extra)
+                else:
+                    window = (max(0, start - context), end + context)
+                # The last segment has no stored end: stop at the end of the text
+                window = (window[0], min(window[1], len(original_content)))
+
+                if script_map is not None:
+                    scripts = script_map.scripts_between(*window)
+                    original_script = script_map.script_at(start)
+                else:
+                    scripts = {original_script}
+
+                # Cut the excerpt at the match offsets, converting to the other script if needed
+                to_latin, to_cyrillic = excerpt_converters(scripts)
+                parts_lat = highlighter.split(original_content, start, end, convert=to_latin, window=window)
+                if to_latin is None and to_cyrillic is None:
+                    parts_cyr = parts_lat
+                else:
+                    parts_cyr = highlighter.split(original_content, start, end, convert=to_cyrillic, window=window)
+
+                if budget is not None:
+                    budget.hits += 1
+                    budget.found_at_least += 1
+
+                hit = {
+                    'author': author_clean,
+                    'title': title_clean,
+                    'style_key': art.style,
+                    'style_name': STYLES.get(art.style, art.style),
+                    'excerpt_lat': highlighter.html(*parts_lat),
+                    'excerpt_cyr': highlighter.html(*parts_cyr),
+                    'original_script': original_script,
+                    'excerpt_scripts': sorted(scripts),
+                    'context_window': window,
+                    'match_position': start,
+                    'search_variant': variant,
+                    'matched_word': matched_word,
+                    'doc_id': art.id,
+                    'similar': [],
+                }
+                if parts:
+                    hit['parts_lat'], hit['parts_cyr'] = parts_lat, parts_cyr
+                if cluster is not None:
+                    clusters[cluster] = hit
+                yield art, original_content, hit
+
         except Exception as e:
             print(f"Error processing article {art.id}: {e}")
             continue
 
-    # Remove near-duplicate hits
-    unique_hits = []
-    seen_contexts = set()
 
-    for hit in hits:
-        content_signature = (
-            hit['author'],
-            hit['title'],
-            hit['excerpt_lat'][:100],  # First 100 chars for comparison
-            hit.get('match_position', 0) // 20  # Group nearby positions
-        )
+def collect_search_hits(search_variants, search_ty, style_filt, context_mode=DEFAULT_CONTEXT_MODE,
+                        filters=None, sort=DEFAULT_SORT, budget=None):
+    """
+    All hits of a search in `sort` order, ready for Paginator.
+    Returns (hits, style_counts, facet_counts); the counts include the hits
+    past the budget.
+    """
+    counts = HitCounts()
+    if sort == 'mos':
+        return rank_search_hits(search_variants, search_ty, style_filt, context_mode, filters, budget)
 
-        if content_signature not in seen_contexts:
-            seen_contexts.add(content_signature)
-            unique_hits.append(hit)
+    found_hits = iter_search_hits(
+        search_variants, search_ty, style_filt, context_mode=context_mode, filters=filters, budget=budget,
+        counts=counts)
+    hits = [hit for art, content, hit in found_hits]
 
-    hits = unique_hits
+    # Sort results by style, author, title, then position
+    hits.sort(key=hit_sort_key)
+    return hits, counts.styles, facet_counts(counts.doc_ids)
 
-    # Sort results by author, title, then position
-    hits.sort(key=lambda x: (
 
-        get_style_priority(x['style_key']),  # PRIMARY: Style priority
-        x['author'] or '',  # Secondary: Author
-        x['title'] or '',  # Tertiary: Title
-        x.get('match_position', 0)  # Final: Position
-    ))
+def rank_search_hits(search_variants, search_ty, style_filt, context_mode=DEFAULT_CONTEXT_MODE,
+                     filters=None, budget=None):
+    """
+    collect_search_hits() for sort='mos': every matching document is counted
+    first (no excerpts), all of them are scored by BM25, and hits are built
+    only for the best documents, best first, as many as hold budget.max_hits
+    hits.
+    """
+    counts = HitCounts()
+    for _ in iter_search_hits(search_variants, search_ty, style_filt, filters=filters, budget=budget,
+                              counts=counts, excerpts=False):
+        pass
+    scores = score_documents(counts.documents)
+    best = top_documents(scores, counts.documents, budget.max_hits if budget is not None else None)
+
+    hits = iter_search_hits(
+        search_variants, search_ty, style_filt, context_mode=context_mode, filters=filters, budget=budget,
+        articles=best)
+    doc_hits = [
+        (art, [hit for _, _, hit in group])
+        for art, group in itertools.groupby(hits, key=lambda found: found[0])
+    ]
+    if budget is not None:
+        # Every hit was counted in the first pass, built or not
+        budget.found_at_least = counts.total
+        budget.truncated = budget.truncated or len(best) < len(counts.documents)
+    return rank_hits(doc_hits, scores), counts.styles, facet_counts(counts.doc_ids)
+
+
+def search_results(request):
+    """Enhanced search with cross-script support, pagination, and proper template integration"""
+    from .export import export_formats
 
-    # Calculate style frequency data for chart
-    counts = Counter(h['style_key'] for h in hits)
+    # Start timer for search performance measurement
+    start_time = timezone.now()
+
+    # Get and clean search parameters
+    raw_q, search_ty, style_filt, search_variants = parse_search_query(request.GET)
+    context_mode = parse_context_mode(request.GET)
+    sort = parse_sort(request.GET)
+    filters = parse_filters(request.GET)
+
+    # Initialize empty results if no query
+    if not raw_q:
+        return render(request, 'results.html', {
+            'query': raw_q,
+            'search_type': search_ty,
+            'style_filter': style_filt,
+            'found': 0,
+            'page_obj': None,
+            'frequency_data': [],
+            'search_time': 0,
+            'style_name': '',
+        })
+
+    page_number = request.GET.get('page')
+    failed_shards = []
+
+    if settings.SEARCH_SHARDS:
+        # Coordinator: only the hits up to the requested page are fetched
+        try:
+            limit = max(int(page_number), 1) * RESULTS_PER_PAGE
+        except (TypeError, ValueError):
+            limit = RESULTS_PER_PAGE
+        hits, counts, facets, failed_shards = gather_search_hits(
+            raw_q, search_ty, style_filt, limit, context_mode=context_mode, sort=sort, filters=filters)
+        truncated, found_at_least = hits.truncated, hits.found_at_least
+    else:
+        cost = estimate_search_cost(search_articles(style_filt, filters), search_variants, search_ty)
+        with search_slot(cost.expensive) as has_slot:
+            if not has_slot:
+                return render(request, 'results.html', {
+                    'query': raw_q,
+                    'search_type': search_ty,
+                    'style_filter': style_filt,
+                    'found': 0,
+                    'page_obj': None,
+                    'frequency_data': [],
+                    'style_name': STYLES.get(style_filt, ''),
+                    'busy': True,
+                }, status=503)
+            budget = default_budget()
+            hits, counts, facets = collect_search_hits(
+                search_variants, search_ty, style_filt, context_mode, filters, sort, budget)
+        truncated, found_at_least = budget.truncated, budget.found_at_least
+
+    # Corpus-wide frequency of a word (None without a term matrix)
+    term_stats = word_stats(raw_q) if search_ty == 'word' else None
+
+    # Calculate style frequency data for chart (counts include hits past the budget)
+    total = sum(counts.values())
     frequency_data = [
         {
+            'key': k,
+            'css': f'style-{k}' if k in STYLE_CARD_ORDER else 'style-default',
             'style': STYLES[k],
             'count': counts.get(k, 0),
-            'percentage': (counts.get(k, 0) / len(hits) * 100) if hits else 0
+            'percentage': counts.get(k, 0) / total * 100 if total else 0,
+            'per_million': term_stats['by_style'].get(k) if term_stats else None,
         }
         for k in STYLES
     ]
+    # Summary cards of the styles with hits, in card order
+    style_cards = sorted(
+        (item for item in frequency_data if item['count']),
+        key=lambda item: STYLE_CARD_ORDER.index(item['key']) if item['key'] in STYLE_CARD_ORDER else len(STYLE_CARD_ORDER),
+    )
 
     # Paginate results
-    paginator = Paginator(hits, 20)  # 20 results per page
-    page_number = request.GET.get('page')
+    paginator = Paginator(hits, RESULTS_PER_PAGE)
     page_obj = paginator.get_page(page_number)
 
     # Calculate search time
     search_time = (timezone.now() - start_time).total_seconds()
+    log_query(raw_q, search_ty, style_filt, search_time, found_at_least)
 
     # Prepare final context
     context = {
@@ -506,42 +657,37 @@ def search_results(request):
         'style_filter': style_filt,
         'style_name': STYLES.get(style_filt, ''),
         'found': len(hits),
+        'occurrences': total,
         'page_obj': page_obj,
         'frequency_data': frequency_data,
+        'style_cards': style_cards,
+        'term_stats': term_stats,
         'search_time': search_time,
         'search_variants': search_variants,
+        'failed_shards': failed_shards,
+        'truncated': truncated,
+        'found_at_least': found_at_least,
+        'facets': facet_panel(facets, request.GET),
+        'filters': filters,
+        'genre_name': dict(Article.GENRE_CHOICES).get(filters.get('genre'), ''),
+        'context_mode': context_mode,
+        'sort': sort,
+        'sort_options': [(key, label) for key, (label, sort_key) in SORT_OPTIONS.items()],
+        'sort_query_string': search_query_string(request.GET, drop=('page', 'format', 'sort')),
+        'unfiltered_query_string': search_query_string(
+            request.GET, drop=('page', 'format', 'style', 'genre', 'year_from', 'year_to', 'author')),
+        'context_modes': [(key, label) for key, (label, unit, extra) in CONTEXT_MODES.items()],
+        'query_string': search_query_string(request.GET),
+        'export_formats': export_formats(),
+        'context_query_string': search_query_string(request.GET, drop=('page', 'format', 'context')),
     }
 
-    return render(request, 'results.html', context)# ——————————————————————————————
-# HELPER FUNCTIONS
-# ——————————————————————————————
+    return render(request, 'results.html', context)
 
 
-def read_file_content(file_path):
-    """Read file content with proper encoding detection"""
-    try:
-        # Try UTF-8 first
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
-    except UnicodeDecodeError:
-        try:
-            # Try cp1251 (common for Cyrillic)
-            with open(file_path, 'r', encoding='cp1251') as f:
-                content = f.read()
-            return content
-        except UnicodeDecodeError:
-            try:
-                # Try latin-1 as last resort
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    content = f.read()
-                return content
-            except Exception as e:
-                print(f"Could not read file {file_path}: {e}")
-                return ""
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
-        return ""
+# ——————————————————————————————
+# HELPER FUNCTIONS
+# ——————————————————————————————
 
 
 def is_cyrillic_text(text):
@@ -560,27 +706,110 @@ def _normalize_apostrophes(text):
 # ——————————————————————————————
 # INDEX VIEW
 # ——————————————————————————————
+@corpus_page
 def index(request):
     total_words = 0
     for art in Article.objects.all():
-        fp = os.path.join(settings.MEDIA_ROOT, art.file.name)
-        if not os.path.exists(fp):
-            continue
-        content = read_file_content(fp)
+        content = read_article_text(art)
         total_words += len(re.findall(r'\w+', content, re.UNICODE))
 
     context = {
         'total_word_count': total_words,
         'doc_count': Article.objects.count(),
-        'last_updated': timezone.now(),
+        'last_updated': datetime.fromtimestamp(generation_time(), tz=dt_timezone.utc),
         'styles': STYLES,
+        'context_modes': [(key, label) for key, (label, unit, extra) in CONTEXT_MODES.items()],
+        'genres': Article.GENRE_CHOICES,
     }
     return render(request, 'index.html', context)
 
 
+# ——————————————————————————————
+# AUTOCOMPLETE
+# ——————————————————————————————
+def autocomplete(request):
+    """Most frequent corpus words starting with ?q=, in the script it was typed in."""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), MAX_SUGGESTIONS))
+    except ValueError:
+        return HttpResponseBadRequest('limit must be a number')
+    suggestions = suggest(_normalize_apostrophes(request.GET.get('q', '')), limit)
+    return JsonResponse({
+        'query': request.GET.get('q', ''),
+        'suggestions': [{'word': word, 'count': count} for word, count in suggestions],
+    })
+
+
+# ——————————————————————————————
+# COLLOCATIONS
+# ——————————————————————————————
+def parse_collocation_query(params):
+    """
+    Read q/window/style/measure/min/limit from request.GET, numbers clamped
+    to their ranges; raises ValueError for a number that is not one.
+    """
+    style = params.get('style', '')
+    measure = params.get('measure', 'll')
+    return {
+        'query': _normalize_apostrophes(params.get('q', '').strip()),
+        'window': max(1, min(int(params.get('window', DEFAULT_WINDOW)), MAX_WINDOW)),
+        'style': style if style in STYLES else '',
+        'measure': measure if measure in MEASURES else 'll',
+        'min_count': max(1, int(params.get('min', DEFAULT_MIN_COUNT))),
+        'limit': max(1, min(int(params.get('limit', 50)), MAX_RESULTS)),
+    }
+
+
+def collocation_data(options):
+    """Collocates and n-grams for parsed collocation options (None where there are no token streams)."""
+    return {
+        'collocates': collocates(
+            options['query'], options['window'], options['style'], options['measure'],
+            options['min_count'], options['limit'],
+        ) if options['query'] else None,
+        'ngrams': {n: ngrams(n, options['style'], options['query'], options['limit']) for n in NGRAM_SIZES},
+    }
+
+
+def collocations_view(request):
+    """Collocates of ?q= (MI, t-score, log-likelihood) and its bigrams/trigrams, or a style's without ?q=."""
+    try:
+        options = parse_collocation_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('window, min and limit must be numbers')
+    data = collocation_data(options)
+    return render(request, 'collocations.html', {
+        **options,
+        'collocates': data['collocates'],
+        'bigrams': data['ngrams'][2],
+        'trigrams': data['ngrams'][3],
+        'styles': STYLES,
+        'measures': MEASURES,
+        'windows': range(1, MAX_WINDOW + 1),
+    })
+
+
+def collocations_api(request):
+    """The collocations page as JSON."""
+    try:
+        options = parse_collocation_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('window, min and limit must be numbers')
+    data = collocation_data(options)
+    return JsonResponse({
+        **options,
+        'collocates': data['collocates'],
+        'ngrams': {
+            str(n): None if grams is None else [{'words': words, 'count': count} for words, count in grams]
+            for n, grams in data['ngrams'].items()
+        },
+    })
+
+
 # ——————————————————————————————
 # STATISTICS VIEW
 # ——————————————————————————————
+@corpus_page
 def statistics_view(request):
     # Get counts per style (preserved existing functionality)
     counts = {k: Article.objects.filter(style=k).count() for k in STYLES}
@@ -591,16 +820,16 @@ def statistics_view(request):
         word_count = 0
         articles = Article.objects.filter(style=style)
         for article in articles:
-            file_path = os.path.join(settings.MEDIA_ROOT, article.file.name)
-            if os.path.exists(file_path):
-                content = read_file_content(file_path)
-                word_count += len(re.findall(r'\w+', content, re.UNICODE))
+            content = read_article_text(article)
+            word_count += len(re.findall(r'\w+', content, re.UNICODE))
         style_word_counts[style] = word_count
 
     # Calculate totals (NEW)
     total_words = sum(style_word_counts.values())
     total_texts = Article.objects.count()
     total_authors = Article.objects.values('author').distinct().count()
+    # Sentence counts come from the segment index built at ingest
+    total_sentences = ArticleIndex.objects.aggregate(n=Sum('sentence_count'))['n'] or 0
 
     # Preserved existing lists
     nasriy_list = Article.objects.filter(genre='nasriy').order_by('author')
@@ -620,6 +849,7 @@ def statistics_view(request):
         'total_words': total_words,
         'total_texts': total_texts,
         'total_authors': total_authors,
+        'total_sentences': total_sentences,
         'badiiy_count': counts.get('badiiy', 0),
         'badiiy_words': style_word_counts.get('badiiy', 0),  # Fixed typo here
         'publitsistik_count': counts.get('publitsistik', 0),
@@ -629,28 +859,3 @@ def statistics_view(request):
         'rasmiy_count': counts.get('rasmiy', 0),
         'rasmiy_words': style_word_counts.get('rasmiy', 0),
     })
-# ——————————————————————————————
-# MANAGEMENT COMMAND FOR SCRIPT ANALYSIS
-# ——————————————————————————————
-def analyze_corpus_scripts():
-    """
-    Analyze the corpus to see script distribution
-    Can be run as a management command
-    """
-    script_stats = {'cyrillic': 0, 'latin': 0, 'mixed': 0, 'unknown': 0}
-
-    for art in Article.objects.all():
-        path = os.path.join(settings.MEDIA_ROOT, art.file.name)
-        if not os.path.exists(path):
-            continue
-
-        content = read_file_content(path)
-        if content:
-            script_type = detect_script_type(content)
-            script_stats[script_type] += 1
-
-    print("Corpus Script Analysis:")
-    for script, count in script_stats.items():
-        print(f"{script.capitalize()}: {count} files")
-
-    return script_stats
@@ -0,0 +1,230 @@
+"""
+Corpus vocabulary for search-box autocomplete.
+
+Every word in the corpus is folded to one lowercase Latin key (Cyrillic
+through the existing converter, apostrophe variants to "'"), so "шаҳар"
+and "shahar" count as the same word. Converting a key back to Cyrillic
+loses ц/щ/ъ/ь/э, so each key also keeps its most frequent spelling in
+Cyrillic text (empty if it never occurs there), which is what Cyrillic
+suggestions show. build_vocabulary() writes the keys sorted, with their
+frequencies and Cyrillic forms, to VOCABULARY_PATH:
+
+    b'OZV2' | n (uint32) | counts: n x uint32 | offsets: n+1 x uint32
+            | Cyrillic form offsets: n+1 x uint32 | UTF-8 keys | UTF-8 Cyrillic forms
+
+The file is only written by `python manage.py build_vocabulary` and the
+article worker; until it exists there are no suggestions. Each worker
+loads it once (again only when it changes) into array('I')s and bytes
+objects, a few MB for the whole corpus. The words
+with a prefix are one bisect range (UTF-8 sorts like code points), and the
+most frequent of them come from heapq.nlargest; ranges of one- and
+two-letter prefixes are the long ones, so their answers are memoized.
+"""
+import heapq
+import os
+import re
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+from .converters import cyrillic_to_latin_converter, detect_script_type
+from .corpus import read_article_text
+from .models import Article
+
+MAGIC = b'OZV2'
+MEMO_PREFIX_LENGTH = 2
+MAX_SUGGESTIONS = 50
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:['ʻʼ‘’`´′][^\W\d_]+)*")
+APOSTROPHES = str.maketrans({c: "'" for c in "ʻʼ‘’`´′"})
+_CYRILLIC_LETTER = re.compile('[\u0400-\u04ff]')
+
+_VOCABULARY = None  # (mtime, Vocabulary)
+
+
+def word_key(word):
+    """Lowercase Latin form a word is counted and looked up under."""
+    return cyrillic_to_latin_converter(word.lower().translate(APOSTROPHES))
+
+
+def written_word_counts(texts):
+    """Counter of the words of texts as written (lowercased)."""
+    counts = Counter()
+    for text in texts:
+        counts.update(WORD_RE.findall(text.lower()))
+    return counts
+
+
+def key_counts(written):
+    """Counter of word keys from {word as written: count}."""
+    keys = Counter()
+    for word, count in written.items():
+        keys[word_key(word)] += count
+    return keys
+
+
+def count_words(texts):
+    """Counter of word keys over texts."""
+    return key_counts(written_word_counts(texts))
+
+
+def cyrillic_forms(written):
+    """{word key: its most frequent Cyrillic spelling} from {word as written: count}."""
+    best = {}
+    for word, count in written.items():
+        if _CYRILLIC_LETTER.search(word):
+            key = word_key(word)
+            if (count, word) > best.get(key, (0, '')):
+                best[key] = (count, word)
+    return {key: word for key, (count, word) in best.items()}
+
+
+class Vocabulary:
+    """Sorted word keys with their corpus frequencies and Cyrillic spellings."""
+
+    def __init__(self, counts, offsets, words, form_offsets=None, forms=b''):
+        self.counts = counts
+        self.offsets = offsets
+        self.words = words
+        self.form_offsets = form_offsets if form_offsets is not None else array('I', [0]) * (len(counts) + 1)
+        self.forms = forms
+        self._memo = {}
+        self._crc = None
+
+    @classmethod
+    def from_counter(cls, counter, forms=None):
+        """Vocabulary of {word key: count}, with {word key: Cyrillic spelling} forms."""
+        forms = forms or {}
+        counts, offsets, words = array('I'), array('I', [0]), bytearray()
+        form_offsets, form_words = array('I', [0]), bytearray()
+        for word in sorted(counter, key=lambda w: w.encode('utf-8')):
+            words += word.encode('utf-8')
+            counts.append(min(counter[word], 0xFFFFFFFF))
+            offsets.append(len(words))
+            form_words += forms.get(word, '').encode('utf-8')
+            form_offsets.append(len(form_words))
+        return cls(counts, offsets, bytes(words), form_offsets, bytes(form_words))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC:
+            raise ValueError('not a vocabulary file (or one from an older version)')
+        n, = struct.unpack_from('<I', data, 4)
+        counts, offsets, form_offsets = array('I'), array('I'), array('I')
+        start = 8
+        counts.frombytes(data[start:start + 4 * n])
+        start += 4 * n
+        offsets.frombytes(data[start:start + 4 * (n + 1)])
+        start += 4 * (n + 1)
+        form_offsets.frombytes(data[start:start + 4 * (n + 1)])
+        start += 4 * (n + 1)
+        words_end = start + offsets[-1]
+        return cls(counts, offsets, bytes(data[start:words_end]), form_offsets, bytes(data[words_end:]))
+
+    def to_bytes(self):
+        return (MAGIC + struct.pack('<I', len(self)) + self.counts.tobytes() + self.offsets.tobytes()
+                + self.form_offsets.tobytes() + self.words + self.forms)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        # Sequence of UTF-8 keys, for bisect
+        return self.words[self.offsets[index]:self.offsets[index + 1]]
+
+    def word(self, index):
+        return self[index].decode('utf-8')
+
+    def display(self, index, cyrillic=False):
+        """The word at index as shown: its Cyrillic spelling if asked for and known, else its key."""
+        if cyrillic:
+            form = self.forms[self.form_offsets[index]:self.form_offsets[index + 1]]
+            if form:
+                return form.decode('utf-8')
+        return self.word(index)
+
+    def checksum(self):
+        """CRC32 of the stored form, to tie files derived from this vocabulary to it."""
+        if self._crc is None:
+            self._crc = zlib.crc32(self.to_bytes())
+        return self._crc
+
+    def prefix_range(self, prefix):
+        raw = prefix.encode('utf-8')
+        # b'\xff' never occurs in UTF-8, so it sorts after every continuation
+        return bisect_left(self, raw), bisect_left(self, raw + b'\xff')
+
+    def top(self, prefix, limit=10, cyrillic=False):
+        """[(word, count)] of the `limit` most frequent words starting with prefix (see display())."""
+        memo = len(prefix) <= MEMO_PREFIX_LENGTH
+        if memo and (prefix, limit, cyrillic) in self._memo:
+            return self._memo[prefix, limit, cyrillic]
+        lo, hi = self.prefix_range(prefix)
+        best = heapq.nlargest(limit, range(lo, hi), key=self.counts.__getitem__)
+        result = [(self.display(i, cyrillic), self.counts[i]) for i in best]
+        if memo:
+            self._memo[prefix, limit, cyrillic] = result
+        return result
+
+
+def save_vocabulary(vocabulary, path=None):
+    """Write vocabulary to path (default VOCABULARY_PATH) atomically."""
+    path = path or settings.VOCABULARY_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(vocabulary.to_bytes())
+    os.replace(tmp, path)
+
+
+def build_vocabulary(articles=None, path=None):
+    """Count the words of articles (default: all) and write VOCABULARY_PATH; returns the Vocabulary."""
+    articles = articles if articles is not None else Article.objects.all()
+    written = Counter()
+    for art in articles:
+        written.update(written_word_counts([read_article_text(art)]))
+    vocabulary = Vocabulary.from_counter(key_counts(written), cyrillic_forms(written))
+    save_vocabulary(vocabulary, path)
+    return vocabulary
+
+
+def get_vocabulary():
+    """
+    This worker's Vocabulary, loaded on first use and when the file changes;
+    None until `build_vocabulary` (or the article worker) has written it in
+    the current format.
+    """
+    global _VOCABULARY
+    path = settings.VOCABULARY_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _VOCABULARY is None or _VOCABULARY[0] != mtime:
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            _VOCABULARY = (mtime, Vocabulary.from_bytes(data))
+        except ValueError:
+            return None  # written by an older version: `build_vocabulary` replaces it
+    return _VOCABULARY[1]
+
+
+def suggest(prefix, limit=10):
+    """
+    The `limit` most frequent corpus words starting with prefix, as
+    [(word, count)]; for a Cyrillic prefix, as they are spelled in Cyrillic
+    texts (words only found in Latin texts stay Latin).
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    vocabulary = get_vocabulary()
+    if vocabulary is None:
+        return []
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+    return vocabulary.top(word_key(prefix), limit, cyrillic=detect_script_type(prefix) == 'cyrillic')